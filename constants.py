@@ -7,6 +7,10 @@ CATALYST_PROB_MAP = {
     "4 Star Catalyst" : 1
 }
 
+# With hidden rates, amp taps at 4/6 and 5/6 pity succeed at least at HIDDEN_PROB before any catalyst
+HIDDEN_PITY = 4
+HIDDEN_PROB = 0.5
+
 AMP_THRESHOLDS = {15: 3, 16: 3, 17: 3, 18: 4, 19: 4, 20: 5, 21: 5, 22: 6, 23: 6, 24: 6}
 
 
@@ -50,15 +54,22 @@ CATALYST_COST_MAP = {
     "4 Star Catalyst": 32000
 }
 
-CATALYST_MODIFIERS = {
-    "No Catalyst": lambda x: x,
-    "Catalyst": lambda x: min(x * 1.5, x + 0.04, 1),
-    "Stable Catalyst": lambda x: min(x * 1.5, x + 0.04, 1),
-    "Potent Catalyst": lambda x: min(x * 2.0, x + 0.07, 1),
-    "3 Star Catalyst": lambda x: 1,
-    "4 Star Catalyst": lambda x: 1
+# (multiplier, bonus) of each catalyst, which turns a success rate x into min(x * multiplier, x + bonus, 1)
+CATALYST_BOOSTS = {
+    "No Catalyst": (1.0, 0.0),
+    "Catalyst": (1.5, 0.04),
+    "Stable Catalyst": (1.5, 0.04),
+    "Potent Catalyst": (2.0, 0.07),
+    "3 Star Catalyst": (float("inf"), float("inf")),
+    "4 Star Catalyst": (float("inf"), float("inf"))
 }
 
+def _modifier(multiplier: float, bonus: float):
+    # 1 comes first so that min skips the NaN of 0 * inf.
+    return lambda x: min(1, x * multiplier, x + bonus)
+
+CATALYST_MODIFIERS = {catalyst: _modifier(*boost) for catalyst, boost in CATALYST_BOOSTS.items()}
+
 FAILSAFES = {
     15: [0.18, 0.22, 0.26, 0.3, 0.4, 0.5, 1],
     16: [0.16, 0.2, 0.25, 0.3, 0.4, 0.5, 1],
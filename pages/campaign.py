@@ -0,0 +1,105 @@
+import streamlit as st
+import utils.utils as utils
+import numpy as np
+import plotly.express as px
+import pandas as pd
+import os
+
+CATALYST_COST_MAP = {
+    "No Catalyst": 0,
+    "Catalyst": st.session_state.get('catalyst_price', 100),
+    "Stable Catalyst": st.session_state.get('catalyst_price', 100) * 2,
+    "Potent Catalyst": st.session_state.get('potent_catalyst_price', 800),
+    "3 Star Catalyst": st.session_state.get('potent_catalyst_price', 800) * 10,
+    "4 Star Catalyst": st.session_state.get('potent_catalyst_price', 800) * 40
+}
+
+SLOTS = ["Weapon", "Helmet", "Breastplate", "Gauntlets", "Pants", "Boots", "Necklace", "Bracers", "Ring", "Talisman", "Seal"]
+DEFAULT_WEAP_LEVEL = 18
+DEFAULT_ARMOR_LEVEL = 15
+PERCENTILES = [0.5, 0.9, 0.99]
+
+################################
+
+st.title("Campaign Planner")
+with st.container(border=True):
+    st.write("Simulate a whole-account upgrade across several gear pieces at once. Every level step follows the optimal policy for its tap cost, so the totals below show how much the full campaign can cost and how much it can vary.")
+
+with st.container(border=True):
+    st.subheader("Configuration")
+    campaign_df = st.data_editor(
+        pd.DataFrame({
+            "Slot": SLOTS,
+            "Current Level": [DEFAULT_WEAP_LEVEL] + [DEFAULT_ARMOR_LEVEL] * (len(SLOTS) - 1),
+            "Target Level": [DEFAULT_WEAP_LEVEL + 1] + [DEFAULT_ARMOR_LEVEL + 1] * (len(SLOTS) - 1),
+            "Tap Cost (%)": [100] * len(SLOTS),
+        }),
+        column_config={
+            "Slot": st.column_config.TextColumn(disabled=True),
+            "Current Level": st.column_config.NumberColumn(min_value=15, max_value=25, step=1),
+            "Target Level": st.column_config.NumberColumn(min_value=15, max_value=25, step=1),
+            "Tap Cost (%)": st.column_config.NumberColumn(min_value=1, max_value=1000, step=1, help="Gold and spare parts cost per tap relative to a lv 60 weapon tap. Adjust it for armor or different grades of gear."),
+        },
+        hide_index=True,
+        use_container_width=True,
+    )
+
+    with st.expander("Options", expanded=False):
+        cols = st.columns(2)
+        n_sims = cols[0].number_input(label="Number of Simulations", min_value=100, max_value=20000, value=2000, step=100, help="Capped at 20,000, which takes a few seconds on one worker for a weapon from +18 to +22 and ten armour pieces from +15 to +18.")
+        seed = cols[1].number_input(label="Random Seed", min_value=0, value=None, help="Leave empty for a fresh run each time.")
+        hidden_rates_toggle = st.toggle("Hidden Rate", True, help="Whether to account for hidden rates at 4/6 and 5/6 amplification. This is highly recommended to make calculations more reflective of reality.")
+        workers = st.number_input(label="Worker Processes", min_value=1, max_value=os.cpu_count() or 1, value=1, step=1, help="Number of processes to spread large simulations over. Results for a fixed seed do not depend on this.")
+
+campaign = tuple(
+    (row["Slot"], int(row["Current Level"]), int(row["Target Level"]), row["Tap Cost (%)"] / 100)
+    for _, row in campaign_df.iterrows()
+    if row["Target Level"] > row["Current Level"]
+)
+
+if st.session_state.get('campaign') != (campaign, st.session_state['gold_price'], tuple(CATALYST_COST_MAP.values()), hidden_rates_toggle):
+    st.session_state['campaign_result'] = None
+
+if not campaign:
+    st.info("Set a target level above the current level for at least one slot.")
+elif st.button("Run Campaign", type="primary"):
+    with st.spinner("Running campaign simulations...", show_time=True):
+        st.session_state['campaign_result'] = utils.get_cached_campaign_results(campaign, st.session_state['gold_price'], CATALYST_COST_MAP, n=n_sims, hidden_r=hidden_rates_toggle, seed=seed, workers=workers)
+        st.session_state['campaign'] = (campaign, st.session_state['gold_price'], tuple(CATALYST_COST_MAP.values()), hidden_rates_toggle)
+
+result = st.session_state.get('campaign_result')
+if result is not None:
+    total = result.total()
+    st.subheader("Campaign Totals")
+    with st.container(border=True):
+        cols = st.columns(3)
+        cols[0].metric("Average Opal Value", f"{total.mean:,.0f}")
+        cols[1].metric("Average Gold", f"{result.total_gold.mean():,.0f}")
+        cols[2].metric("Average Taps", f"{total.mean_steps:,.0f}")
+        st.write(", ".join(f"{c}: `{v:,.1f}`" for c, v in total.average_catalysts().items() if c != "No Catalyst"))
+
+        total_gold = np.sort(result.total_gold)
+        total_taps = np.sort(result.total_taps)
+        index = (np.array(PERCENTILES) * (len(result) - 1)).astype(int)
+        st.table(pd.DataFrame({
+            "Percentile": [f"{q:.0%}" for q in PERCENTILES],
+            "Opal Value": [f"{c:,.0f}" for c in total.quantile(np.array(PERCENTILES))],
+            "Gold": [f"{g:,.0f}" for g in total_gold[index]],
+            "Taps": [f"{t:,}" for t in total_taps[index]],
+        }).set_index("Percentile"))
+        st.plotly_chart(px.histogram(x=total.costs, nbins=50, labels={"x": "Opal Value"}), use_container_width=True)
+
+    st.subheader("Per-Slot Breakdown")
+    breakdown = []
+    for slot, current_level, target_level, _ in campaign:
+        slot_result = result.slot(slot)
+        breakdown.append({
+            "Slot": slot,
+            "Levels": f"{current_level} → {target_level}",
+            "Average Opal Value": slot_result.mean,
+            f"P{PERCENTILES[1] * 100:.0f} Opal Value": slot_result.quantile(PERCENTILES[1]),
+            "Average Gold": result.gold[:, result.slots.index(slot)].mean(),
+            "Average Taps": slot_result.mean_steps,
+            **{c: v for c, v in slot_result.average_catalysts().items() if c != "No Catalyst"},
+        })
+    st.dataframe(pd.DataFrame(breakdown).set_index("Slot").style.format(precision=1, thousands=","), use_container_width=True)
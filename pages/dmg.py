@@ -1,13 +1,15 @@
 import streamlit as st
-import joblib
+import io
+import tempfile
 import pandas as pd
 import constants as CONST
+import utils.damage as damage
 from utils.graphing import plot_class_trendlines_px
 
 @st.cache_resource
-def load_pipeline():
+def load_model():
     try:
-        return joblib.load('./static/abyss_model_0.1.pkl')
+        return damage.load_model()
     except Exception as e:
         st.error(f"Error loading model: {e}")
         return None
@@ -22,10 +24,10 @@ with st.container(border=True):
             "To expand the feature set (such as accounting for more variables) and to improve accuracy, more data is required. "
             "If you would like to volunteer to help collect data, please contact @forgotten_memo on Discord or help submit abyssal frontier data directly to https://forms.gle/Xgt39GmyDoRU6sSf7. ")
 
-pipeline = load_pipeline()
+model = load_model()
 
-if pipeline:
-    tabs = st.tabs(["Predict", "Compare"])
+if model:
+    tabs = st.tabs(["Predict", "Compare", "Batch"])
     with tabs[0]:
         with st.container(border=True):
             st.subheader("Configuration")
@@ -47,8 +49,8 @@ if pipeline:
                     max_buffs = st.checkbox(label="Use Buffs", value=True, help="Whether you are using max-buffs (potion, food, drink)", disabled=True)
             
         if st.button("Predict DMG"):
-            if pipeline:
-                result = pipeline.predict(pd.DataFrame([{'bp': bp, 'class': char_class}]))
+            if model:
+                result = model.predict(pd.DataFrame([{'bp': bp, 'class': char_class}]))
                 st.success(f"Expected DMG: {result[0]:,.2f}")
             else:
                 st.error("Model not loaded correctly.")
@@ -63,7 +65,33 @@ if pipeline:
         )
         if st.button("Generate Comparison Plot"):
             if selected_classes:
-                fig = plot_class_trendlines_px(selected_classes, pipeline, bp_min=55000, bp_max_plot=110000, n_points=100, std_scale=1)
+                fig = plot_class_trendlines_px(selected_classes, model, bp_min=55000, bp_max_plot=110000, n_points=100, std_scale=1)
                 st.plotly_chart(fig, use_container_width=True)
             else:
                 st.warning("Please select at least one class to compare.")
+
+    with tabs[2]:
+        st.markdown(
+            "Upload a CSV or Parquet table with one row per player to predict them all at once.\n"
+            "- Required columns: `bp` and `class`, with names matched ignoring case. Any other columns (e.g. player names) are kept.\n"
+            f"- The file is predicted {damage.CHUNK_ROWS:,} rows at a time, so large files are fine. Rows with an unknown class or bp are left blank."
+        )
+        std_scale = st.number_input(label="Band Width (std)", min_value=0.0, max_value=5.0, value=1.0, step=0.5, help="The width of the dmg_lower / dmg_upper bands in class standard deviations")
+        player_file = st.file_uploader("Player Table", type=["csv", "parquet"])
+        if player_file is not None:
+            try:
+                preview = next(damage.predict_chunks(model, io.BytesIO(player_file.getvalue()), player_file.name, chunk_rows=100, std_scale=std_scale), None)
+            except (ValueError, ImportError) as e:
+                st.error(f"Could not read the player table: {e}")
+            else:
+                if preview is not None:
+                    st.dataframe(preview.style.format({"bp": "{:,.0f}", "dmg": "{:,.2f}", "dmg_lower": "{:,.2f}", "dmg_upper": "{:,.2f}"}), hide_index=True, use_container_width=True)
+
+                def predictions():
+                    # Runs on click, writing to a temporary file chunk by chunk rather than building the CSV in memory.
+                    out = tempfile.TemporaryFile("w+", newline="")
+                    damage.write_predictions(model, io.BytesIO(player_file.getvalue()), out, player_file.name, std_scale=std_scale)
+                    out.seek(0)
+                    return out
+
+                st.download_button("Download Predictions CSV", predictions, file_name="abyss_dmg_predictions.csv", mime="text/csv")
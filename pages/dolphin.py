@@ -1,9 +1,6 @@
-from typing import List
 import streamlit as st
-import itertools
-import numpy as np
 import pandas as pd
-from constants import CATALYST_PROB_MAP
+import utils.chain as chain
 
 CATALYST_COST_MAP = {
     "No Catalyst": 0,
@@ -14,81 +11,14 @@ CATALYST_COST_MAP = {
     "4 Star Catalyst": st.session_state.get('potent_catalyst_price', 800) * 40
 }
 
-st.session_state.setdefault('gold_market_price', 200.0)
-
-def apply_hidden_r(base_prob: float, hard_pity: int = 7):
-    exp = 0
-    q = 1
-    for i in range(1, hard_pity + 1):
-        p = base_prob * q
-        exp += i * p
-        q -= p
-    exp += hard_pity * q
-    return 1 / exp
-
-
-def gen_matrix_dolphin(catalyst_selected: list[str], hidden_r: int = 0) -> np.ndarray:
-    """
-    Generates probability matrix given a list of raw probabilities
-    """
-    probs = [CATALYST_PROB_MAP[catalyst] for catalyst in catalyst_selected]
-
-    P = np.zeros((6, 6))
-    for i in range(5):
-        p = apply_hidden_r(probs[i])
-        if i <= 2 and catalyst_selected[i] == "Stable Catalyst":
-            P[i][i] = 1 - p
-        else:
-            P[i][max(i-1,0)] = 1 - p
-        P[i][i+1] = p
-
-    P[5][5] = 1 # absorbing state
-    return P
-
+STABLE_STEPS = (0, 1, 2) # A stable catalyst keeps the level on failure at +10 to +12
 
-def calc_cost_dolphin(catalyst_selected: List[str], base_cost: int, start_level: int = 13)-> float:
-    """
-    Calculates cost given a set of raw probabilities and costs.
-    """
-    P = gen_matrix_dolphin(catalyst_selected)
-    cost_vector = [CATALYST_COST_MAP[catalyst] + base_cost for catalyst in catalyst_selected]
-
-    absorbing = [i for i in range(len(P)) if P[i][i] == 1 and all(P[i][j] == 0 for j in range(len(P)) if j != i)]
-    transient = [i for i in range(len(P)) if i not in absorbing]
-
-    # Compute M = (I - Q)^-1
-    Q = P[:len(transient), :len(transient)]
-    I = np.eye(Q.shape[0])
-    M = np.linalg.inv(I - Q)
-
-    start_point = start_level - 10
-    total_cost = sum([M[start_point][i] * cost_vector[i] for i in range(len(M[0]))])
-    taps = sum(M[start_point]) 
-    catalyst_usage = {} 
-    for i, catalyst in enumerate(catalyst_selected):
-        catalyst_usage[catalyst] = catalyst_usage.get(catalyst, 0) + M[start_point][i] 
-    
-    return total_cost, taps, catalyst_usage
+st.session_state.setdefault('gold_market_price', 200.0)
 
 @st.cache_data(show_spinner=False)
 def optimise(base_cost: float, enhancement_level: int):
     sim_params = [["No Catalyst", "Catalyst", "Stable Catalyst", "Potent Catalyst"]] * 5
-    permutations = list(itertools.product(*sim_params))
-
-    min_cost = float('inf')
-    min_key = None
-    min_taps = None
-    min_catalyst_usage = None
-    for i in permutations:
-        key = tuple(i)
-        total_cost, taps, catalyst_usage = calc_cost_dolphin(i, base_cost, enhancement_level)
-
-        if total_cost < min_cost:
-            min_cost = total_cost
-            min_key = key
-            min_taps = taps
-            min_catalyst_usage = catalyst_usage
-
+    min_key, min_cost, min_taps, min_catalyst_usage = chain.rank_selections(sim_params, base_cost, CATALYST_COST_MAP, drops=True, stable_steps=STABLE_STEPS, start=enhancement_level - 10)[0]
     return min_key, min_cost, min_taps, min_catalyst_usage
 
 def optimise_tab(base_cost, enhancement_level):
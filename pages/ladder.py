@@ -0,0 +1,67 @@
+import streamlit as st
+import utils.utils as utils
+from utils.ladder import LADDER_START, LADDER_END
+import plotly.express as px
+import pandas as pd
+
+CATALYST_COST_MAP = {
+    "No Catalyst": 0,
+    "Catalyst": st.session_state.get('catalyst_price', 100),
+    "Stable Catalyst": st.session_state.get('catalyst_price', 100) * 2,
+    "Potent Catalyst": st.session_state.get('potent_catalyst_price', 800),
+    "3 Star Catalyst": st.session_state.get('potent_catalyst_price', 800) * 10,
+    "4 Star Catalyst": st.session_state.get('potent_catalyst_price', 800) * 40
+}
+
+SLOTS = ["Weapon", "Helmet", "Breastplate", "Gauntlets", "Pants", "Boots", "Necklace", "Bracers", "Ring", "Talisman", "Seal"]
+
+################################
+
+st.title("Enhancement Ladder")
+with st.container(border=True):
+    st.write(f"Expected cost of every level from +{LADDER_START} to +{LADDER_END} at your prices, using the optimal catalysts at each level. Below +15 a failed tap drops a level unless a stable catalyst is used (+10 to +12).")
+
+with st.container(border=True):
+    st.subheader("Configuration")
+    cols = st.columns(2)
+    from_level = cols[0].number_input("From Level", min_value=LADDER_START, max_value=LADDER_END, value=14)
+    to_level = cols[1].number_input("To Level", min_value=LADDER_START, max_value=LADDER_END, value=21)
+    with st.expander("Options", expanded=False):
+        tap_cost_multiplier = st.number_input("Tap Cost (%)", min_value=1, max_value=1000, value=100, help="Gold and spare parts cost per tap relative to a lv 60 weapon tap. Adjust it for armor or different grades of gear.") / 100
+        hidden_rates_toggle = st.toggle("Hidden Rate", True, help="Whether to account for hidden rates at 4/6 and 5/6 amplification. This is highly recommended to make calculations more reflective of reality.")
+
+ladder = utils.get_cached_ladder(st.session_state['gold_price'], CATALYST_COST_MAP, tap_cost_multiplier, hidden_rates_toggle)
+
+if from_level > to_level:
+    st.error("The target level must not be below the starting level.")
+else:
+    totals = ladder.range(from_level, to_level)
+    st.subheader(f"+{from_level} → +{to_level}")
+    with st.container(border=True):
+        st.write(f"Average Opal Value: `{totals['cost']:,.2f}` opals")
+        st.write(f"Average Taps: `{totals['taps']:,.0f}`")
+        for channel, label in [("catalysts", "Catalyst"), ("stable catalysts", "Stable Catalyst"), ("potents", "Potent Catalyst")]:
+            if totals[channel] > 0:
+                st.write(f"{label}: `{totals[channel]:,.1f}`")
+
+curve = ladder.curve()
+fig = px.line(curve, x="to", y="cumulative cost", markers=True, log_y=True, labels={"to": "Level", "cumulative cost": f"Cumulative Opal Value from +{LADDER_START}"})
+st.plotly_chart(fig, use_container_width=True)
+with st.expander("Per-Level Breakdown", expanded=False):
+    st.dataframe(curve.style.format(precision=1, thousands=","), hide_index=True, use_container_width=True)
+
+with st.expander("Export Curves for Every Slot", expanded=False):
+    slot_multipliers = st.data_editor(
+        pd.DataFrame({"Slot": SLOTS, "Tap Cost (%)": [100] * len(SLOTS)}),
+        column_config={
+            "Slot": st.column_config.TextColumn(disabled=True),
+            "Tap Cost (%)": st.column_config.NumberColumn(min_value=1, max_value=1000, step=1),
+        },
+        hide_index=True,
+        use_container_width=True,
+    )
+    export = pd.concat([
+        utils.get_cached_ladder(st.session_state['gold_price'], CATALYST_COST_MAP, row["Tap Cost (%)"] / 100, hidden_rates_toggle).curve().assign(slot=row["Slot"])
+        for _, row in slot_multipliers.iterrows()
+    ])
+    st.download_button("Download CSV", export.to_csv(index=False), file_name="enhancement_ladder.csv", mime="text/csv")
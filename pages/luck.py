@@ -1,23 +1,20 @@
 import streamlit as st
-from scipy.stats import norm
-import constants as CONST 
+import pandas as pd
 import utils.utils as utils
+import utils.luck as luck
 import logging
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-CUMULATIVE_AMP_EXP = 3.75
-CATALYST_MOD = 0.025
 DEFAULT_TAPS = 1650
 DEFAULT_WEAP_LEVEL = 18
 DEFAULT_ARMOR_LEVEL = 15
-BASE_STDEV = 10
 
 st.title("Luck Scorer")
 description = "A fun scorer that gauges how lucky you are based on your total number of taps and enhancement levels. Thresholds are quite arbitrary for now and this is just for fun.\n"\
         "- To find your total taps, go to character icon > click manual on bottom left > go to life > look at enhancement section.\n"\
-        "- This is an early release that is only intended for used by those with resonance > 165 and does not account for failsafes or current amp progress.\n"\
+        "- This is an early release that is only intended for used by those with resonance > 165 and does not account for current amp progress.\n"\
         "- If you performed actions that may inflate or deflate tap count (e.g. white gear tap / guaranteed amp catalyst usage), you may specify them to moderate the calculated taps and obtain a more accurate result."\
         "- Assumes conservative catalyst usage."
 
@@ -50,25 +47,6 @@ total_resonance = sum([
     necklace, bracers, ring, talisman, seal
 ])
 
-### Hard code expectation map for levels 1-15
-expectation_map = {i: 0 for i in range(1, 11)}
-expectation_map[11] = 5
-expectation_map[12] = 20
-expectation_map[13] = 25
-expectation_map[14] = 40
-expectation_map[15] = 105
-
-
-### Calculate expectation for levels 16-25 using heuristics
-# """
-# Logic:
-# - At higher levels, more catalysts will be used, which reduces the expected taps.
-# """
-
-for i in range(16, 26):
-    expectation_map[i] = (CUMULATIVE_AMP_EXP + min((20-i) * CATALYST_MOD, 0)) ** (CONST.AMP_THRESHOLDS[i-1]) / utils.cumulative_prob(utils.modified_prob(CONST.FAILSAFES[i-1], lambda x: min(x + 0.07, 1.00))) + expectation_map[i-1]
-
-
 ### Display Tap Modifiers
 with st.expander("Tap Modifiers (Optional)", expanded=False):
     mod_cols = st.columns(3)
@@ -82,30 +60,24 @@ with st.expander("Tap Modifiers (Optional)", expanded=False):
     )
     redundant_gear_taps = mod_cols[2].number_input(
         "Redundant Gear Taps", 0, 1000000, 0,
-        help="Number of taps spent on redundant gear (i.e. white gear taps). This will be subtracted from your total taps for a more accurate luck score."
+        help="Number of taps spent on redundant gear (i.e. white gear taps). This will be added to the expected taps for a more accurate luck score."
     )
-
-### Calculate tap modifications
-adjusted_total_taps = max(0, total_taps - redundant_gear_taps)
-reduced_taps = (CUMULATIVE_AMP_EXP ** 3 - CUMULATIVE_AMP_EXP ** 2) * three_star_catalyst_used + \
-    (CUMULATIVE_AMP_EXP ** 4 - CUMULATIVE_AMP_EXP ** 3) * four_star_catalyst_used
-expected_taps = sum(expectation_map[i] for i in [weapon, helmet, breastplate, gauntlets, pants, boots,
-    necklace, bracers, ring, talisman, seal])
+    hidden_rates_toggle = st.toggle("Hidden Rate", True, help="Whether to account for hidden rates at 4/6 and 5/6 amplification. This is highly recommended to make calculations more reflective of reality.")
 
 ### Calculate Stats and Results
-stdev = sum((expectation_map[i] * 0.5) ** 2 for i in [weapon, helmet, breastplate, gauntlets, pants, boots,
-    necklace, bracers, ring, talisman, seal]) ** 0.5 + BASE_STDEV
-percentile = norm.cdf(adjusted_total_taps, loc=expected_taps-reduced_taps, scale=stdev)
+levels = tuple(sorted([weapon, helmet, breastplate, gauntlets, pants, boots, necklace, bracers, ring, talisman, seal]))
+try:
+    expected_distribution = utils.get_cached_luck_distribution(levels, hidden_rates_toggle)
+    adjusted_distribution = utils.get_cached_luck_distribution(levels, hidden_rates_toggle, three_star_catalyst_used, four_star_catalyst_used, redundant_gear_taps)
+except ValueError as e:
+    st.error(str(e))
+    st.stop()
+
+expected_taps = expected_distribution.mean
+reduced_taps = expected_taps + redundant_gear_taps - adjusted_distribution.mean
+percentile = luck.percentile(adjusted_distribution, total_taps)
 
-luck_status = "Victim of Glen"
-luck_thresholds = {
-    "RNGesus": 0.95,
-    "Very Lucky": 0.85,
-    "Lucky": 0.65,
-    "Neutral": 0.35,
-    "Unlucky": 0.15,
-    "Very Unlucky": 0.05,
-}
+luck_status = str(luck.luck_status(1 - percentile))
 
 
 ### Display results
@@ -114,13 +86,8 @@ with st.container(border=True):
 
     with left_col:
         st.subheader("Results")
-        st.write(f"**Total Counted Taps:** `{total_taps:,.0f} - {redundant_gear_taps:,.0f} = {total_taps - redundant_gear_taps:,.0f}` (Resonance: `{total_resonance}`)")
-        st.write(f"**Expected Taps:** `{expected_taps:,.0f} - {reduced_taps:,.0f} = {expected_taps - reduced_taps:,.0f}`")
-
-        for label, threshold in luck_thresholds.items():
-            if 1 - percentile >= threshold:
-                luck_status = label
-                break
+        st.write(f"**Total Counted Taps:** `{total_taps:,.0f}` (Resonance: `{total_resonance}`)")
+        st.write(f"**Expected Taps:** `{expected_taps:,.0f} - {reduced_taps:,.0f} + {redundant_gear_taps:,.0f} = {adjusted_distribution.mean:,.0f}`")
 
         st.write(f"**Luck Score:** `{1-percentile:.3f}` (`{luck_status}`)")
 
@@ -137,4 +104,22 @@ with st.container(border=True):
         """)
 
 
-
+### Guild Leaderboard
+with st.expander("Guild Leaderboard (Bulk Scoring)", expanded=False):
+    st.markdown(
+        "Upload a CSV or Parquet table with one row per member to score and rank them all at once with the same model as above.\n"
+        f"- Required columns: `total_taps` and a level column per slot ({', '.join(f'`{slot}`' for slot in luck.SLOTS)}).\n"
+        f"- Optional columns: {', '.join(f'`{column}`' for column in luck.MODIFIER_COLUMNS)}, which default to 0.\n"
+        "- Column names ignore case, spaces and underscores, and any other columns (e.g. member names) are kept."
+    )
+    template = pd.DataFrame([{"member": "Example", "total_taps": DEFAULT_TAPS, **{slot: DEFAULT_WEAP_LEVEL if slot == "weapon" else DEFAULT_ARMOR_LEVEL for slot in luck.SLOTS}, **{column: 0 for column in luck.MODIFIER_COLUMNS}}])
+    st.download_button("Download Template", template.to_csv(index=False), file_name="guild_luck_template.csv", mime="text/csv")
+    member_file = st.file_uploader("Member Table", type=["csv", "parquet"])
+    if member_file is not None:
+        try:
+            leaderboard = utils.get_cached_member_scores(luck.read_members(member_file), hidden_rates_toggle)
+        except (ValueError, ImportError) as e:
+            st.error(f"Could not score the member table: {e}")
+        else:
+            st.dataframe(leaderboard.style.format({"expected_taps": "{:,.0f}", "luck_score": "{:.3f}"}), hide_index=True, use_container_width=True)
+            st.download_button("Download Leaderboard CSV", leaderboard.to_csv(index=False), file_name="guild_luck_leaderboard.csv", mime="text/csv")
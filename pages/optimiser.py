@@ -31,6 +31,8 @@ def highlight_potent(value):
         value = ""
     return value
 
+ACTION_HTML = np.array([highlight_potent(action) for action in absolute_policy.ACTION_NAMES])
+
 ################################
 
 
@@ -74,7 +76,7 @@ chain_length = CONST.AMP_THRESHOLDS[enhancement_level]
 st.subheader("Detailed Optimal Policy")
 st.info("Special thanks to @wu6551 for the collaboration on the detailed optimal policy breakdown.")
 
-total_cost, policy, gold_tap_cost, expected_catalyst, expected_potent = absolute_policy.get_min_cost(enhancement_level, attempt_cost, st.session_state['gold_price'], CATALYST_COST_MAP, hidden_rates=hidden_rates_toggle, start_state=start_index)
+total_cost, policy, gold_tap_cost, expected_catalyst, expected_potent = utils.get_cached_min_cost(enhancement_level, attempt_cost, st.session_state['gold_price'], CATALYST_COST_MAP, hidden_r=hidden_rates_toggle, start_state=start_index)
 
 st.write(f"Average Opal Value: `{total_cost:,.2f}` opals ")
 with st.container(border=True):
@@ -83,30 +85,130 @@ with st.container(border=True):
         st.write(f"Catalyst: `{expected_catalyst:,.1f}`")
     if expected_potent > 0:
         st.write(f"Potent Catalyst: `{expected_potent:,.1f}`")
-    
+
+with st.expander("Cost From Every State", expanded=False):
+    st.write("The average opal value still needed to pass the level from every failsafe, amp and pity, so you can see where you stand without changing the current state above.")
+    remaining = utils.get_cached_policy_tables(enhancement_level, attempt_cost, st.session_state['gold_price'], CATALYST_COST_MAP, hidden_r=hidden_rates_toggle).state_values()[..., 0]
+    remaining = np.where(np.isfinite(remaining), remaining, np.nan)
+    fig = px.imshow(
+        remaining,
+        facet_col=0,
+        facet_col_wrap=4,
+        x=[f"{p}/6" for p in range(remaining.shape[2])],
+        y=[replace_stars(a, enhancement_level) for a in range(remaining.shape[1])],
+        origin="lower",
+        aspect="auto",
+        labels={"x": "Pity", "y": "Amp", "color": "Opal Value"},
+    )
+    fig.for_each_annotation(lambda a: a.update(text=CONST.FAILSAFE_TEXT[int(a.text.split("=")[-1])]))
+    st.plotly_chart(fig, use_container_width=True)
+
+with st.expander("Price Sensitivity", expanded=False):
+    st.write("Shows how the optimal average cost changes with one price. The policy only changes at the breakpoints, so between them the cost is a straight line and changing that price in the sidebar re-prices without solving again.")
+    price_axes = {"Gold Price": "gold", "Catalyst Value": "catalyst", "Potent Catalyst Value": "potent"}
+    price_axis = price_axes[st.selectbox("Price", options=list(price_axes))]
+    current_price = {"gold": st.session_state['gold_price'], "catalyst": CATALYST_COST_MAP["Catalyst"], "potent": CATALYST_COST_MAP["Potent Catalyst"]}[price_axis]
+    # Expander bodies run on every page load, so the curve is only traced once asked for.
+    if st.toggle("Trace Curve", False, help="Traces the breakpoints for the current state."):
+        with st.spinner("Tracing breakpoints..."):
+            curve = utils.get_cached_price_curve(enhancement_level, attempt_cost, st.session_state['gold_price'], CATALYST_COST_MAP, axis=price_axis, hidden_r=hidden_rates_toggle, start_state=start_index)
+
+        current_cost = absolute_policy.price_curve_cost(curve, current_price)
+        if current_cost is not None:
+            region = curve[(curve["start"] <= current_price) & (curve["end"] >= current_price)].iloc[0]
+            st.write(f"Re-priced Average: `{current_cost:,.2f}` opals, with the current policy optimal from `{region['start']:,.1f}` to `{region['end']:,.1f}`")
+
+        prices = np.append(curve["start"].to_numpy(), curve["end"].iloc[-1])
+        costs = [absolute_policy.price_curve_cost(curve, price) for price in prices]
+        fig = px.line(x=prices, y=costs, markers=True, log_x=True, labels={"x": "Price", "y": "Average Opal Value"})
+        fig.add_vline(x=current_price, line_dash="dash")
+        st.plotly_chart(fig, use_container_width=True)
+
+        breakpoints_df = pd.DataFrame({
+            "Price": curve["start"].iloc[1:].round(2),
+            "Policy Changes": curve["changes"].iloc[1:].apply(lambda changes: ", ".join(changes) or "Off-path cells only"),
+        })
+        st.dataframe(breakpoints_df, hide_index=True, use_container_width=True)
+
+with st.expander("Cost Risk", expanded=False):
+    st.write("Simulates the optimal policy from the current state to show how far the cost can stray from the average.")
+    cols = st.columns(2)
+    n_policy_sims = cols[0].number_input("Number of Simulations", min_value=1000, max_value=50000, value=10000, step=1000, key="policy_n_sims", help="Capped at 50,000, which takes a few seconds at +23.")
+    policy_seed = cols[1].number_input("Random Seed", min_value=0, value=None, key="policy_seed", help="Leave empty for a fresh run each time.")
+    policy_inputs = (enhancement_level, attempt_cost, st.session_state['gold_price'], tuple(CATALYST_COST_MAP.values()), start_index, hidden_rates_toggle)
+    if st.button("Simulate Policy"):
+        with st.spinner("Simulating..."):
+            result = utils.get_cached_policy_sim_results(enhancement_level, attempt_cost, st.session_state['gold_price'], CATALYST_COST_MAP, start_state=start_index, n=n_policy_sims, hidden_r=hidden_rates_toggle, seed=policy_seed)
+            st.session_state['policy_result'] = (policy_inputs, result)
+    policy_inputs_run, policy_result = st.session_state.get('policy_result', (None, None))
+    if policy_result is not None and policy_inputs_run == policy_inputs:
+        percentiles = [0.5, 0.75, 0.9, 0.95, 0.99]
+        taps = np.sort(policy_result.steps)
+        risk_df = pd.DataFrame({
+            "Percentile": [f"{q:.0%}" for q in percentiles],
+            "Opal Cost": [f"{c:,.0f}" for c in policy_result.quantile(np.array(percentiles))],
+            "Taps": [f"{taps[int(q * (len(taps) - 1))]:,}" for q in percentiles],
+        })
+        st.write(f"Simulated Average: `{policy_result.mean:,.2f}` opals (std `{policy_result.std:,.0f}`) over `{len(policy_result):,}` runs")
+        st.table(risk_df.set_index("Percentile"))
+        st.write("Average Catalysts: " + ", ".join(f"{c}: `{v:,.1f}`" for c, v in policy_result.average_catalysts().items() if c != "No Catalyst"))
+        st.plotly_chart(px.histogram(x=policy_result.costs, nbins=50, labels={"x": "Opal Cost"}), use_container_width=True)
+
+with st.expander("Risk-Sensitive Policy", expanded=False):
+    st.write("Trades a higher average cost for a narrower spread. Each state weighs the variance of its remaining cost, so the risk below is relative to the average cost, or pick the policy along the frontier with the cheapest worst outcomes (CVaR).")
+    objectives = {"Mean + Risk × Variance": "variance", "CVaR": "cvar"}
+    cols = st.columns(2)
+    objective = objectives[cols[0].radio("Objective", options=list(objectives), horizontal=True)]
+    if objective == "variance":
+        risk_levels = absolute_policy.RISK_LEVELS.tolist()
+        risk = cols[1].select_slider("Risk", options=risk_levels, value=min(risk_levels, key=lambda r: abs(r - 1)), format_func=lambda r: f"{r:.3g}")
+        alpha = 0.9
+    else:
+        risk = 0.0
+        alpha = cols[1].select_slider("Worst Outcomes", options=[0.5, 0.75, 0.9, 0.95, 0.99], value=0.9, format_func=lambda q: f"Top {1 - q:.0%}")
+    # Expander bodies run on every page load, so the frontier is only solved once asked for.
+    if st.toggle("Solve Frontier", False, help="Solves the frontier for the current state."):
+        with st.spinner("Solving..."):
+            risk_policy, frontier = utils.get_cached_risk_policy(enhancement_level, attempt_cost, st.session_state['gold_price'], CATALYST_COST_MAP, objective=objective, risk=risk, alpha=alpha, hidden_r=hidden_rates_toggle, start_state=start_index)
+
+        neutral = frontier.iloc[0]
+        st.table(pd.DataFrame({
+            "": ["Average", "Std", f"P{alpha * 100:.0f}", f"CVaR {alpha:.0%}", "Catalyst", "Potent Catalyst"],
+            "Expected Cost": [f"{neutral[c]:,.0f}" for c in ("mean", "std", "quantile", "cvar")] + [f"{neutral[c]:,.1f}" for c in ("catalysts", "potents")],
+            "Risk-Sensitive": [f"{risk_policy[c]:,.0f}" for c in ("mean", "std", "quantile", "cvar")] + [f"{risk_policy[c]:,.1f}" for c in ("catalysts", "potents")],
+        }).set_index(""))
+
+        efficient = frontier[frontier["efficient"]].drop_duplicates("mean")
+        fig = px.line(efficient, x="std", y="mean", markers=True, hover_data=["risk", "cvar"], labels={"std": "Std of Opal Cost", "mean": "Average Opal Cost"})
+        fig.add_scatter(x=[risk_policy["std"]], y=[risk_policy["mean"]], mode="markers", marker_size=12, name="Selected")
+        st.plotly_chart(fig, use_container_width=True)
+
+        changes = absolute_policy.policy_changes(neutral["policy"], risk_policy["policy"], enhancement_level, start_index)
+        st.write("Policy Changes: " + (", ".join(changes) if changes else "None, the expected cost policy is already the best choice."))
+
+with st.expander("Catalyst Inventory", expanded=False):
+    st.write("Plans how to spend catalysts you already hold instead of buying them. Held catalysts cost nothing but run out, so they are saved for the taps where they help the most. 3 Star and 4 Star catalysts are still bought at their value.")
+    cols = st.columns(2)
+    held_catalysts = cols[0].number_input("Catalysts Held", min_value=0, max_value=1000, value=0, step=1)
+    held_potents = cols[1].number_input("Potent Catalysts Held", min_value=0, max_value=1000, value=0, step=1)
+    # Expander bodies run on every page load, so the plan is only solved once asked for.
+    if st.toggle("Plan Inventory", False, help="Solves a plan for the current state, which takes about a second."):
+        with st.spinner("Solving..."):
+            plan = utils.get_cached_inventory_plan(enhancement_level, attempt_cost, st.session_state['gold_price'], CATALYST_COST_MAP, held_catalysts, held_potents, hidden_r=hidden_rates_toggle, start_state=start_index)
+        inventory_cost, inventory_policy, inventory_gold, used_catalysts, used_potents = plan.get_min_cost(held_catalysts, held_potents)
+        st.write(f"Average Opal Value: `{inventory_cost:,.2f}` opals, using `{used_catalysts:,.1f}` held catalysts and `{used_potents:,.1f}` held potent catalysts on average")
+        st.caption("Runs that need more than the stock are charged for the extra catalysts at their opal value.")
+        st.plotly_chart(px.imshow(plan.cost_surface(), origin="lower", aspect="auto", labels={"x": "Potent Catalysts Held", "y": "Catalysts Held", "color": "Average Opal Value"}), use_container_width=True)
+        changes = absolute_policy.policy_changes(policy, inventory_policy, enhancement_level, start_index)
+        st.write("Policy Changes: " + (", ".join(changes) if changes else "None"))
+
 with st.expander("Optimal Policy"):
     tabs = st.tabs(["Pivot Table", "Raw Results"])
     data = process_policy(policy, enhancement_level)[CONST.FAILSAFE_TEXT[0]]
     with tabs[0]:
-        table_data = []
-        for k, v in data.items():
-            print(k.split(" "))
-            if " → "in k:
-                stars, pity = k.split(" → ")
-            else:
-                stars, pity = k.split(" ")
-        
-            table_data.append({
-                "Stars": stars,
-                "Pity": pity.strip("()"), 
-                "Catalyst": highlight_potent(v)
-            })
-        df = pd.DataFrame(table_data)
-        pivot_df = df.pivot(index="Stars", columns="Pity", values="Catalyst").fillna("")
-        pivot_df.columns.name = None
-        pivot_df = pivot_df.reset_index()
+        pivot_df = absolute_policy.policy_pivot(policy, enhancement_level)
+        pivot_df = pd.DataFrame(ACTION_HTML[pivot_df.to_numpy()], index=pivot_df.index, columns=pivot_df.columns).reset_index()
         st.markdown(pivot_df.to_html(escape=False, index=False), unsafe_allow_html=True)
-        
 
     with tabs[1]:
         st.write(data)
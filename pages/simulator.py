@@ -5,6 +5,8 @@ import constants as CONST
 import numpy as np
 import plotly.express as px
 import pandas as pd
+import os
+from typing import Callable
 
 CATALYST_COST_MAP = {
     "No Catalyst": 0,
@@ -15,6 +17,8 @@ CATALYST_COST_MAP = {
     "4 Star Catalyst": st.session_state.get('potent_catalyst_price', 800) * 40
 }
 
+COMPARE_BUDGET = 100_000 # Selections times simulations in one comparison, which takes about 10 s at +23
+
 @st.dialog("Rates for Enhancement", width="large")
 def show_rates():
     st.subheader("Failsafe Rates")
@@ -29,92 +33,136 @@ def show_rates():
 
 
 
-def simulate_tab(enhancement_level: int, base_cost: float, hidden_r: bool, multi: int = 1000):
+def simulate_tab(enhancement_level: int, base_cost: float, hidden_r: bool, multi: int = 1000, seed: int | None = None, workers: int = 1):
     """Tab for running hammer simulations"""
-    mode = st.selectbox(label="Select Simulation Mode:", options=["Single Simulation", "Distribution Simulation"])
+    mode = st.selectbox(label="Select Simulation Mode:", options=["Single Simulation", "Distribution Simulation", "Adaptive Simulation", "Exact Distribution"])
     n = 1 if mode == 'Single Simulation' else multi
 
+    if mode == 'Adaptive Simulation':
+        adaptive_cols = st.columns(3)
+        rel_tol = adaptive_cols[0].number_input(label="Relative Tolerance (%)", min_value=0.1, max_value=20.0, value=1.0, step=0.1, help="Stop once the 95% confidence intervals of the mean and of the target percentile are within this fraction of their estimates.") / 100
+        target_percentile = adaptive_cols[1].number_input(label="Target Percentile", min_value=0.01, max_value=0.99, value=0.90, step=0.01, help="The cost percentile that must also reach the tolerance.")
+        max_seconds = adaptive_cols[2].number_input(label="Time Budget (s)", min_value=1, max_value=300, value=30, step=1, help="Stop after this long even if the tolerance is not reached. The number of simulations acts as the trial budget.")
+
     if st.session_state.get('enhancement_level') != enhancement_level\
             or st.session_state.get('base_cost') != base_cost\
             or st.session_state.get('catalyst_selected') != catalyst_selected\
             or st.session_state.get('mode') != mode:
-        st.session_state['results'] = None
-        st.session_state['failsafes'] = None
+        st.session_state['result'] = None
+        st.session_state['summary'] = None
+        st.session_state['converged'] = None
 
     st.session_state['catalyst_selected'] = catalyst_selected
     st.session_state['mode'] = mode
     st.session_state['enhancement_level'] = enhancement_level
     st.session_state['base_cost'] = base_cost
 
-    if st.button("Run Simulation", type="primary"):
+    if mode != 'Exact Distribution' and st.button("Run Simulation", type="primary"):
         with st.spinner("Running hammer simulations...", show_time=True):
             if mode == 'Single Simulation':
-                results, failsafes, steps, catalysts_used = utils.get_sim_results(enhancement_level, base_cost, catalyst_selected, n=n, hidden_r=hidden_r)
+                st.session_state['result'] = utils.get_sim_results(enhancement_level, base_cost, catalyst_selected, n=n, hidden_r=hidden_r, CATALYST_COST_MAP=CATALYST_COST_MAP, seed=seed)
+            elif mode == 'Adaptive Simulation':
+                st.session_state['summary'], st.session_state['converged'] = utils.get_cached_adaptive_summary(enhancement_level, base_cost, catalyst_selected, CATALYST_COST_MAP, rel_tol=rel_tol, percentile=target_percentile, max_trials=n, max_seconds=max_seconds, hidden_r=hidden_r, seed=seed, workers=workers)
             else:
-                results, failsafes, steps, catalysts_used = utils.get_cached_sim_results(enhancement_level, base_cost, catalyst_selected, CATALYST_COST_MAP, n=n, hidden_r=hidden_r)
-            
-            avg_catalysts_used = {k: np.mean([c.get(k, 0) for c in catalysts_used]) for k in catalysts_used[0].keys()}
-            st.session_state['catalysts_used'] = avg_catalysts_used
-            st.session_state['results'] = results
-            st.session_state['failsafes'] = failsafes
-            st.session_state['steps'] = steps
-    
-    if (results := st.session_state.get('results')) and (steps := st.session_state.get('steps')) and (failsafes := st.session_state.get('failsafes')):
-        if mode == 'Single Simulation':
-            st.subheader(f"Total Cost: `{results[0]:,.0f}` opals.")
+                st.session_state['summary'] = utils.get_cached_sim_summary(enhancement_level, base_cost, catalyst_selected, CATALYST_COST_MAP, n=n, hidden_r=hidden_r, seed=seed, workers=workers)
+
+    if mode == 'Single Simulation':
+        if (result := st.session_state.get('result')) is not None:
+            st.subheader(f"Total Cost: `{result.costs[0]:,.0f}` opals.")
             with st.container(border=True):
-                st.write(f"Taps taken: `{steps[0]}` --- (`{steps[0] * base_cost * 1000000 / st.session_state['gold_price']:,.0f}` gold)")
+                st.write(f"Taps taken: `{result.steps[0]}` --- (`{result.steps[0] * base_cost * 1000000 / st.session_state['gold_price']:,.0f}` gold)")
                 st.write("Catalysts Used:")
-                for k, v in st.session_state['catalysts_used'].items():
+                for k, v in result.average_catalysts().items():
                     if k != "No Catalyst":
                         st.write(f" - {k}: `{v:,.0f}`")
-                st.write(f"Failsafe Reached: `{CONST.FAILSAFE_TEXT[failsafes[0]]}`")
-        else:
-            cols = st.columns(2)
-            with cols[0]:
-                st.subheader(f"Simulation Results")
-                st.write(f"n = `{len(results)}` simulations")
-                st.write(f"Average Taps: `{np.mean(steps):,.0f}` --- (`{np.mean(steps) * base_cost * 1000000 / st.session_state['gold_price']:,.0f}` gold)")
-                
-                
-                st.write(f"Mean: `{np.mean(results):,.2f}` opals")
-                st.write(f"Std: `{np.std(results):,.2f}` opals")
-                st.write(f"Min: `{np.min(results):,.2f}` opals")
-                st.write(f"Max: `{np.max(results):,.2f}` opals")
-
-            with cols[1]:
-                results_df = pd.DataFrame(results, columns=["value"])
-                fig = px.histogram(
-                    results_df,
-                    x="value",
-                    nbins=20,
-                    labels={"value": "Total Cost"},
-                    title="Simulation Results Histogram",
-                    histnorm="probability"
-                )
-
-                fig.update_layout(
-                    xaxis_title="Total Cost",
-                    yaxis_title="Ratio"
-                )
-
-                st.plotly_chart(fig)
-
-            st.divider()
-
-            st.subheader("Percentile Calculator")
-
-            percentile = st.slider(
-                "Select percentile", 
-                min_value=0.00, 
-                max_value=1.00, 
-                value=0.50, 
-                step=0.01
-            )
-            index = int(percentile * (len(results) - 1))
-            value = sorted(results)[index]
-
-            st.write(f"Cost at `{percentile:.1%}` percentile:", f"`{value:,.2f}` opals (`{value / st.session_state['gold_price'] * 1000000:,.0f}` gold)")
+                st.write(f"Failsafe Reached: `{CONST.FAILSAFE_TEXT[int(result.failsafes[0])]}`")
+    elif mode in ('Distribution Simulation', 'Adaptive Simulation') and (summary := st.session_state.get('summary')):
+        results_df = pd.DataFrame({"value": summary.histogram.centers, "ratio": summary.histogram.counts / summary.n})
+        note = f"`{summary.histogram.overflow / summary.n:.2%}` of simulations cost more than `{summary.histogram.edges[-1]:,.0f}` opals and are not shown." if summary.histogram.overflow else None
+        stats = {"Mean": summary.cost.mean, "Std": summary.cost.std, "Min": summary.cost.min, "Max": summary.cost.max}
+        header = f"n = `{summary.n}` simulations"
+        if mode == 'Adaptive Simulation':
+            header += " (converged)" if st.session_state.get('converged') else " (budget ran out before reaching the tolerance)"
+        show_distribution(base_cost, header, summary.steps.mean, stats, results_df, summary.quantile, note)
+    elif mode == 'Exact Distribution':
+        taps, cost = utils.get_cached_exact_distribution(enhancement_level, base_cost, catalyst_selected, CATALYST_COST_MAP, hidden_r=hidden_r)
+        counts, edges = np.histogram(cost.values, bins=20, weights=cost.pmf)
+        results_df = pd.DataFrame({"value": (edges[:-1] + edges[1:]) / 2, "ratio": counts})
+        stats = {"Mean": cost.mean, "Std": cost.std, "1st Percentile": cost.quantile(0.01), "99th Percentile": cost.quantile(0.99)}
+        show_distribution(base_cost, f"Exact distribution (tail mass cut: `{cost.tail_mass:.1e}`)", taps.mean, stats, results_df, cost.quantile)
+
+
+def show_distribution(base_cost: float, header: str, avg_taps: float, stats: dict, results_df: pd.DataFrame, quantile: Callable, note: str | None = None):
+    """Displays summary statistics, histogram and percentile calculator of a cost distribution"""
+    cols = st.columns(2)
+    with cols[0]:
+        st.subheader(f"Simulation Results")
+        st.write(header)
+        st.write(f"Average Taps: `{avg_taps:,.0f}` --- (`{avg_taps * base_cost * 1000000 / st.session_state['gold_price']:,.0f}` gold)")
+
+
+        for label, value in stats.items():
+            st.write(f"{label}: `{value:,.2f}` opals")
+
+    with cols[1]:
+        fig = px.bar(
+            results_df,
+            x="value",
+            y="ratio",
+            labels={"value": "Total Cost"},
+            title="Simulation Results Histogram"
+        )
+
+        fig.update_layout(
+            xaxis_title="Total Cost",
+            yaxis_title="Ratio",
+            bargap=0
+        )
+
+        st.plotly_chart(fig)
+        if note:
+            st.caption(note)
+
+    st.divider()
+
+    st.subheader("Percentile Calculator")
+
+    percentile = st.slider(
+        "Select percentile", 
+        min_value=0.00, 
+        max_value=1.00, 
+        value=0.50, 
+        step=0.01
+    )
+    value = quantile(percentile)
+
+    st.write(f"Cost at `{percentile:.1%}` percentile:", f"`{value:,.2f}` opals (`{value / st.session_state['gold_price'] * 1000000:,.0f}` gold)")
+
+
+def compare_tab(enhancement_level: int, base_cost: float, final_catalyst: str, hidden_r: bool, seed: int | None = None):
+    """Tab for comparing catalyst selections on common random numbers"""
+    cols = st.columns(4)
+    top_k = cols[0].number_input(label="Selections", min_value=2, max_value=len(utils.candidate_selections(CONST.AMP_THRESHOLDS[enhancement_level])), value=10, step=1, help="Number of selections to compare, picked by lowest expected cost.")
+    # The run time grows with selections times simulations, so the product is capped to keep the page interactive.
+    max_n = max(100, min(100000, COMPARE_BUDGET // top_k // 100 * 100))
+    n = cols[1].number_input(label="Simulations", min_value=100, max_value=max_n, value=min(1000, max_n), step=100, help=f"Number of common simulations every selection is run on, up to {max_n:,} for {top_k} selections.")
+    percentile = cols[2].number_input(label="Percentile", min_value=0.01, max_value=0.99, value=0.90, step=0.01, help="The tail percentile to report.")
+    metric = cols[3].selectbox(label="Rank By", options=["mean", "percentile"])
+
+    if st.button("Compare Selections"):
+        with st.spinner("Running common random number simulations...", show_time=True):
+            df = utils.get_cached_selection_comparison(enhancement_level, base_cost, final_catalyst, CATALYST_COST_MAP, n=n, hidden_r=hidden_r, seed=seed, percentile=percentile, metric=metric, top_k=top_k)
+
+        chain_length = CONST.AMP_THRESHOLDS[enhancement_level]
+        table = pd.DataFrame({
+            "Rank": df["rank"],
+            **{f"{'★' * i}{'☆' * (chain_length - i)}": df["selection"].str[i] for i in range(chain_length)},
+            "Mean": df["mean"].map("{:,.0f}".format),
+            f"P{percentile * 100:.0f}": df["percentile"].map("{:,.0f}".format),
+            "Δ Mean (95% CI)": [f"{d:+,.0f} ({lo:+,.0f}, {hi:+,.0f})" for d, lo, hi in zip(df["mean_diff"], df["mean_diff_low"], df["mean_diff_high"])],
+            f"Δ P{percentile * 100:.0f} (95% CI)": [f"{d:+,.0f} ({lo:+,.0f}, {hi:+,.0f})" for d, lo, hi in zip(df["percentile_diff"], df["percentile_diff_low"], df["percentile_diff_high"])],
+        })
+        st.dataframe(table, hide_index=True, use_container_width=True)
 
 
 ################################
@@ -143,7 +191,8 @@ with st.container(border=True):
 
     with st.expander(f"Catalyst Selection", expanded=True):
         catalyst_selected = {}
-        min_key, min_cost, min_taps, catalyst_usage = utils.optimise(base_cost, chain_length, CATALYST_COST_MAP)
+        # The Options below come later on the page, so the defaults follow their hidden rate toggle from the last run.
+        min_key, min_cost, min_taps, catalyst_usage = utils.optimise(base_cost, chain_length, CATALYST_COST_MAP, hidden_r=st.session_state.get("hidden_rates", True))
         options = ["No Catalyst", "Catalyst", "Potent Catalyst"]
         extra_options = []
         for i in range(chain_length):
@@ -158,13 +207,16 @@ with st.container(border=True):
         catalyst_selected["final"] = st.selectbox(index=2, label=f"{'★' * chain_length}", options=options)
 
     with st.expander(f"Options", expanded=False):
-        hidden_rates_toggle = st.toggle("Hidden Rate", True, help="Whether to account for hidden rates at 4/6 and 5/6 amplification. This is highly recommended to make calculations more reflective of reality.")
-        n_sims = st.number_input(label="Number of Simulations", min_value=1, max_value=10000, value=1000 if st.session_state.get('mode') == 'Distribution Simulation' else 1, step=1, help="Number of simulations to run. Higher numbers give more accurate results but take longer.")
+        hidden_rates_toggle = st.toggle("Hidden Rate", True, key="hidden_rates", help="Whether to account for hidden rates at 4/6 and 5/6 amplification. This is highly recommended to make calculations more reflective of reality.")
+        n_sims = st.number_input(label="Number of Simulations", min_value=1, max_value=10000000, value={'Distribution Simulation': 1000, 'Adaptive Simulation': 1000000}.get(st.session_state.get('mode'), 1), step=1, help="Number of simulations to run. Higher numbers give more accurate results but take longer. In adaptive mode this is the maximum.")
+        seed = st.number_input(label="Random Seed", min_value=0, value=None, step=1, help="Fix the seed to reproduce a run exactly. Leave empty for a fresh run every time.")
+        workers = st.number_input(label="Worker Processes", min_value=1, max_value=os.cpu_count() or 1, value=1, step=1, help="Number of processes to spread large simulations over. Results for a fixed seed do not depend on this.")
 
     if st.button("Show Enhancement Rates"):
         show_rates()
 
 
-simulate_tab(enhancement_level, base_cost, hidden_rates_toggle, n_sims)
-
+simulate_tab(enhancement_level, base_cost, hidden_rates_toggle, n_sims, seed, workers)
 
+with st.expander("Compare Catalyst Selections", expanded=False):
+    compare_tab(enhancement_level, base_cost, catalyst_selected["final"], hidden_rates_toggle, seed)
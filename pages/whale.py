@@ -1,6 +1,5 @@
 from typing import List, Tuple
 import streamlit as st
-import itertools
 import utils.utils as utils
 import utils.absolute_policy as absolute_policy
 import constants as CONST
@@ -27,7 +26,7 @@ def get_sim_results(base_cost: int, catalyst_selected: List[str], n: int = 10000
     failsafes = []
     steps_history = []
     final_catalyst = catalyst_selected.pop("final", "Potent Catalyst")
-    failsafe_probs = utils.modified_prob(CONST.FAILSAFES[enhancement_level], CONST.CATALYST_MODIFIERS.get(final_catalyst, lambda x: x))
+    failsafe_probs = utils.modified_prob(CONST.FAILSAFES[enhancement_level], final_catalyst)
     catalysts_results = []
 
     raw_probs = [CONST.CATALYST_PROB_MAP[c] for c in catalyst_selected.values()]
@@ -89,53 +88,19 @@ def get_cached_sim_results(base_cost: float, catalyst_selected: List[str], CATAL
 
     return get_sim_results(base_cost=base_cost, catalyst_selected=catalyst_selected, n=n)
 
-@st.cache_data(show_spinner=False)
-def optimise(base_cost: float, chain_length: int, CATALYST_COST_MAP: dict):
-    """
-    Optimise the catalyst usage for a given chain length and base cost.
-    """
-
-    sim_params = [["No Catalyst", "Catalyst", "Potent Catalyst"]] * chain_length
-    if chain_length == 3:
-        sim_params[-1].append("3 Star Catalyst")
-    elif chain_length == 4:
-        sim_params[-1].append("4 Star Catalyst")
-
-    permutations = list(itertools.product(*sim_params))
-
-    min_cost = float('inf')
-    min_key = None
-    min_taps = None
-    min_catalyst_usage = None
-
-    for i in permutations:
-        key = tuple(i)
-        total_cost, taps, catalyst_usage = utils.calc_cost(i, base_cost, CATALYST_COST_MAP)
-
-        if total_cost < min_cost:
-            min_cost = total_cost
-            min_key = key
-            min_taps = taps
-            min_catalyst_usage = catalyst_usage
-    return min_key, min_cost, min_taps, min_catalyst_usage
-
-def optimise_tab(chain_length, base_cost):
+def optimise_tab(chain_length, base_cost, hidden_r):
     """
     Tab for running catalyst optimisations
     """
 
-    min_key, min_cost, min_taps, catalyst_usage = optimise(base_cost, chain_length, CATALYST_COST_MAP)
+    min_key, min_cost, min_taps, catalyst_usage = utils.optimise(base_cost, chain_length, CATALYST_COST_MAP, hidden_r=hidden_r)
 
     st.subheader("Simplified Optimal Policy")
-    min_final_catalyst, min_overall_cost, avg_failsafes = None, float('inf'), 0
-    for final_catalyst in ["No Catalyst", "Catalyst", "Potent Catalyst"]:
-        modifier = CONST.CATALYST_MODIFIERS.get(final_catalyst, lambda x: x)
-        modified_probs = utils.modified_prob(CONST.FAILSAFES[enhancement_level], modifier)
-        overall_cost = (min_cost + CATALYST_COST_MAP[final_catalyst]) / utils.cumulative_prob(modified_probs)
-        if overall_cost < min_overall_cost:
-            min_overall_cost = overall_cost
-            min_final_catalyst = final_catalyst
-            avg_failsafes = 1 / utils.cumulative_prob(modified_probs)
+    final_catalysts = ["No Catalyst", "Catalyst", "Potent Catalyst"]
+    failsafe_rates = utils.cumulative_prob(utils.modified_prob(CONST.FAILSAFES[enhancement_level], final_catalysts))
+    overall_costs = (min_cost + np.array([CATALYST_COST_MAP[c] for c in final_catalysts])) / failsafe_rates
+    best = int(np.argmin(overall_costs))
+    min_final_catalyst, min_overall_cost, avg_failsafes = final_catalysts[best], float(overall_costs[best]), float(1 / failsafe_rates[best])
 
     for k, v in catalyst_usage.items():
         catalyst_usage[k] = v * avg_failsafes
@@ -166,7 +131,7 @@ def optimise_tab(chain_length, base_cost):
 def simulate_tab(chain_length, base_cost):
     """Tab for running hammer simulations"""
     catalyst_selected = {}
-    min_key, min_cost, min_taps, catalyst_usage = optimise(base_cost, chain_length, CATALYST_COST_MAP)
+    min_key, min_cost, min_taps, catalyst_usage = utils.optimise(base_cost, chain_length, CATALYST_COST_MAP)
     options = ["No Catalyst", "Catalyst", "Potent Catalyst"]
     for i in range(chain_length):
         if chain_length == 3 and i == 2:
@@ -283,9 +248,10 @@ tab1, tab2 = st.tabs(["Optimizer", "Simulator"])
 
 with tab1:
     advanced_mode = st.toggle("Detailed Breakdown", False, help="Advanced mode provides the absolute optimal policy for each step, while non-advanced mode provides a general policy for each amplification.")
+    hidden_rates_toggle = st.toggle("Hidden Rate", True, help="Whether to account for hidden rates at 4/6 and 5/6 amplification. This is highly recommended to make calculations more reflective of reality.")
     if advanced_mode:
         st.info("Special thanks to @wu6551 for contributing base code for the detailed optimal policy breakdown.")
-        total_cost, policy, gold_tap_cost, expected_catalyst, expected_potent = absolute_policy.get_min_cost(enhancement_level, attempt_cost, st.session_state['gold_price'], CATALYST_COST_MAP)
+        total_cost, policy, gold_tap_cost, expected_catalyst, expected_potent = absolute_policy.get_min_cost(enhancement_level, attempt_cost, st.session_state['gold_price'], CATALYST_COST_MAP, hidden_rates=hidden_rates_toggle)
         st.subheader("Detailed Optimal Policy")
         st.write(f"Average Opal Value: `{total_cost:,.2f}` opals ")
         with st.container(border=True):
@@ -296,10 +262,10 @@ with tab1:
                 st.write(f"Potent Catalyst: `{expected_potent:,.1f}`")
             
         with st.expander("Detailed Policy"):
-            st.write(policy)
+            st.write(absolute_policy.process_policy(policy, enhancement_level))
     else:
         st.warning("Disclaimer: This is a simplified policy. This optimisation assumes that you will always use the same catalyst for each stage (e.g. always using Potent Catalyst at amp 4). In reality, there may be cases you will not want to do so, e.g. when you are already at 6/6 amplification and have a guarantee regardless of whether the catalyst is used. Use the detailed policy generator for more precise recommendations at each step.")
-        optimise_tab(chain_length, base_cost)
+        optimise_tab(chain_length, base_cost, hidden_rates_toggle)
         
 
 
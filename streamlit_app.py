@@ -13,6 +13,8 @@ pages = {
         st.Page("pages/home.py", title="Home"),
         st.Page("pages/optimiser.py", title="Enhancement Optimiser"),
         st.Page("pages/simulator.py", title="Enhancement Simulator"),
+        st.Page("pages/campaign.py", title="Campaign Planner"),
+        st.Page("pages/ladder.py", title="Enhancement Ladder"),
         st.Page("pages/luck.py", title="Luck Scorer"),
         st.Page("pages/dmg.py", title="Abyssal Frontier DMG Forecast (EA)"),
         st.Page("pages/dolphin.py", title="<+15 Enhancement (DEP)"),
@@ -1,8 +1,10 @@
 import numpy as np
+import pandas as pd
 from itertools import product
 from typing import List, Literal, Tuple
 import streamlit as st
 import constants as CONST
+import utils.distribution as distribution
 
 def cartesian_product(list_of_spaces):
     return list(product(*list_of_spaces))
@@ -77,41 +79,6 @@ def get_possible_actions(current_amp: int, n: int):
 
     return tuple(actions_possible)
 
-def get_probability_matrix(current_level: int, hidden_rates: bool = True):
-    """
-    Generate the probability matrix for a given enhancement level and number of enhancements.
-    Args:
-        current_level (int): The current enhancement level.
-        hidden_rates (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
-    """
-    # Define P_a(fail, s)
-    P = {}
-    AMAX = CONST.AMP_THRESHOLDS[current_level]
-    for f in range(7):
-        for amp in range(AMAX+1):
-            # Handle success probability for final amp level
-            if amp == AMAX:
-                base_success_chance = CONST.FAILSAFES[current_level][f]
-                possible_actions = get_possible_actions(amp, AMAX)
-                for action in possible_actions:
-                    adjusted_probability = CONST.CATALYST_MODIFIERS[action](base_success_chance)
-                    P[(action, f, amp, 0)] = adjusted_probability
-            else:
-                for pity in range(7):
-                    if pity == 6:
-                        base_success_chance = 1.0
-                    elif hidden_rates and (pity in (4, 5)):
-                        base_success_chance = 0.5
-                    else:
-                        base_success_chance = 0.2
-
-                    possible_actions = get_possible_actions(amp, AMAX)
-                    for action in possible_actions:
-                        adjusted_probability = CONST.CATALYST_MODIFIERS[action](base_success_chance)
-                        P[(action, f, amp, pity)] = adjusted_probability
-
-    return P
-
 def replace_stars(key: Tuple[int, int] | int, enhancement_level: int) -> str:
     """
     Replaces policy key with stars.
@@ -135,13 +102,41 @@ def replace_stars(key: Tuple[int, int] | int, enhancement_level: int) -> str:
 
         return f'{black_stars}{white_stars} ({p}/6)'
 
+def star_labels(enhancement_level: int, pity_cap: int = 6) -> np.ndarray:
+    """
+    The replace_stars label of every (amp, pity) cell, with the enhancement tap label at the top amp.
+    """
+    n = CONST.AMP_THRESHOLDS[enhancement_level]
+    stars = np.array([replace_stars(a, enhancement_level) for a in range(n + 1)])
+    pity = np.array([f" ({p}/{pity_cap})" for p in range(pity_cap + 1)])
+    labels = np.char.add(stars[:, None], pity[None, :])
+    labels[n, :] = f"{'★' * n} → +{enhancement_level + 1}"
+    return labels
+
 def process_policy(policy: np.ndarray, enhancement_level: int):
-    updated_policy = {CONST.FAILSAFE_TEXT[fs]: {} for fs in range(7)}
-    for k, v in sorted(list(np.ndenumerate(policy)), key=lambda item: str(item[0])):
-        f, a, p = k
-        if v:
-            updated_policy[CONST.FAILSAFE_TEXT[f]][replace_stars((a, p), enhancement_level)] = v
-    return updated_policy
+    """
+    The actions of an action code table keyed by failsafe text and then star label, leaving out unreachable cells.
+    """
+    labels = star_labels(enhancement_level, policy.shape[2] - 1)
+    reachable = policy != UNREACHABLE
+    return {
+        CONST.FAILSAFE_TEXT[f]: dict(zip(labels[reachable[f]].tolist(), ACTION_NAMES[policy[f][reachable[f]]].tolist()))
+        for f in range(policy.shape[0])
+    }
+
+def policy_pivot(policy: np.ndarray, enhancement_level: int, failsafe: int = 0) -> pd.DataFrame:
+    """
+    The action codes of one failsafe as a table with an amp per row, from the enhancement tap down, and a column
+    for the enhancement tap followed by one per pity. Cells without an action hold UNREACHABLE.
+    """
+    n = CONST.AMP_THRESHOLDS[enhancement_level]
+    pity_cap = policy.shape[2] - 1
+    table = np.full((n + 1, pity_cap + 2), UNREACHABLE, dtype=np.uint8)
+    table[0, 0] = policy[failsafe, n, 0]
+    table[1:, 1:] = policy[failsafe, n - 1::-1, :]
+    stars = [replace_stars(a, enhancement_level) for a in range(n, -1, -1)]
+    columns = [f"+{enhancement_level + 1}"] + [f"{p}/{pity_cap}" for p in range(pity_cap + 1)]
+    return pd.DataFrame(table, index=pd.Index(stars, name="Stars"), columns=columns)
 
 def get_success_path(start_state: Tuple[int, int, int], n: int) -> List[Tuple[int, int, int]]:
     f, a, p = start_state
@@ -153,135 +148,444 @@ def get_success_path(start_state: Tuple[int, int, int], n: int) -> List[Tuple[in
     return path
 
 
-def get_min_cost(current_level: int, cost_per_tap_in_gold: int, gems_per_1m: float, catalyst_cost_map: dict, reference_frame: str = "OPALS", hidden_rates: bool = True, start_state: Tuple[int, int, int]=(0,0,0)):
-    AMAX = CONST.AMP_THRESHOLDS[current_level]
-    PMAX = 6
-    FMAX = 6
-    P = get_probability_matrix(current_level, hidden_rates)
+# Integer action codes used by the solver. Ties between equally cheap actions go to the highest code.
+ACTION_CODES = ("No Catalyst", "Catalyst", "Potent Catalyst", "3 Star Catalyst", "4 Star Catalyst")
+UNREACHABLE = len(ACTION_CODES) # Code of cells that can never be reached
+ACTION_NAMES = np.array(ACTION_CODES + (None,), dtype=object)
+
+# Value channels tracked alongside the cost: expected taps, catalysts and potent catalysts (a 3/4 star catalyst counts as 10/40 potents).
+CHANNELS = ("cost", "taps", "catalysts", "potents")
+POTENT_EQUIVALENT = {"Potent Catalyst": 1, "3 Star Catalyst": 10, "4 Star Catalyst": 40}
+
+def get_action_mask(n: int, pad_to: int | None = None) -> np.ndarray:
+    """
+    Boolean (amp, action code) mask of the actions allowed by get_possible_actions.
+
+    Args:
+        n (int): The number of amps
+        pad_to (int): Pads the amp axis to this many amps by inserting amps with no allowed actions
+            before the enhancement tap, so that levels with different amp thresholds can be stacked.
+    """
+    pad_to = n if pad_to is None else pad_to
+    mask = np.zeros((pad_to+1, len(ACTION_CODES)), dtype=bool)
+    for amp in range(n+1):
+        for action in get_possible_actions(amp, n):
+            mask[pad_to if amp == n else amp, ACTION_CODES.index(action)] = True
+    return mask
+
+def get_probability_tensor(current_level: int, hidden_rates: bool = True, n: int | None = None) -> np.ndarray:
+    """
+    Dense (failsafe, amp, pity, action code) tensor of success probabilities.
+    Args:
+        current_level (int): The current enhancement level.
+        hidden_rates (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+        n (int): The number of amps. Defaults to the amp threshold of the level.
+    """
+    AMAX = CONST.AMP_THRESHOLDS[current_level] if n is None else n
+    base = np.full((7, AMAX+1, 7), 0.2)
+    if hidden_rates:
+        base[:, :AMAX, CONST.HIDDEN_PITY:6] = CONST.HIDDEN_PROB
+    base[:, :AMAX, 6] = 1.0
+    base[:, AMAX, :] = np.asarray(CONST.FAILSAFES[current_level])[:, None]
+
+    multiplier, bonus = np.array([CONST.CATALYST_BOOSTS[action] for action in ACTION_CODES]).T
+    # fmin skips the NaN of 0 * inf, so guaranteed catalysts always give 1.
+    with np.errstate(invalid="ignore"):
+        return np.fmin(np.fmin(base[..., None] * multiplier, base[..., None] + bonus), 1.0)
+
+def get_reward_tensor(cost_per_tap_in_gold: int, gems_per_1m: float, catalyst_cost_map: dict, reference_frame: str = "OPALS") -> np.ndarray:
+    """
+    (action code, channel) tensor of what a single tap adds to each of the CHANNELS.
+    """
     R = get_R(cost_per_tap_in_gold, gems_per_1m, catalyst_cost_map, reference_frame)
+    return np.array([
+        [R[action], 1, action == "Catalyst", POTENT_EQUIVALENT.get(action, 0)]
+        for action in ACTION_CODES
+    ], dtype=np.float64)
+
+def _choose(keep: np.ndarray, fail: np.ndarray, rewards: np.ndarray, costs: np.ndarray, risk: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Picks the cheapest action of a cell, given its failure probabilities keep (..., action), the values of failing
+    (..., channel) and the tap costs of the allowed actions (..., action), which are inf for the others.
+    Returns the values of the cell (..., channel) and the chosen codes (...).
+
+    With a risk (...), the last channel holds the variance of the cost and each action is scored by its mean plus
+    risk times its variance. The tap cost is fixed and failing is a coin flip with probability keep, so an action
+    has variance keep * var + keep * (1 - keep) * mean ** 2 over the failure values.
+    """
+    cost = costs + keep * fail[..., None, 0]
+    if risk is not None:
+        variance = keep * (fail[..., None, -1] + (1 - keep) * fail[..., None, 0] ** 2)
+        cost = cost + risk[..., None] * variance
+    best = cost.shape[-1] - 1 - np.argmin(cost[..., ::-1], axis=-1)
+    index = best[..., None, None]
+    best_keep = np.take_along_axis(keep, best[..., None], axis=-1)
+    values = np.take_along_axis(rewards, index, axis=-2)[..., 0, :] + best_keep * fail
+    if risk is not None:
+        values[..., -1] = np.take_along_axis(variance, best[..., None], axis=-1)[..., 0]
+    return values, best
+
+def solve_policy(probs: np.ndarray, rewards: np.ndarray, mask: np.ndarray, risk: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Backward induction over (failsafe, amp, pity) for any number of amps.
 
-    X = np.full((FMAX+1, AMAX+1, PMAX+1), np.inf)
-    policy = np.empty((FMAX+1, AMAX+1, PMAX+1), dtype=object)
-    expected_taps = np.full((FMAX+1, AMAX+1, PMAX+1), 0.0)
-    expected_catalyst = np.full((FMAX+1, AMAX+1, PMAX+1), 0.0)
-    expected_potent = np.full((FMAX+1, AMAX+1, PMAX+1), 0.0)
+    Failing an amp tap at (f, a, p) costs the climb back to amp a, which is the prefix sum of X[(f, k, 0)] for k < a,
+    plus X[(f, a, p+1)]. Amp cells never look at another failsafe, so every round is solved at once along the failsafe
+    axis, and the action axis is minimised in the same array operation. Only the enhancement tap chains the rounds:
+    failing it costs the whole of the next failsafe's round. Any leading axes of probs and rewards are solved together
+    as a batch.
 
-    f=0
+    Args:
+        probs (np.ndarray): (..., failsafe, amp, pity, action) success probabilities, e.g. from get_probability_tensor.
+        rewards (np.ndarray): (..., action, channel) values of a single tap, e.g. from get_reward_tensor.
+        mask (np.ndarray): (..., amp, action) allowed actions, e.g. from get_action_mask. Amps with no allowed
+            action are padding: they cost nothing and are skipped by every climb.
+        risk (np.ndarray): (...) weights of the cost variance, see solve_risk_policy. If given, a variance channel
+            is appended to the values and every cell minimises its mean plus risk times its variance.
+
+    Returns:
+        values (..., failsafe, amp, pity, channel) and uint8 action codes (..., failsafe, amp, pity), with UNREACHABLE
+        and an infinite cost in cells that can never be reached, and UNREACHABLE and zero values in padded amps.
+    """
+    FMAX, AMAX, PMAX = (size - 1 for size in probs.shape[-4:-1])
+    batch = np.broadcast_shapes(probs.shape[:-4], rewards.shape[:-2])
+    amp_risk = None
+    if risk is not None:
+        # A single tap has a fixed cost, so its variance channel is zero.
+        rewards = np.concatenate([rewards, np.zeros(rewards.shape[:-1] + (1,))], axis=-1)
+        batch = np.broadcast_shapes(batch, np.shape(risk))
+        risk = np.broadcast_to(risk, batch)
+        amp_risk = risk[..., None]
+    values = np.zeros(batch + (FMAX+1, AMAX+1, PMAX+1, rewards.shape[-1]))
+    values[..., 0] = np.inf
+    codes = np.full(batch + (FMAX+1, AMAX+1, PMAX+1), UNREACHABLE, dtype=np.uint8)
+    no_catalyst = ACTION_CODES.index("No Catalyst")
+
+    keep = np.broadcast_to(1 - probs, batch + probs.shape[-4:])
+    taps = np.broadcast_to(rewards[..., None, :, :], batch + (FMAX+1,) + rewards.shape[-2:])
+    costs = np.where(mask[..., None, :, :], taps[..., None, :, 0], np.inf)
+    padded = ~mask.any(axis=-1)
+
+    climb = np.zeros(batch + (FMAX+1, rewards.shape[-1]))
+    for a in range(AMAX):
+        # The last pity always succeeds, so a catalyst would be wasted.
+        values[..., a, PMAX, :] = taps[..., no_catalyst, :]
+        codes[..., a, PMAX] = no_catalyst
+        for p in reversed(range(PMAX)):
+            values[..., a, p, :], codes[..., a, p] = _choose(keep[..., a, p, :], climb + values[..., a, p+1, :], taps, costs[..., a, :], amp_risk)
+        if padded[..., a].any():
+            pad = padded[..., a][..., None, None, None]
+            values[..., a, :, :] = np.where(pad, 0.0, values[..., a, :, :])
+            codes[..., a, :] = np.where(pad[..., 0], UNREACHABLE, codes[..., a, :])
+        climb = climb + values[..., a, 0, :]
+
+    next_round = None
     for f in reversed(range(FMAX+1)):
-        for a in range(AMAX+1):
-            for p in reversed(range(PMAX+1)):
-                if a == AMAX:
-                    if f == FMAX:
-                        X[(f,a,0)] = R["No Catalyst"]
-                        policy[(f,a,0)] = "No Catalyst"
-                        expected_taps[(f,a,0)] = 1
-                        expected_catalyst[(f,a,0)] = 0
-                        expected_potent[(f,a,0)] = 0
-                    elif p == 0:
-                        cost_if_fail = 0
-                        fail_taps = 0
-                        fail_catalysts_used = 0
-                        fail_potents_used = 0
-    
-                        for k in range(a+1): # Need to go through success chain of f+1 if fail.
-                            cost_if_fail += X[(f+1, k, 0)]
-                            fail_taps += expected_taps[(f+1, k, 0)]
-                            fail_catalysts_used += expected_catalyst[(f+1, k, 0)]
-                            fail_potents_used += expected_potent[(f+1, k, 0)]
-
-                        for action in get_possible_actions(a, AMAX):
-                            p_success = P[(action,f,a,p)]
-                            cost_under_action = R[action] + (1-p_success) * cost_if_fail
-                            taps_under_action = 1 + (1-p_success) * fail_taps
-                            if action == "Catalyst":
-                                catalysts_under_action = 1 + (1-p_success) * fail_catalysts_used
-                            else:
-                                catalysts_under_action = (1-p_success) * fail_catalysts_used
-
-                            if action == "Potent Catalyst":
-                                potents_under_action = 1 + (1-p_success) * fail_potents_used
-                            elif action == "3 Star Catalyst":
-                                potents_under_action = 10 + (1-p_success) * fail_potents_used
-                            elif action == "4 Star Catalyst":
-                                potents_under_action = 40 + (1-p_success) * fail_potents_used
-                            else:
-                                potents_under_action = (1-p_success) * fail_potents_used
-
-                            if cost_under_action <= X[(f,a,p)]:
-                                X[(f,a,p)] = cost_under_action
-                                policy[(f,a,p)] = action
-                                expected_taps[(f,a,p)] = taps_under_action
-                                expected_catalyst[(f,a,p)] = catalysts_under_action
-                                expected_potent[(f,a,p)] = potents_under_action
-
-                elif p == 6:
-                    X[(f,a,p)] = R["No Catalyst"]
-                    policy[(f,a,p)] = "No Catalyst"
-                    expected_taps[(f,a,p)] = 1
-                    expected_catalyst[(f,a,p)] = 0
-                    expected_potent[(f,a,p)] = 0
-                else:
-                    cost_if_fail = 0
-                    fail_taps = 0
-                    fail_catalysts_used = 0
-                    fail_potents_used = 0
-
-                    for k in range(a):
-                        cost_if_fail += X[(f,k,0)]
-                        fail_taps += expected_taps[(f,k,0)]
-                        fail_catalysts_used += expected_catalyst[(f,k,0)]
-                        fail_potents_used += expected_potent[(f,k,0)]
-
-                    cost_if_fail += X[(f, a, p+1)]
-                    fail_taps += expected_taps[(f, a, p+1)]
-                    fail_catalysts_used += expected_catalyst[(f, a, p+1)]
-                    fail_potents_used += expected_potent[(f, a, p+1)]
-
-                    for action in get_possible_actions(a, AMAX):
-                        p_success = P[(action,f,a,p)]
-                        cost_under_action = R[action] + (1-p_success) * cost_if_fail
-                        taps_under_action = 1 + (1-p_success) * fail_taps
-
-                        if action == "Catalyst":
-                            catalysts_under_action = 1 + (1-p_success) * fail_catalysts_used
-                        else:
-                            catalysts_under_action = (1-p_success) * fail_catalysts_used
-
-                        if action == "Potent Catalyst":
-                            potents_under_action = 1 + (1-p_success) * fail_potents_used
-                        elif action == "3 Star Catalyst":
-                            potents_under_action = 10 + (1-p_success) * fail_potents_used
-                        elif action == "4 Star Catalyst":
-                            potents_under_action = 40 + (1-p_success) * fail_potents_used
-                        else:
-                            potents_under_action = (1-p_success) * fail_potents_used
-
-
-                        if cost_under_action <= X[(f,a,p)]:
-                            X[(f,a,p)] = cost_under_action
-                            policy[(f,a,p)] = action
-                            expected_taps[(f,a,p)] = taps_under_action
-                            expected_catalyst[(f,a,p)] = catalysts_under_action
-                            expected_potent[(f,a,p)] = potents_under_action
-
-    total_cost = 0
-    total_taps = 0
-    catalyst_cost = 0
-    potent_cost = 0
-
-    success_path = get_success_path(start_state, AMAX)
-
-    for idx in success_path:
-        total_cost += X[idx]
-        total_taps += expected_taps[idx]
-        catalyst_cost += expected_catalyst[idx]
-        potent_cost += expected_potent[idx]
+        if f == FMAX:
+            values[..., f, AMAX, 0, :] = taps[..., f, no_catalyst, :]
+            codes[..., f, AMAX, 0] = no_catalyst
+        else:
+            values[..., f, AMAX, 0, :], codes[..., f, AMAX, 0] = _choose(keep[..., f, AMAX, 0, :], next_round, taps[..., f, :, :], costs[..., f, AMAX, :], risk)
+        next_round = climb[..., f, :] + values[..., f, AMAX, 0, :]
 
-    if reference_frame == "OPALS":
-        opals_used_for_gold = total_cost - catalyst_cost  * catalyst_cost_map['Catalyst'] - potent_cost * catalyst_cost_map['Potent Catalyst']
-        gold_tap_cost = opals_used_for_gold/gems_per_1m * 1_000_000
-    elif reference_frame == "GOLD":
-        total_opals_used_for_catalyst = catalyst_cost  * catalyst_cost_map['Catalyst'] + potent_cost * catalyst_cost_map['Potent Catalyst']
-        gold_tap_cost = (total_cost - total_opals_used_for_catalyst) / gems_per_1m * 1000000
+    return values, codes
+
+def state_values(values: np.ndarray) -> np.ndarray:
+    """
+    The expected remaining values from every (failsafe, amp, pity) state until the level passes, i.e. the sum over
+    get_success_path for every start state at once, from the (..., failsafe, amp, pity, channel) values of
+    solve_policy.
+    """
+    rest = np.zeros_like(values[..., 0, :])
+    rest[..., :-1, :] = np.cumsum(values[..., :0:-1, 0, :], axis=-2)[..., ::-1, :]
+    return values + rest[..., None, :]
+
+class PolicyTables:
+    """
+    The part of get_min_cost that does not depend on the start state: the values and policy of every cell. Any
+    start state is then a query on the tables without solving again.
+    """
+    def __init__(self, current_level: int, values: np.ndarray, policy: np.ndarray, gems_per_1m: float, catalyst_cost_map: dict, reference_frame: str = "OPALS"):
+        self.current_level = current_level
+        self.values = values
+        self.policy = policy
+        self.gems_per_1m = gems_per_1m
+        self.catalyst_cost_map = catalyst_cost_map
+        self.reference_frame = reference_frame
+
+    def query(self, start_state: Tuple[int, int, int] = (0,0,0)):
+        """
+        The get_min_cost result from start_state.
+        """
+        success_path = get_success_path(start_state, CONST.AMP_THRESHOLDS[self.current_level])
+        total_cost, total_taps, catalyst_cost, potent_cost = self.values[tuple(np.array(success_path).T)].sum(axis=0)
+
+        if self.reference_frame == "OPALS":
+            opals_used_for_gold = total_cost - catalyst_cost  * self.catalyst_cost_map['Catalyst'] - potent_cost * self.catalyst_cost_map['Potent Catalyst']
+            gold_tap_cost = opals_used_for_gold/self.gems_per_1m * 1_000_000
+        elif self.reference_frame == "GOLD":
+            total_opals_used_for_catalyst = catalyst_cost  * self.catalyst_cost_map['Catalyst'] + potent_cost * self.catalyst_cost_map['Potent Catalyst']
+            gold_tap_cost = (total_cost - total_opals_used_for_catalyst) / self.gems_per_1m * 1000000
+
+        return total_cost, self.policy, gold_tap_cost, catalyst_cost, potent_cost
+
+    def state_values(self) -> np.ndarray:
+        """
+        The expected remaining (cost, taps, catalysts, potents) from every (failsafe, amp, pity) state, with an
+        infinite cost in states that can never be reached.
+        """
+        return state_values(self.values)
+
+def solve_tables(current_level: int, cost_per_tap_in_gold: int, gems_per_1m: float, catalyst_cost_map: dict, reference_frame: str = "OPALS", hidden_rates: bool = True) -> PolicyTables:
+    AMAX = CONST.AMP_THRESHOLDS[current_level]
+    probs = get_probability_tensor(current_level, hidden_rates)
+    rewards = get_reward_tensor(cost_per_tap_in_gold, gems_per_1m, catalyst_cost_map, reference_frame)
+    values, policy = solve_policy(probs, rewards, get_action_mask(AMAX))
+    return PolicyTables(current_level, values, policy, gems_per_1m, catalyst_cost_map, reference_frame)
+
+def get_min_cost(current_level: int, cost_per_tap_in_gold: int, gems_per_1m: float, catalyst_cost_map: dict, reference_frame: str = "OPALS", hidden_rates: bool = True, start_state: Tuple[int, int, int]=(0,0,0)):
+    return solve_tables(current_level, cost_per_tap_in_gold, gems_per_1m, catalyst_cost_map, reference_frame, hidden_rates).query(start_state)
 
-    return total_cost, policy, gold_tap_cost, catalyst_cost, potent_cost
+def get_batch_tensors(levels: List[int], gems_per_1m: np.ndarray, catalyst_prices: np.ndarray, potent_prices: np.ndarray, cost_per_tap_in_gold: List[int] | None = None, hidden_rates: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Builds the solve_policy inputs for every combination of levels, gold prices, catalyst prices and potent catalyst
+    prices, with the amp axis padded to the largest amp threshold among the levels. As on the app pages, a 3 Star /
+    4 Star catalyst is valued at 10 / 40 potent catalysts.
+
+    Returns:
+        probs (levels, 1, 1, 1, failsafe, amp, pity, action), rewards (levels, gold prices, catalyst prices,
+        potent prices, action, channel) and mask (levels, 1, 1, 1, amp, action).
+    """
+    gems_per_1m, catalyst_prices, potent_prices = (np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in (gems_per_1m, catalyst_prices, potent_prices))
+    cost_per_tap_in_gold = np.array([CONST.TAP_COST[level] for level in levels] if cost_per_tap_in_gold is None else cost_per_tap_in_gold, dtype=np.float64)
+    AMAX = max(CONST.AMP_THRESHOLDS[level] for level in levels)
+
+    probs = np.stack([get_probability_tensor(level, hidden_rates, AMAX) for level in levels])
+    mask = np.stack([get_action_mask(CONST.AMP_THRESHOLDS[level], AMAX) for level in levels])
+
+    tap_cost = cost_per_tap_in_gold[:, None, None, None] / 1_000_000 * gems_per_1m[None, :, None, None]
+    catalyst_cost = {
+        "No Catalyst": np.zeros(1),
+        "Catalyst": catalyst_prices[None, None, :, None],
+        "Potent Catalyst": potent_prices[None, None, None, :],
+        "3 Star Catalyst": potent_prices[None, None, None, :] * POTENT_EQUIVALENT["3 Star Catalyst"],
+        "4 Star Catalyst": potent_prices[None, None, None, :] * POTENT_EQUIVALENT["4 Star Catalyst"],
+    }
+    shape = (len(levels), len(gems_per_1m), len(catalyst_prices), len(potent_prices))
+    rewards = np.zeros(shape + (len(ACTION_CODES), len(CHANNELS)))
+    for code, action in enumerate(ACTION_CODES):
+        rewards[..., code, 0] = tap_cost + catalyst_cost[action]
+        rewards[..., code, 1:] = [1, action == "Catalyst", POTENT_EQUIVALENT.get(action, 0)]
+
+    return probs[:, None, None, None], rewards, mask[:, None, None, None]
+
+def get_min_cost_batch(levels: List[int], gems_per_1m: np.ndarray, catalyst_prices: np.ndarray, potent_prices: np.ndarray, cost_per_tap_in_gold: List[int] | None = None, hidden_rates: bool = True, start_state: Tuple[int, int, int] = (0,0,0)):
+    """
+    Solves every combination of levels, gold prices, catalyst prices and potent catalyst prices in a single
+    broadcast solve_policy call. See get_batch_tensors for how the scenarios are laid out.
+
+    Args:
+        levels (List[int]): The enhancement levels.
+        gems_per_1m (np.ndarray): The gold prices (opals per 1M gold).
+        catalyst_prices (np.ndarray): The catalyst prices in opals.
+        potent_prices (np.ndarray): The potent catalyst prices in opals.
+        cost_per_tap_in_gold (List[int]): The gold cost of a tap for each level. Defaults to CONST.TAP_COST.
+        hidden_rates (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+        start_state (Tuple[int, int, int]): The current (failsafe, amp, pity), shared by every level.
+
+    Returns:
+        total_cost, gold_tap_cost, catalyst_cost and potent_cost of shape (levels, gold prices, catalyst prices,
+        potent prices), and the action codes of the policy with (failsafe, amp, pity) appended to that shape.
+        UNREACHABLE marks unreachable and padded cells; ACTION_NAMES[codes] gives the action names.
+    """
+    probs, rewards, mask = get_batch_tensors(levels, gems_per_1m, catalyst_prices, potent_prices, cost_per_tap_in_gold, hidden_rates)
+    values, codes = solve_policy(probs, rewards, mask)
+
+    success_path = get_success_path(start_state, probs.shape[-3] - 1)
+    totals = values[(...,) + tuple(np.array(success_path).T) + (slice(None),)].sum(axis=-2)
+    total_cost, total_taps, catalyst_cost, potent_cost = np.moveaxis(totals, -1, 0)
+    cost_per_tap_in_gold = np.array([CONST.TAP_COST[level] for level in levels] if cost_per_tap_in_gold is None else cost_per_tap_in_gold, dtype=np.float64)
+    gold_tap_cost = total_taps * cost_per_tap_in_gold[:, None, None, None]
+
+    return total_cost, codes, gold_tap_cost, catalyst_cost, potent_cost
+
+# The prices a cost curve can be traced along, with the range traced by default.
+PRICE_RANGES = {"gold": (10.0, 1000.0), "catalyst": (1.0, 2000.0), "potent": (10.0, 10000.0)}
+
+def set_price(axis: str, price: float, gems_per_1m: float, catalyst_cost_map: dict) -> Tuple[float, dict]:
+    """
+    Sets one price, keeping 3 Star / 4 Star catalysts at 10 / 40 potent catalysts as the app pages do.
+    """
+    catalyst_cost_map = dict(catalyst_cost_map)
+    if axis == "gold":
+        gems_per_1m = price
+    elif axis == "catalyst":
+        catalyst_cost_map["Catalyst"] = price
+    elif axis == "potent":
+        catalyst_cost_map["Potent Catalyst"] = price
+        catalyst_cost_map["3 Star Catalyst"] = price * POTENT_EQUIVALENT["3 Star Catalyst"]
+        catalyst_cost_map["4 Star Catalyst"] = price * POTENT_EQUIVALENT["4 Star Catalyst"]
+    else:
+        raise ValueError(f"Unknown price axis {axis}, expected one of {list(PRICE_RANGES)}")
+    return gems_per_1m, catalyst_cost_map
+
+def _reachable(start_state: Tuple[int, int, int], shape: Tuple[int, ...]) -> np.ndarray:
+    f0, a0, p0 = start_state
+    f, a, p = np.indices(shape)
+    return (f > f0) | ((f == f0) & ((a > a0) | ((a == a0) & (p >= p0))))
+
+def policy_changes(previous: np.ndarray, policy: np.ndarray, current_level: int, start_state: Tuple[int, int, int] = (0,0,0)) -> List[str]:
+    """
+    Describes the cells reachable from start_state whose action differs between two policies.
+    """
+    changed = (policy != previous) & _reachable(start_state, policy.shape)
+    return [f"{CONST.FAILSAFE_TEXT[f]} {replace_stars((a, p), current_level)}: {ACTION_NAMES[previous[f, a, p]]} → {ACTION_NAMES[policy[f, a, p]]}" for f, a, p in zip(*np.nonzero(changed))]
+
+def get_price_curve(current_level: int, cost_per_tap_in_gold: int, gems_per_1m: float, catalyst_cost_map: dict, axis: str = "gold", price_range: Tuple[float, float] | None = None, hidden_rates: bool = True, start_state: Tuple[int, int, int] = (0,0,0), tol: float = 1e-9) -> pd.DataFrame:
+    """
+    Traces the optimal expected cost in opals along one price as a piecewise-linear curve.
+
+    A fixed policy costs intercept + slope * price, where the slope is its expected gold (in millions), catalysts or
+    potent catalysts. The optimal cost is the lower envelope of these lines. It is found by intersecting the lines
+    of the policies at both ends of an interval and solving at the crossing: if nothing beats the two lines there,
+    the crossing is a breakpoint, otherwise the interval is split at it.
+
+    Args:
+        current_level (int): The current enhancement level.
+        cost_per_tap_in_gold (int): The gold cost of a tap.
+        gems_per_1m (float): The gold price (opals per 1M gold).
+        catalyst_cost_map (dict): The opal cost of each catalyst.
+        axis (str): The price to vary, one of "gold", "catalyst" or "potent".
+        price_range (Tuple[float, float]): The prices to trace. Defaults to PRICE_RANGES[axis].
+        hidden_rates (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+        start_state (Tuple[int, int, int]): The current (failsafe, amp, pity).
+        tol (float): Relative tolerance when comparing costs.
+
+    Returns:
+        One row per policy region in price order, with its start and end price, intercept and slope, the policy and
+        the reachable cells whose action changed from the previous region.
+    """
+    def solve(price: float) -> dict:
+        gems, cost_map = set_price(axis, price, gems_per_1m, catalyst_cost_map)
+        total_cost, policy, gold_tap_cost, catalyst_cost, potent_cost = get_min_cost(current_level, cost_per_tap_in_gold, gems, cost_map, hidden_rates=hidden_rates, start_state=start_state)
+        slope = {"gold": gold_tap_cost / 1_000_000, "catalyst": catalyst_cost, "potent": potent_cost}[axis]
+        return {"intercept": total_cost - slope * price, "slope": slope, "policy": policy}
+
+    def crossing(left: dict, right: dict) -> float | None:
+        if np.isclose(left["slope"], right["slope"], rtol=tol, atol=0):
+            return None
+        return (right["intercept"] - left["intercept"]) / (left["slope"] - right["slope"])
+
+    low, high = PRICE_RANGES[axis] if price_range is None else price_range
+    regions = [(low, solve(low)), (high, solve(high))]
+    breakpoints = []
+    stack = [(regions[0][1], regions[1][1], low, high)]
+    while stack:
+        left, right, start, end = stack.pop()
+        price = crossing(left, right)
+        if price is None or not start < price < end:
+            continue
+        middle = solve(price)
+        envelope = left["intercept"] + left["slope"] * price
+        if middle["intercept"] + middle["slope"] * price >= envelope - tol * abs(envelope):
+            breakpoints.append((price, right))
+        else:
+            stack += [(left, middle, start, price), (middle, right, price, end)]
+
+    bounds = [low] + sorted(price for price, _ in breakpoints) + [high]
+    lines = [regions[0][1]] + [line for _, line in sorted(breakpoints, key=lambda item: item[0])]
+
+    rows = []
+    for i, line in enumerate(lines):
+        changes = policy_changes(lines[i - 1]["policy"], line["policy"], current_level, start_state) if i > 0 else []
+        rows.append({"start": bounds[i], "end": bounds[i + 1], "intercept": line["intercept"], "slope": line["slope"], "policy": line["policy"], "changes": changes})
+    return pd.DataFrame(rows)
+
+def price_curve_cost(curve: pd.DataFrame, price: float) -> float | None:
+    """
+    Re-prices from a curve from get_price_curve without solving, or returns None outside its range.
+    """
+    if not curve["start"].iloc[0] <= price <= curve["end"].iloc[-1]:
+        return None
+    row = curve.iloc[min(np.searchsorted(curve["end"].to_numpy(), price, side="left"), len(curve) - 1)]
+    return row["intercept"] + row["slope"] * price
+
+# Risk weights of the frontier, in units of one over the risk-neutral expected cost so they do not depend on prices.
+RISK_LEVELS = np.concatenate([[0.0], np.geomspace(0.01, 100, 25)])
+
+def get_risk_frontier(current_level: int, cost_per_tap_in_gold: int, gems_per_1m: float, catalyst_cost_map: dict, hidden_rates: bool = True, start_state: Tuple[int, int, int] = (0,0,0), risk_levels: np.ndarray = RISK_LEVELS, alpha: float = 0.9, tol: float = 1e-9) -> pd.DataFrame:
+    """
+    Traces the mean-variance efficient frontier of policies in opals.
+
+    The second moment is tracked through the same backward induction as the expected cost, and every cell minimises
+    its mean plus risk times its variance given the optimal play after it. Every risk level is solved in a single
+    batched solve_policy call. Risk 0 is the get_min_cost policy, and larger risks trade a higher expected cost for a
+    narrower spread. The quantile and CVaR at alpha of each distinct policy come from its exact cost distribution.
+
+    Args:
+        current_level (int): The current enhancement level.
+        cost_per_tap_in_gold (int): The gold cost of a tap.
+        gems_per_1m (float): The gold price (opals per 1M gold).
+        catalyst_cost_map (dict): The opal cost of each catalyst.
+        hidden_rates (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+        start_state (Tuple[int, int, int]): The current (failsafe, amp, pity).
+        risk_levels (np.ndarray): The risk weights to solve, relative to one over the risk-neutral expected cost.
+        alpha (float): The level of the quantile and CVaR columns.
+        tol (float): Relative tolerance when comparing expected costs.
+
+    Returns:
+        One row per risk level with the expected cost, its standard deviation, quantile and CVaR, the expected taps,
+        catalysts and potent catalysts, the policy and whether no other row has both a lower mean and std.
+    """
+    AMAX = CONST.AMP_THRESHOLDS[current_level]
+    probs = get_probability_tensor(current_level, hidden_rates)
+    rewards = get_reward_tensor(cost_per_tap_in_gold, gems_per_1m, catalyst_cost_map)
+    mask = get_action_mask(AMAX)
+    success_path = tuple(np.array(get_success_path(start_state, AMAX)).T)
+
+    neutral, _ = solve_policy(probs, rewards, mask)
+    risk_levels = np.asarray(risk_levels, dtype=np.float64)
+    values, codes = solve_policy(probs, rewards, mask, risk_levels / neutral[success_path + (0,)].sum())
+    totals = values[(slice(None),) + success_path].sum(axis=1)
+
+    tap_cost = cost_per_tap_in_gold / 1_000_000 * gems_per_1m
+    tails = {}
+    rows = []
+    for risk, (mean, taps, catalysts, potents, variance), policy in zip(risk_levels, totals, codes):
+        key = policy.tobytes()
+        std = np.sqrt(max(variance, 0.0))
+        if key not in tails:
+            cost = distribution.cost_distribution(current_level, ACTION_NAMES[policy], tap_cost, catalyst_cost_map, scale=mean + 10 * std, hidden_r=hidden_rates, start_state=start_state)
+            tails[key] = (cost.quantile(alpha), cost.cvar(alpha))
+        quantile, cvar = tails[key]
+        rows.append({"risk": risk, "mean": mean, "std": std, "quantile": quantile, "cvar": cvar, "taps": taps, "catalysts": catalysts, "potents": potents, "policy": policy})
+    frontier = pd.DataFrame(rows)
+
+    # Each cell only weighs the variance of its own remainder, so a large risk can overshoot into policies that
+    # are worse on both counts.
+    mean, std = frontier["mean"].to_numpy(), frontier["std"].to_numpy()
+    dominated = (mean[None, :] < mean[:, None] * (1 - tol)) & (std[None, :] <= std[:, None])
+    frontier["efficient"] = ~dominated.any(axis=1)
+    return frontier
+
+def get_risk_policy(current_level: int, cost_per_tap_in_gold: int, gems_per_1m: float, catalyst_cost_map: dict, objective: Literal["variance", "cvar"] = "variance", risk: float = 1.0, alpha: float = 0.9, hidden_rates: bool = True, start_state: Tuple[int, int, int] = (0,0,0)) -> Tuple[pd.Series, pd.DataFrame]:
+    """
+    The risk-sensitive policy in opals together with the efficient frontier from get_risk_frontier.
+
+    With the "variance" objective the policy minimises the mean plus risk times the variance, with risk relative to
+    one over the risk-neutral expected cost. With the "cvar" objective it is the frontier policy with the lowest CVaR
+    at alpha, the expected cost of the worst 1 - alpha of outcomes. CVaR is not time-consistent, so it is minimised
+    over the frontier rather than by a backward induction of its own.
+
+    Returns:
+        The frontier row of the chosen policy and the frontier.
+    """
+    if objective not in ("variance", "cvar"):
+        raise ValueError(f"Unknown objective {objective}, expected 'variance' or 'cvar'")
+    risk_levels = np.union1d(RISK_LEVELS, [risk]) if objective == "variance" else RISK_LEVELS
+    frontier = get_risk_frontier(current_level, cost_per_tap_in_gold, gems_per_1m, catalyst_cost_map, hidden_rates, start_state, risk_levels, alpha)
+    if objective == "variance":
+        best = int(np.flatnonzero(frontier["risk"] == risk)[0])
+    else:
+        best = int(frontier["cvar"].idxmin())
+    return frontier.iloc[best], frontier
@@ -0,0 +1,110 @@
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+import constants as CONST
+from utils.simulation import boost
+
+HARD_PITY = 7
+
+def pity_prob(base_prob: np.ndarray | float, hard_pity: int = HARD_PITY) -> np.ndarray:
+    """
+    The per-tap success rate that gives the same expected taps as base_prob with a hard pity. A success is
+    guaranteed by the hard_pity-th tap, so the expected taps are sum((1 - p) ** k for k < hard_pity).
+    """
+    base_prob = np.asarray(base_prob, dtype=np.float64)
+    return base_prob / (1 - (1 - base_prob) ** hard_pity)
+
+def hidden_pity_prob(base_prob: np.ndarray | float, hidden_prob: np.ndarray | float, hard_pity: int = HARD_PITY) -> np.ndarray:
+    """
+    pity_prob with hidden rates, where the taps from CONST.HIDDEN_PITY up to the hard pity succeed at hidden_prob
+    if it is higher than base_prob. The expected taps are (1 - q ** H) / p + q ** H * sum((1 - h) ** k) over the
+    hard_pity - H taps from H on, with q = 1 - p and H = CONST.HIDDEN_PITY.
+    """
+    base_prob = np.asarray(base_prob, dtype=np.float64)
+    hidden_prob = np.fmax(base_prob, hidden_prob)
+    survival = (1 - base_prob) ** CONST.HIDDEN_PITY
+    hidden_taps = sum((1 - hidden_prob) ** k for k in range(hard_pity - CONST.HIDDEN_PITY))
+    return 1 / ((1 - survival) / base_prob + survival * hidden_taps)
+
+def catalyst_prob(catalyst: str, hidden_r: bool = False) -> float:
+    """
+    The pity-equivalent success rate of an amp tap with a catalyst, see pity_prob and hidden_pity_prob.
+    """
+    base_prob = CONST.CATALYST_PROB_MAP[catalyst]
+    if hidden_r:
+        return hidden_pity_prob(base_prob, boost(CONST.HIDDEN_PROB, catalyst))
+    return pity_prob(base_prob)
+
+def reset_visits(probs: np.ndarray) -> np.ndarray:
+    """
+    Expected taps at each step of a chain where a failure restarts from the first step, e.g. the amplifications
+    of a failsafe round, given the (..., step) success rates.
+
+    Every step is entered once more for each of its own failures and those of every step above it, so step i is
+    tapped 1 / prod(probs[i:]) times on average.
+    """
+    return 1 / np.cumprod(probs[..., ::-1], axis=-1)[..., ::-1]
+
+def drop_visits(probs: np.ndarray, keeps: np.ndarray, start: int = 0) -> np.ndarray:
+    """
+    Expected taps at each step of a chain where a failure drops one step unless keeps is set, e.g. the levels
+    below +15, given the (..., step) success rates, when climbing from step start to the top. A failure at the
+    first step always stays.
+
+    Passing step i takes (e_i + (1 - p_i) * U_{i-1}) / p_i taps per step, where U_{i-1} are the taps to pass
+    step i - 1 again after dropping to it.
+    """
+    n = probs.shape[-1]
+    eye = np.eye(n)
+    below = np.zeros(probs.shape[:-1] + (n,))
+    visits = np.zeros_like(below)
+    for i in range(n):
+        p = probs[..., i, None]
+        drop = 0.0 if i == 0 else np.where(keeps[..., i, None], 0.0, (1 - p) * below)
+        below = (eye[i] + drop) / p
+        if i >= start:
+            visits += below
+    return visits
+
+def rank_selections(options: Sequence[Sequence[str]], base_cost: float, catalyst_cost_map: Dict[str, float], top_k: int | None = 1, drops: bool = False, stable_steps: Sequence[int] = (), start: int = 0, hidden_r: bool = False) -> List[Tuple[Tuple[str, ...], float, float, Dict[str, float]]]:
+    """
+    Ranks every per-step catalyst selection of a chain by expected cost.
+
+    All selections are laid out as rows of index arrays and costed at once with the O(n) recurrences of
+    reset_visits or drop_visits, so no transition matrix is built or inverted.
+
+    Args:
+        options (Sequence[Sequence[str]]): The catalysts to choose from at each step.
+        base_cost (float): The opal cost of a tap without catalyst.
+        catalyst_cost_map (Dict[str, float]): The opal cost of each catalyst.
+        top_k (int): The number of selections to return, or None for all of them.
+        drops (bool): Whether a failure drops one step (below +15) instead of restarting the chain (amplification).
+        stable_steps (Sequence[int]): The steps where a Stable Catalyst keeps the step on failure, if drops.
+        start (int): The step the climb starts from, if drops.
+        hidden_r (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification, see catalyst_prob.
+
+    Returns:
+        (selection, expected cost, expected taps, expected use of each selected catalyst) from cheapest up.
+        Selections that cost the same keep the order of itertools.product.
+    """
+    n = len(options)
+    index = np.indices([len(o) for o in options]).reshape(n, -1).T
+    steps = np.arange(n)
+    probs = np.stack([np.array([catalyst_prob(c, hidden_r) for c in o])[index[:, i]] for i, o in enumerate(options)], axis=1)
+    costs = np.stack([np.array([catalyst_cost_map[c] + base_cost for c in o])[index[:, i]] for i, o in enumerate(options)], axis=1)
+    if drops:
+        keeps = np.stack([np.array([c == "Stable Catalyst" and i in stable_steps for c in o])[index[:, i]] for i, o in enumerate(options)], axis=1)
+        visits = drop_visits(probs, keeps, start)
+    else:
+        visits = reset_visits(probs)
+
+    total_costs = (visits * costs).sum(axis=1)
+    order = np.argsort(total_costs, kind="stable")[:top_k]
+
+    ranked = []
+    for row in order:
+        selection = tuple(options[i][j] for i, j in zip(steps, index[row]))
+        catalyst_usage = {}
+        for catalyst, taps in zip(selection, visits[row]):
+            catalyst_usage[catalyst] = catalyst_usage.get(catalyst, 0) + taps
+        ranked.append((selection, float(total_costs[row]), float(visits[row].sum()), catalyst_usage))
+    return ranked
@@ -0,0 +1,211 @@
+import io
+import os
+import json
+import functools
+import numpy as np
+import pandas as pd
+from typing import Iterator, List, Sequence, Tuple
+import constants as CONST
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+MODEL_PATH = os.path.join(STATIC_DIR, "abyss_model_0.1.pkl")
+COMPILED_MODEL_PATH = os.path.join(STATIC_DIR, "abyss_model_0.1.npz")
+CLASS_STD_PATH = os.path.join(STATIC_DIR, "class_std.json")
+CHUNK_ROWS = 50_000 # Rows read, predicted and written at a time, which bounds memory however large the file is
+OUTPUT_COLUMNS = ("dmg", "dmg_lower", "dmg_upper")
+DECIMALS = 2 # Damage is written rounded, which also roughly halves the time spent formatting the CSV
+
+@functools.lru_cache
+def class_std(path: str = CLASS_STD_PATH) -> pd.Series:
+    """
+    The relative standard deviation of damage for each class, read once per process. Treat it as read-only.
+    """
+    with open(path) as f:
+        return pd.Series(json.load(f), dtype=np.float64)
+
+def _horner(coef: np.ndarray, bp: np.ndarray) -> np.ndarray:
+    """
+    Evaluates polynomials with (..., power) coefficients from the constant term up at bp, which broadcasts
+    against coef[..., 0].
+    """
+    y = np.broadcast_to(coef[..., -1], np.broadcast_shapes(coef.shape[:-1], np.shape(bp))).astype(np.float64)
+    for k in range(coef.shape[-1] - 2, -1, -1):
+        y = y * bp + coef[..., k]
+    return y
+
+class DamageModel:
+    """
+    The damage model as a polynomial in bp for each class, evaluated with NumPy alone.
+
+    A one-hot class encoder followed by polynomial features and a linear regressor is exactly such a polynomial,
+    so compile_pipeline turns the fitted pipeline into a (class, power) coefficient table once, and neither
+    joblib nor scikit-learn are needed to predict. predict takes the same (bp, class) frame as the pipeline.
+    """
+    def __init__(self, classes: Sequence[str], coef: np.ndarray):
+        self.classes = np.asarray(classes, dtype=str)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self._index = {c: i for i, c in enumerate(self.classes)}
+
+    def class_index(self, classes: Sequence[str]) -> np.ndarray:
+        unknown = sorted({c for c in classes if c not in self._index})
+        if unknown:
+            raise ValueError(f"The damage model has no coefficients for {', '.join(unknown)}")
+        return np.array([self._index[c] for c in classes], dtype=np.int64)
+
+    def curves(self, bp: np.ndarray, classes: Sequence[str]) -> np.ndarray:
+        """
+        The (class, bp) predictions of every class at every bp in one broadcast evaluation.
+        """
+        return _horner(self.coef[self.class_index(classes), None, :], np.asarray(bp, dtype=np.float64))
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        index = pd.Categorical(X["class"], categories=self.classes).codes
+        if (index < 0).any():
+            self.class_index(X["class"][index < 0].unique())
+        return _horner(self.coef[index], X["bp"].to_numpy(dtype=np.float64))
+
+    def save(self, path: str = COMPILED_MODEL_PATH):
+        np.savez(path, classes=self.classes, coef=self.coef)
+
+    @classmethod
+    def load(cls, path: str = COMPILED_MODEL_PATH) -> "DamageModel":
+        with np.load(path, allow_pickle=False) as artifact:
+            return cls(artifact["classes"], artifact["coef"])
+
+def _terms(step, features: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    The output features of a fitted PolynomialFeatures step as (class, bp power) pairs, where class is -1 for
+    features that do not depend on the class and -2 for products of two classes, which are always 0.
+    """
+    terms = []
+    for powers in step.powers_:
+        used = {features[j][0] for j in np.flatnonzero(powers)} - {-1}
+        terms.append((-2 if len(used) > 1 else used.pop() if used else -1, int(sum(p * features[j][1] for j, p in enumerate(powers)))))
+    return terms
+
+def compile_pipeline(pipeline) -> DamageModel:
+    """
+    Compiles the fitted damage pipeline into a DamageModel.
+
+    The pipeline must be a ColumnTransformer of a one-hot encoder on class and PolynomialFeatures (or a passthrough)
+    on bp, then any PolynomialFeatures steps and a linear regressor. Every feature is tracked as the class it is the
+    indicator of and its power of bp, and the regressor's coefficients are added onto the matching cells.
+    """
+    steps = [step for _, step in pipeline.steps]
+    preprocessor, *expansions, regressor = steps
+    classes, features = None, []
+    for name, transformer, columns in preprocessor.transformers_:
+        if name == "remainder" or transformer == "drop":
+            continue
+        if hasattr(transformer, "steps"):
+            transformer = transformer.steps[-1][1] if len(transformer.steps) == 1 else None
+        if list(columns) == ["class"] and hasattr(transformer, "categories_"):
+            classes = list(transformer.categories_[0])
+            dropped = None if transformer.drop_idx_ is None else transformer.drop_idx_[0]
+            features += [(k, 0) for k in range(len(classes)) if k != dropped]
+        elif list(columns) == ["bp"] and transformer == "passthrough":
+            features.append((-1, 1))
+        elif list(columns) == ["bp"] and hasattr(transformer, "powers_"):
+            features += _terms(transformer, [(-1, 1)])
+        else:
+            raise ValueError(f"Cannot compile the {name} transformer of the damage pipeline")
+    if classes is None:
+        raise ValueError("The damage pipeline has no one-hot class encoder")
+    for step in expansions:
+        if not hasattr(step, "powers_"):
+            raise ValueError(f"Cannot compile the {type(step).__name__} step of the damage pipeline")
+        features = _terms(step, features)
+    if not hasattr(regressor, "coef_"):
+        raise ValueError(f"Cannot compile the {type(regressor).__name__} regressor of the damage pipeline")
+
+    coef = np.zeros((len(classes), max(power for _, power in features) + 1))
+    coef[:, 0] = regressor.intercept_
+    for (k, power), weight in zip(features, np.ravel(regressor.coef_)):
+        if k == -1:
+            coef[:, power] += weight
+        elif k >= 0:
+            coef[k, power] += weight
+    return DamageModel(classes, coef)
+
+@functools.lru_cache
+def load_model(path: str = COMPILED_MODEL_PATH) -> DamageModel:
+    return DamageModel.load(path)
+
+def read_chunks(file, name: str | None = None, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Reads a CSV or Parquet file, picked by the extension of name or else of the file, chunk_rows rows at a time.
+    Parquet is read one batch at a time with pyarrow, so neither format is ever loaded whole.
+    """
+    name = name or getattr(file, "name", str(file))
+    if name.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        with pd.read_csv(file, chunksize=chunk_rows) as reader:
+            yield from reader
+
+def predict_chunk(model, chunk: pd.DataFrame, std_scale: float = 1) -> pd.DataFrame:
+    """
+    Predicts the damage of every row of a chunk with one model.predict call.
+
+    Args:
+        model: The DamageModel, or the fitted pipeline it was compiled from.
+        chunk (pd.DataFrame): bp and class columns, matched ignoring case. Any other columns are kept.
+        std_scale (float): The width of the bands in class standard deviations.
+
+    Returns:
+        The chunk with dmg, dmg_lower and dmg_upper added. Rows whose bp is not a positive number or whose class
+        is not one of CONST.CLASSES are left unpredicted. bp is cast to float64, and blanked where it is not a
+        number, so every chunk of a file writes it the same way whether or not that chunk has missing values.
+    """
+    columns = {str(c).strip().lower(): c for c in chunk.columns}
+    missing = [name for name in ("bp", "class") if name not in columns]
+    if missing:
+        raise ValueError(f"Table is missing the {' and '.join(missing)} column")
+
+    bp = pd.to_numeric(chunk[columns["bp"]], errors="coerce")
+    classes = {c.lower(): c for c in CONST.CLASSES}
+    char_class = chunk[columns["class"]].astype("string").str.strip().str.lower().map(classes)
+    valid = (bp > 0) & char_class.notna()
+
+    dmg = np.full(len(chunk), np.nan)
+    if valid.any():
+        dmg[valid.to_numpy()] = model.predict(pd.DataFrame({"bp": bp[valid], "class": char_class[valid].astype(object)}))
+    band = std_scale * class_std().reindex(char_class).to_numpy() * dmg
+    return chunk.assign(**{columns["bp"]: bp.astype(np.float64)}, dmg=dmg, dmg_lower=dmg - band, dmg_upper=dmg + band)
+
+def predict_chunks(model, file, name: str | None = None, chunk_rows: int = CHUNK_ROWS, std_scale: float = 1) -> Iterator[pd.DataFrame]:
+    """
+    Streams the predictions of predict_chunk for a CSV or Parquet file, one chunk of read_chunks at a time.
+    """
+    for chunk in read_chunks(file, name, chunk_rows):
+        yield predict_chunk(model, chunk, std_scale)
+
+def write_predictions(model, file, out: io.TextIOBase, name: str | None = None, chunk_rows: int = CHUNK_ROWS, std_scale: float = 1) -> int:
+    """
+    Writes the predictions for a CSV or Parquet file to a text stream as CSV, rounded to DECIMALS, chunk by chunk,
+    so only one chunk is ever held in memory.
+
+    Args:
+        model: The DamageModel, or the fitted pipeline it was compiled from.
+        file: The path or file-like object of the (bp, class) table.
+        out (io.TextIOBase): Where to write the CSV, e.g. an open file.
+        name (str): The file name to pick the format by, if file has none.
+        chunk_rows (int): The rows to predict at a time.
+        std_scale (float): The width of the bands in class standard deviations.
+
+    Returns:
+        The number of rows written.
+    """
+    rows = 0
+    for chunk in predict_chunks(model, file, name, chunk_rows, std_scale):
+        chunk.round(dict.fromkeys(OUTPUT_COLUMNS, DECIMALS)).to_csv(out, index=False, header=rows == 0)
+        rows += len(chunk)
+    return rows
+
+if __name__ == "__main__":
+    # Needs joblib and the scikit-learn version the pipeline was pickled with, unlike the app.
+    import joblib
+    compile_pipeline(joblib.load(MODEL_PATH)).save()
+    print(f"Damage model compiled to {COMPILED_MODEL_PATH}")
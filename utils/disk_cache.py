@@ -0,0 +1,191 @@
+import os
+import time
+import json
+import pickle
+import sqlite3
+import hashlib
+import inspect
+import logging
+import functools
+import contextlib
+import numpy as np
+import constants as CONST
+
+logger = logging.getLogger(__name__)
+
+# Bump when a cached function changes its results without changing its arguments.
+CACHE_VERSION = 5
+CACHE_PATH = os.environ.get("COST_CALC_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "results.sqlite3"))
+CACHE_MAX_BYTES = int(float(os.environ.get("COST_CALC_CACHE_MB", 512)) * 1024 * 1024)
+
+def _canonical(value):
+    """
+    A JSON-serialisable form of an argument that does not depend on dict order, container type or whether a number
+    is a Python or NumPy one. Integers stay exact, so large seeds never share a key.
+    """
+    if value is None or isinstance(value, (bool, np.bool_, str)):
+        return value.item() if isinstance(value, np.bool_) else value
+    if isinstance(value, (int, np.integer)):
+        return {"int": str(int(value))}
+    if isinstance(value, (float, np.floating)):
+        return repr(float(value))
+    if isinstance(value, dict):
+        return {"dict": sorted(([_canonical(k), _canonical(v)] for k, v in value.items()), key=lambda item: json.dumps(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return {"ndarray": [value.dtype.str, list(value.shape), hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()]}
+    if inspect.isfunction(value):
+        # Functions such as the lambdas of CATALYST_MODIFIERS are identified by their bytecode, constants and closure.
+        code = value.__code__
+        closure = [_canonical(cell.cell_contents) for cell in value.__closure__ or ()]
+        return {"function": hashlib.sha256(code.co_code + repr(code.co_consts).encode() + json.dumps(closure).encode()).hexdigest()}
+    raise TypeError(f"Cannot build a cache key from {type(value).__name__}")
+
+def constants_hash() -> str:
+    """
+    Hash of every table in constants.py, so a change to the game rates invalidates every cached result.
+    """
+    tables = {name: _canonical(getattr(CONST, name)) for name in dir(CONST) if name.isupper()}
+    return hashlib.sha256(json.dumps(tables, sort_keys=True).encode()).hexdigest()
+
+class DiskCache:
+    """
+    A size-bounded LRU cache of pickled results in SQLite, shared by every process on the host.
+
+    SQLite's locking makes concurrent readers and writers safe. Every operation opens its own connection, so
+    the cache can be used from any thread or forked worker. A cache that cannot be opened or written is
+    skipped with a warning rather than failing the caller.
+    """
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.salt = f"{CACHE_VERSION}:{constants_hash()}"
+        self._ready = False
+
+    @contextlib.contextmanager
+    def _connect(self):
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            if not self._ready:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+                connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+                self._ready = True
+            yield connection
+        finally:
+            connection.close()
+
+    def key(self, name: str, arguments: dict) -> str:
+        payload = json.dumps({"salt": self.salt, "name": name, "arguments": _canonical(arguments)}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns (True, value) on a hit and marks the entry as recently used, or (False, None) on a miss.
+        """
+        try:
+            with self._connect() as connection:
+                row = connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return False, None
+                connection.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Result cache at {self.path} is unavailable: {e}")
+            return False, None
+        try:
+            return True, pickle.loads(row[0])
+        except Exception:
+            self.delete(key)
+            return False, None
+
+    def put(self, key: str, value):
+        """
+        Stores a value, then evicts the least recently used entries until the cache fits in max_bytes.
+        """
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        try:
+            with self._connect() as connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, blob, len(blob), time.time()))
+                excess = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0] - self.max_bytes
+                if excess > 0:
+                    evicted = []
+                    for old_key, size in connection.execute("SELECT key, size FROM entries WHERE key != ? ORDER BY accessed", (key,)):
+                        if excess <= 0:
+                            break
+                        evicted.append((old_key,))
+                        excess -= size
+                    connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+                connection.execute("COMMIT")
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Result cache at {self.path} is unavailable: {e}")
+
+    def delete(self, key: str):
+        try:
+            with self._connect() as connection:
+                connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+        except (sqlite3.Error, OSError):
+            pass
+
+    def clear(self):
+        try:
+            with self._connect() as connection:
+                connection.execute("DELETE FROM entries")
+        except (sqlite3.Error, OSError):
+            pass
+
+    def size(self) -> int:
+        """
+        The total size of the stored values in bytes.
+        """
+        try:
+            with self._connect() as connection:
+                return connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        except (sqlite3.Error, OSError):
+            return 0
+
+_default_cache = None
+
+def default_cache() -> DiskCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = DiskCache()
+    return _default_cache
+
+def unseeded(arguments: dict) -> bool:
+    """
+    A skip_if for simulations, whose results are only reproducible when a seed is given.
+    """
+    return arguments.get("seed") is None
+
+def disk_cache(func=None, *, ignore: tuple = (), skip_if=None, cache: DiskCache | None = None):
+    """
+    Caches a function's results on disk, keyed on its name and its arguments with the defaults filled in.
+    Arguments named in ignore, such as a worker count that does not change the result, are left out of the key.
+    Calls whose bound arguments make skip_if true, such as an unseeded simulation, bypass the cache entirely.
+    Use it below st.cache_data so hits within a process stay in memory.
+    """
+    if func is None:
+        return functools.partial(disk_cache, ignore=ignore, skip_if=skip_if, cache=cache)
+    signature = inspect.signature(func)
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        if skip_if is not None and skip_if(bound.arguments):
+            return func(*args, **kwargs)
+        store = cache or default_cache()
+        key = store.key(name, {k: v for k, v in bound.arguments.items() if k not in ignore})
+        hit, value = store.get(key)
+        if not hit:
+            value = func(*args, **kwargs)
+            store.put(key, value)
+        return value
+    return wrapper
@@ -0,0 +1,168 @@
+import numpy as np
+from typing import Dict, Sequence, Tuple
+from utils.simulation import FAILSAFE_CAP, PITY_CAP, success_probs
+
+class DiscreteDistribution:
+    """
+    A distribution on an evenly spaced grid of values, truncated once the remaining tail mass is negligible.
+    """
+    def __init__(self, values: np.ndarray, pmf: np.ndarray):
+        self.values = values
+        self.pmf = pmf
+
+    @property
+    def cdf(self) -> np.ndarray:
+        return np.cumsum(self.pmf)
+
+    @property
+    def tail_mass(self) -> float:
+        return max(0.0, 1.0 - float(self.pmf.sum()))
+
+    @property
+    def mean(self) -> float:
+        return float(self.values @ self.pmf / self.pmf.sum())
+
+    @property
+    def std(self) -> float:
+        return float(((self.values - self.mean) ** 2 @ self.pmf / self.pmf.sum()) ** 0.5)
+
+    def quantile(self, q: float | np.ndarray) -> float | np.ndarray:
+        index = np.searchsorted(self.cdf, q, side="left")
+        return self.values[np.minimum(index, len(self.values) - 1)]
+
+    def cvar(self, alpha: float) -> float:
+        """
+        Conditional value at risk: the mean of the worst 1 - alpha of outcomes.
+        """
+        var = self.quantile(alpha)
+        above = self.values > var
+        tail = (self.values[above] @ self.pmf[above] + var * (1 - alpha - self.pmf[above].sum())) / (1 - alpha)
+        return float(tail)
+
+def fixed_actions(catalysts: Sequence[str], final_catalyst: str) -> np.ndarray:
+    """
+    Builds a (failsafe, amp, pity) action table that uses a fixed catalyst per amp level, as the simulator does.
+    """
+    amax = len(catalysts)
+    actions = np.empty((FAILSAFE_CAP + 1, amax + 1, PITY_CAP + 1), dtype=object)
+    for a, catalyst in enumerate(catalysts):
+        actions[:, a, :] = catalyst
+    actions[:, amax, 0] = final_catalyst
+    return actions
+
+def _finish(probs: np.ndarray, factors: Dict[str, np.ndarray], actions: np.ndarray, f: int, a: int, climb: np.ndarray) -> list:
+    """
+    Generating functions of finishing amp a of failsafe f from each pity, given the climb C_a from 0 to a.
+    """
+    finish = [None] * (PITY_CAP + 1)
+    finish[PITY_CAP] = factors[actions[f, a, PITY_CAP]]
+    for p in reversed(range(PITY_CAP)):
+        q = probs[f, a, p]
+        finish[p] = factors[actions[f, a, p]] * (q + (1 - q) * climb * finish[p + 1])
+    return finish
+
+def _transform(probs: np.ndarray, factors: Dict[str, np.ndarray], actions: np.ndarray, start_state: Tuple[int, int, int]) -> np.ndarray:
+    """
+    Evaluates the generating function of the total from start_state, given the factor each action multiplies in.
+
+    Finishing amp a from pity p is G[p] = F(p) * (q + (1 - q) * C_a * G[p+1]) where C_a is the climb from 0 to a,
+    and C_{a+1} = C_a * G[0]. A round is C_A times the enhancement tap, which is retried from the next failsafe
+    on failure.
+    """
+    f0, a0, p0 = start_state
+    amax = probs.shape[1] - 1
+    ones = np.ones_like(next(iter(factors.values())))
+    total = ones
+
+    for f in reversed(range(f0, FAILSAFE_CAP + 1)):
+        q = probs[f, amax, 0]
+        retry = factors[actions[f, amax, 0]] * (q + (1 - q) * total)
+        climb = ones
+        partial = retry
+        for a in range(amax):
+            finish = _finish(probs, factors, actions, f, a, climb)
+            climb = climb * finish[0]
+            if f == f0 and a == a0:
+                partial = partial * finish[p0]
+            elif f == f0 and a > a0:
+                partial = partial * finish[0]
+        total = partial if f == f0 else climb * retry
+    return total
+
+def amp_transform(probs: np.ndarray, factors: Dict[str, np.ndarray], actions: np.ndarray, amp: int, failsafe: int = 0) -> np.ndarray:
+    """
+    Evaluates the generating function of passing amp once from 0/6, including the climbs back to it after each
+    failure, i.e. the G[0] of _transform.
+    """
+    climb = np.ones_like(next(iter(factors.values())))
+    for a in range(amp + 1):
+        finish = _finish(probs, factors, actions, failsafe, a, climb)
+        climb = climb * finish[0]
+    return finish[0]
+
+def _invert(transform, tail_mass: float, size: int = 1 << 12) -> np.ndarray:
+    """
+    Recovers a PMF on 0..size-1 from its generating function, doubling the grid until the upper half
+    carries less than tail_mass, then cutting the tail.
+    """
+    while True:
+        z = np.exp(-2j * np.pi * np.arange(size // 2 + 1) / size)
+        pmf = np.clip(np.fft.irfft(transform(z), n=size), 0, None)
+        if pmf[size // 2:].sum() < tail_mass:
+            cut = np.searchsorted(np.cumsum(pmf), 1 - tail_mass, side="left") + 1
+            return pmf[:cut]
+        size *= 2
+
+def enhancement_distribution(enhancement_level: int, actions: np.ndarray, base_cost: float, catalyst_cost_map: Dict[str, float], hidden_r: bool = True, start_state: Tuple[int, int, int] = (0, 0, 0), tail_mass: float = 1e-6, cost_bins: int = 1 << 16) -> Tuple[DiscreteDistribution, DiscreteDistribution]:
+    """
+    Exact distribution of total taps and opal cost to pass an enhancement level.
+
+    Args:
+        enhancement_level (int): The current enhancement level.
+        actions (np.ndarray): The (failsafe, amp, pity) action table, e.g. from fixed_actions() or the policy from get_min_cost.
+        base_cost (float): The opal cost of a tap without catalyst.
+        catalyst_cost_map (dict): The opal cost of each catalyst.
+        hidden_r (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+        start_state (Tuple[int, int, int]): The current (failsafe, amp, pity).
+        tail_mass (float): The probability mass allowed to be cut from the right tail.
+        cost_bins (int): The resolution of the cost grid.
+
+    Returns:
+        The distributions of taps and of cost. Each tap's cost is split between the two nearest grid points,
+        so the cost distribution keeps the exact mean.
+    """
+    probs = success_probs(enhancement_level, actions, hidden_r)
+    taps = tap_distribution(enhancement_level, actions, hidden_r, start_state, tail_mass)
+
+    tap_costs = {a: base_cost + catalyst_cost_map[a] for a in actions.ravel() if a}
+    step = max(len(taps.pmf) * max(tap_costs.values()) / cost_bins, 1e-12)
+    return taps, _cost_distribution(probs, actions, tap_costs, start_state, step, tail_mass, cost_bins)
+
+def tap_distribution(enhancement_level: int, actions: np.ndarray, hidden_r: bool = True, start_state: Tuple[int, int, int] = (0, 0, 0), tail_mass: float = 1e-6) -> DiscreteDistribution:
+    """
+    Exact distribution of the total taps alone to pass an enhancement level, see enhancement_distribution.
+    """
+    probs = success_probs(enhancement_level, actions, hidden_r)
+    taps_pmf = _invert(lambda z: _transform(probs, {a: z for a in actions.ravel() if a}, actions, start_state), tail_mass)
+    return DiscreteDistribution(np.arange(len(taps_pmf), dtype=np.float64), taps_pmf)
+
+def _cost_distribution(probs: np.ndarray, actions: np.ndarray, tap_costs: Dict[str, float], start_state: Tuple[int, int, int], step: float, tail_mass: float, cost_bins: int) -> DiscreteDistribution:
+    def cost_factors(z):
+        factors = {}
+        for action, cost in tap_costs.items():
+            lo, w = divmod(cost / step, 1)
+            factors[action] = z ** lo * (1 - w + w * z)
+        return factors
+
+    cost_pmf = _invert(lambda z: _transform(probs, cost_factors(z), actions, start_state), tail_mass, cost_bins)
+    return DiscreteDistribution(np.arange(len(cost_pmf)) * step, cost_pmf)
+
+def cost_distribution(enhancement_level: int, actions: np.ndarray, base_cost: float, catalyst_cost_map: Dict[str, float], scale: float, hidden_r: bool = True, start_state: Tuple[int, int, int] = (0, 0, 0), tail_mass: float = 1e-6, cost_bins: int = 1 << 12) -> DiscreteDistribution:
+    """
+    Exact distribution of the opal cost alone, skipping the tap distribution that enhancement_distribution uses
+    to size its grid. The grid instead covers twice scale, a rough upper cost such as the mean plus ten standard
+    deviations, and still doubles until the tail is cut.
+    """
+    probs = success_probs(enhancement_level, actions, hidden_r)
+    tap_costs = {a: base_cost + catalyst_cost_map[a] for a in actions.ravel() if a}
+    return _cost_distribution(probs, actions, tap_costs, start_state, max(2 * scale / cost_bins, 1e-12), tail_mass, cost_bins)
@@ -1,8 +1,7 @@
 import numpy as np
-import pandas as pd
 import plotly.graph_objects as go
-import json
 import streamlit as st
+import utils.damage as damage
 
 def hex_to_rgba(hex_color, alpha=0.2):
     """Convert hex color to rgba string with given alpha."""
@@ -11,26 +10,24 @@ def hex_to_rgba(hex_color, alpha=0.2):
     return f'rgba({r},{g},{b},{alpha})'
 
 
-def plot_class_trendlines_px(classes, pipeline, bp_min=55000, bp_max_plot=100000, n_points=100, std_scale=1):
+def plot_class_trendlines_px(classes, model, bp_min=55000, bp_max_plot=100000, n_points=100, std_scale=1):
     """
     Plot predicted damage trendlines with filled std bands using Plotly.
+    The trendlines of every class come from one DamageModel.curves call.
     """
-    class_std = json.load(open('./static/class_std.json'))
-
     if isinstance(classes, str):
         classes = [classes]
 
     fig = go.Figure()
     colors = ['#636EFA', '#EF553B', '#00CC96', '#AB63FA', '#FFA15A', '#19D3F3']
 
-    for i, cls in enumerate(classes):
-        # Trendline
-        bp_range = np.linspace(bp_min, bp_max_plot, n_points)
-        X_trend = pd.DataFrame({'bp': bp_range, 'class': cls})
-        y_trend = pipeline.predict(X_trend)
+    bp_range = np.linspace(bp_min, bp_max_plot, n_points)
+    trends = model.curves(bp_range, classes)
+    bands = std_scale * damage.class_std().reindex(classes).to_numpy()[:, None] * trends
 
-        y_lower = y_trend - std_scale * class_std[cls] * y_trend
-        y_upper = y_trend + std_scale * class_std[cls] * y_trend
+    for i, (cls, y_trend, band) in enumerate(zip(classes, trends, bands)):
+        y_lower = y_trend - band
+        y_upper = y_trend + band
         color = colors[i % len(colors)]
         fill_color = hex_to_rgba(color, alpha=0.2)
 
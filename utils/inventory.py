@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+from typing import Tuple
+import constants as CONST
+import utils.absolute_policy as absolute_policy
+import utils.distribution as distribution
+
+# Shadow prices of held catalysts and potent catalysts tried, relative to the opal cost of a tap. The last step
+# prices them out entirely, so the grid always contains the policy that needs no stock.
+SHADOW_RATIOS = np.concatenate([[0.0], np.geomspace(0.01, 400, 46), [1e9]])
+TAIL_MASS = 1e-9 # Probability left out of each overflow PMF
+POLICY_BLOCK = 16 # Policies whose overflow is computed together, which bounds the memory of the factor arrays
+
+class InventoryPlan:
+    """
+    The best policy for every stock of catalysts and potent catalysts from 0 up to the maximum.
+
+    Only the distinct shadow price policies are stored. choice maps a (catalysts, potents) stock to one of them,
+    so the table stays small however large the stock is. overflow holds each policy's expected catalysts and
+    potent catalysts beyond every stock, which are bought at their value.
+    """
+    def __init__(self, current_level: int, codes: np.ndarray, usage: np.ndarray, overflow_catalysts: np.ndarray, overflow_potents: np.ndarray, prices: np.ndarray, choice: np.ndarray, cost_per_tap_in_gold: float):
+        self.current_level = current_level
+        self.codes = codes
+        self.usage = usage
+        self.overflow_catalysts = overflow_catalysts
+        self.overflow_potents = overflow_potents
+        self.prices = prices
+        self.choice = choice
+        self.cost_per_tap_in_gold = cost_per_tap_in_gold
+
+    @property
+    def max_catalysts(self) -> int:
+        return self.choice.shape[0] - 1
+
+    @property
+    def max_potents(self) -> int:
+        return self.choice.shape[1] - 1
+
+    def _costs(self, policies: np.ndarray, catalysts: np.ndarray, potents: np.ndarray) -> np.ndarray:
+        return self.usage[policies, 0] + self.prices[0] * self.overflow_catalysts[policies, catalysts] + self.prices[1] * self.overflow_potents[policies, potents]
+
+    def get_min_cost(self, catalysts: int, potents: int):
+        """
+        The policy for a stock in the layout of absolute_policy.get_min_cost: the expected opal cost of gold and
+        bought catalysts, the policy, the gold cost and the held catalysts and potent catalysts used.
+        """
+        if not (0 <= catalysts <= self.max_catalysts and 0 <= potents <= self.max_potents):
+            raise ValueError(f"Stock must be within 0 to {self.max_catalysts} catalysts and 0 to {self.max_potents} potent catalysts")
+        i = self.choice[catalysts, potents]
+        _, taps, used_catalysts, used_potents = self.usage[i]
+        held_catalysts = used_catalysts - self.overflow_catalysts[i, catalysts]
+        held_potents = used_potents - self.overflow_potents[i, potents]
+        return float(self._costs(i, catalysts, potents)), self.codes[i], taps * self.cost_per_tap_in_gold, held_catalysts, held_potents
+
+    def cost_surface(self) -> pd.DataFrame:
+        """
+        The expected opal cost for every stock, with catalysts as rows and potent catalysts as columns.
+        """
+        catalysts, potents = np.indices(self.choice.shape)
+        return pd.DataFrame(self._costs(self.choice, catalysts, potents), index=pd.RangeIndex(self.max_catalysts + 1, name="catalysts"), columns=pd.RangeIndex(self.max_potents + 1, name="potents"))
+
+def expected_overflow(current_level: int, codes: np.ndarray, means: np.ndarray, catalyst: str, max_stock: int, hidden_rates: bool = True, start_state: Tuple[int, int, int] = (0,0,0), tail_mass: float = TAIL_MASS, block: int = POLICY_BLOCK) -> np.ndarray:
+    """
+    E[max(0, N - s)] for every (policy, stock s) from 0 to max_stock, where N is the number of taps that use
+    catalyst under the policy of each row of codes and means holds each E[N]. This is E[N] less the sum of
+    P(N > k) over k < s, so only the PMF up to max_stock is needed.
+
+    Each block of policies goes through one distribution._transform: each cell is its own key in the factors,
+    holding z for the policies that use catalyst there and 1 for the rest, and the success probabilities carry the
+    policies on a trailing axis. z runs around a circle of radius r < 1 on a grid of twice max_stock, so the tail
+    that wraps back onto the PMF is damped by r^size = tail_mass, however long the runs are.
+    """
+    if len(codes) > block:
+        return np.concatenate([expected_overflow(current_level, codes[i:i + block], means[i:i + block], catalyst, max_stock, hidden_rates, start_state, tail_mass, block)
+                               for i in range(0, len(codes), block)])
+    size = 1 << int(2 * (max_stock + 1) - 1).bit_length()
+    r = tail_mass ** (1 / size)
+    z = r * np.exp(-2j * np.pi * np.arange(size // 2 + 1) / size)
+
+    # Cells that are never reached hold UNREACHABLE, which is clipped to a valid action that is never used.
+    index = np.minimum(codes, len(absolute_policy.ACTION_CODES) - 1)
+    probs = np.take_along_axis(absolute_policy.get_probability_tensor(current_level, hidden_rates), np.moveaxis(index, 0, -1), axis=-1)[..., None]
+    uses = (codes == absolute_policy.ACTION_CODES.index(catalyst)).reshape(len(codes), -1).T
+    keys = np.arange(len(uses)).reshape(codes.shape[1:])
+    # Cells that the same policies use share one factor array.
+    patterns, factors = {}, {}
+    for key, use in enumerate(uses):
+        pattern = use.tobytes()
+        if pattern not in patterns:
+            patterns[pattern] = np.where(use[:, None], z, 1.0)
+        factors[key] = patterns[pattern]
+
+    pmf = np.fft.irfft(distribution._transform(probs, factors, keys, start_state), n=size, axis=-1)[:, :max_stock] / r ** np.arange(max_stock)
+    survival = np.clip(1 - np.cumsum(np.clip(pmf, 0, None), axis=1), 0, None)
+    return np.clip(means[:, None] - np.pad(np.cumsum(survival, axis=1), ((0, 0), (1, 0))), 0, None)
+
+def solve_inventory(current_level: int, cost_per_tap_in_gold: int, gems_per_1m: float, catalyst_cost_map: dict, max_catalysts: int, max_potents: int, hidden_rates: bool = True, start_state: Tuple[int, int, int] = (0,0,0), shadow_ratios: np.ndarray = SHADOW_RATIOS) -> InventoryPlan:
+    """
+    Finds how to spend a held stock of catalysts and potent catalysts, which cost nothing but run out. Any more
+    that a run needs, and 3 Star and 4 Star catalysts, are bought at their opal price.
+
+    The exact state would need the pity of every amp that is being climbed back to, on top of the stock, which grows
+    exponentially with the amp threshold. Instead the held catalysts are given shadow prices: every pair of prices
+    in shadow_ratios is solved in one batched solve_policy call. Each distinct policy is then costed for every stock
+    as its gold and bought catalysts plus the expected_overflow of the stock at the catalyst prices, and each stock
+    gets the cheapest. Since a run could also change policy once the stock is out, this cost is an upper bound.
+
+    Args:
+        current_level (int): The current enhancement level.
+        cost_per_tap_in_gold (int): The gold cost of a tap.
+        gems_per_1m (float): The gold price (opals per 1M gold).
+        catalyst_cost_map (dict): The opal cost of each catalyst, which held catalysts are charged at once they run out.
+        max_catalysts (int): The largest catalyst stock to plan for.
+        max_potents (int): The largest potent catalyst stock to plan for.
+        hidden_rates (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+        start_state (Tuple[int, int, int]): The current (failsafe, amp, pity).
+        shadow_ratios (np.ndarray): The shadow prices to try, relative to the opal cost of a tap.
+    """
+    AMAX = CONST.AMP_THRESHOLDS[current_level]
+    tap_cost = cost_per_tap_in_gold / 1_000_000 * gems_per_1m
+    shadow = np.asarray(shadow_ratios, dtype=np.float64) * tap_cost
+
+    # Channels are (cost, taps, held catalysts, held potent catalysts), so a 3 Star / 4 Star catalyst only adds its price.
+    rewards = np.zeros((len(shadow), len(shadow), len(absolute_policy.ACTION_CODES), len(absolute_policy.CHANNELS)))
+    rewards[..., 0] = tap_cost
+    rewards[..., 1] = 1
+    for code, action in enumerate(absolute_policy.ACTION_CODES):
+        if action == "Catalyst":
+            rewards[..., code, 0] += shadow[:, None]
+            rewards[..., code, 2] = 1
+        elif action == "Potent Catalyst":
+            rewards[..., code, 0] += shadow[None, :]
+            rewards[..., code, 3] = 1
+        elif action != "No Catalyst":
+            rewards[..., code, 0] += catalyst_cost_map[action]
+
+    probs = absolute_policy.get_probability_tensor(current_level, hidden_rates)
+    values, codes = absolute_policy.solve_policy(probs, rewards, absolute_policy.get_action_mask(AMAX))
+    success_path = tuple(np.array(absolute_policy.get_success_path(start_state, AMAX)).T)
+    usage = values[(slice(None), slice(None)) + success_path].sum(axis=2).reshape(-1, len(absolute_policy.CHANNELS))
+    codes = codes.reshape((-1,) + codes.shape[2:])
+
+    # Take the shadow prices back out to leave the opal cost of gold and bought catalysts.
+    prices = np.stack(np.meshgrid(shadow, shadow, indexing="ij"), axis=-1).reshape(-1, 2)
+    usage[:, 0] -= (usage[:, 2:] * prices).sum(axis=1)
+    codes, first = np.unique(codes, axis=0, return_index=True)
+    usage = usage[first]
+
+    overflow_catalysts = expected_overflow(current_level, codes, usage[:, 2], "Catalyst", max_catalysts, hidden_rates, start_state)
+    overflow_potents = expected_overflow(current_level, codes, usage[:, 3], "Potent Catalyst", max_potents, hidden_rates, start_state)
+    catalyst_prices = np.array([catalyst_cost_map["Catalyst"], catalyst_cost_map["Potent Catalyst"]], dtype=np.float64)
+
+    # One policy at a time keeps memory at one (catalysts, potents) surface however many policies there are.
+    best = np.full((max_catalysts + 1, max_potents + 1), np.inf)
+    choice = np.zeros(best.shape, dtype=np.int64)
+    for i in range(len(codes)):
+        costs = usage[i, 0] + catalyst_prices[0] * overflow_catalysts[i, :, None] + catalyst_prices[1] * overflow_potents[i, None, :]
+        better = costs < best
+        best[better], choice[better] = costs[better], i
+    return InventoryPlan(current_level, codes, usage, overflow_catalysts, overflow_potents, catalyst_prices, choice, cost_per_tap_in_gold)
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+from typing import Dict
+import constants as CONST
+import utils.absolute_policy as absolute_policy
+
+LADDER_START = 10
+LADDER_END = 25
+SUB15_TAP_COST = 130000 # Gold and spare parts per tap below +15, as on the dolphin page
+SUB15_ACTIONS = ("No Catalyst", "Catalyst", "Stable Catalyst", "Potent Catalyst")
+SUB15_STABLE_LEVELS = (10, 11, 12) # Levels where a stable catalyst keeps the level on failure
+SUB15_HARD_PITY = 7
+SPARE_PARTS_VALUE = [100, 1500, 10000] # Default gold value of each spare part tier
+
+# Expected usage channels of a level transition. Potents count a 3 Star / 4 Star catalyst as 10 / 40 potents.
+LADDER_CHANNELS = ("cost", "taps", "catalysts", "stable catalysts", "potents")
+
+def default_tap_cost(level: int) -> float:
+    """
+    The default gold cost of a tap at a level, including spare parts for +15 and above.
+    """
+    if level < 15:
+        return SUB15_TAP_COST
+    return CONST.TAP_COST[level] + sum(i * j for i, j in zip(CONST.SPARE_PARTS_COST[level], SPARE_PARTS_VALUE))
+
+def effective_prob(base_prob: float, hard_pity: int = SUB15_HARD_PITY) -> float:
+    """
+    The per-tap success rate that gives the same expected taps as base_prob with a hard pity.
+    """
+    q = (1 - base_prob) ** np.arange(hard_pity)
+    expected_taps = (base_prob * q * np.arange(1, hard_pity + 1)).sum() + hard_pity * (1 - base_prob) ** hard_pity
+    return 1 / expected_taps
+
+def solve_sub15(tap_opals: float, catalyst_cost_map: dict, start: int = LADDER_START, end: int = 15) -> np.ndarray:
+    """
+    Expected (cost, taps, catalysts, stable catalysts, potents) of each transition from start to end below +15,
+    where a failed tap drops a level unless it is the bottom level or a stable catalyst protects it.
+
+    Getting from i to i+1 only depends on the choices at i and below, and T(i) = (c + (1 - p) * T(i-1)) / p grows
+    with T(i-1), so picking the cheapest catalyst level by level is optimal for every target at once.
+    """
+    usage = {
+        action: np.array([catalyst_cost_map[action], 1, action == "Catalyst", action == "Stable Catalyst", action == "Potent Catalyst"], dtype=np.float64)
+        for action in SUB15_ACTIONS
+    }
+    transitions = np.zeros((end - start, len(LADDER_CHANNELS)))
+    below = np.zeros(len(LADDER_CHANNELS))
+    for i, level in enumerate(range(start, end)):
+        best = None
+        for action in SUB15_ACTIONS:
+            if action == "Stable Catalyst" and level not in SUB15_STABLE_LEVELS:
+                continue
+            p = effective_prob(CONST.CATALYST_PROB_MAP[action])
+            tap = usage[action] + np.array([tap_opals, 0, 0, 0, 0])
+            keeps_level = level == start or action == "Stable Catalyst"
+            value = tap / p if keeps_level else (tap + (1 - p) * below) / p
+            if best is None or value[0] < best[0]:
+                best = value
+        transitions[i] = below = best
+    return transitions
+
+class Ladder:
+    """
+    Expected cost and usage of each level transition from LADDER_START to LADDER_END, with prefix sums so any
+    from → to range is a single subtraction.
+    """
+    def __init__(self, transitions: np.ndarray, start: int = LADDER_START):
+        self.start = start
+        self.transitions = transitions
+        self.cumulative = np.vstack([np.zeros(len(LADDER_CHANNELS)), np.cumsum(transitions, axis=0)])
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.transitions)
+
+    def range(self, from_level: int, to_level: int) -> Dict[str, float]:
+        """
+        Expected cost and usage to go from from_level to to_level.
+        """
+        if not self.start <= from_level <= to_level <= self.end:
+            raise ValueError(f"Levels must satisfy {self.start} <= from <= to <= {self.end}")
+        totals = self.cumulative[to_level - self.start] - self.cumulative[from_level - self.start]
+        return dict(zip(LADDER_CHANNELS, totals.tolist()))
+
+    def curve(self) -> pd.DataFrame:
+        """
+        The expected cost and usage of each transition and cumulatively from the bottom of the ladder.
+        """
+        df = pd.DataFrame(self.transitions, columns=list(LADDER_CHANNELS))
+        cumulative = pd.DataFrame(self.cumulative[1:], columns=[f"cumulative {c}" for c in LADDER_CHANNELS])
+        steps = pd.DataFrame({"from": np.arange(self.start, self.end), "to": np.arange(self.start + 1, self.end + 1)})
+        return pd.concat([steps, df, cumulative], axis=1)
+
+def solve_ladder(gems_per_1m: float, catalyst_cost_map: dict, tap_cost_multiplier: float = 1.0, hidden_rates: bool = True) -> Ladder:
+    """
+    Solves every transition of the ladder once: below +15 with solve_sub15 and from +15 with a single
+    get_min_cost_batch call over every level.
+
+    Args:
+        gems_per_1m (float): The gold price (opals per 1M gold).
+        catalyst_cost_map (dict): The opal cost of each catalyst.
+        tap_cost_multiplier (float): Scales the default tap cost of every level, e.g. for armor.
+        hidden_rates (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+    """
+    sub15 = solve_sub15(default_tap_cost(LADDER_START) * tap_cost_multiplier / 1_000_000 * gems_per_1m, catalyst_cost_map)
+
+    levels = list(range(15, LADDER_END))
+    tap_costs = [default_tap_cost(level) * tap_cost_multiplier for level in levels]
+    total_cost, _, gold_tap_cost, catalyst_cost, potent_cost = absolute_policy.get_min_cost_batch(levels, gems_per_1m, catalyst_cost_map["Catalyst"], catalyst_cost_map["Potent Catalyst"], tap_costs, hidden_rates)
+    above15 = np.stack([
+        total_cost[:, 0, 0, 0],
+        gold_tap_cost[:, 0, 0, 0] / np.array(tap_costs),
+        catalyst_cost[:, 0, 0, 0],
+        np.zeros(len(levels)),
+        potent_cost[:, 0, 0, 0],
+    ], axis=1)
+    return Ladder(np.vstack([sub15, above15]))
@@ -0,0 +1,341 @@
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from typing import Sequence, Tuple
+import constants as CONST
+import utils.distribution as distribution
+from utils.simulation import success_probs
+
+LUCK_START = 15 # Level transitions from +15 up follow the enhancement chain
+LUCK_END = 25
+# Hard coded taps to reach each level below LUCK_START, which are counted as fixed
+SUB15_TAPS = {**{i: 0 for i in range(0, 11)}, 11: 5, 12: 20, 13: 25, 14: 40, 15: 105}
+# Conservative catalyst usage: a catalyst on every amp and a potent catalyst on the enhancement tap
+AMP_CATALYST = "Catalyst"
+FINAL_CATALYST = "Potent Catalyst"
+# The amp that a guaranteed catalyst is assumed to have passed, i.e. the 3rd and 4th star
+GUARANTEED_AMPS = {"3 Star Catalyst": 2, "4 Star Catalyst": 3}
+TAIL_MASS = 1e-9
+# Grid cells or frequencies that score_members evaluates at once, which bounds its memory
+BATCH_CELLS = 1 << 22
+
+SLOTS = ("weapon", "helmet", "breastplate", "gauntlets", "pants", "boots", "necklace", "bracers", "ring", "talisman", "seal")
+# Optional columns of a member table, with the guaranteed catalyst each one counts
+MODIFIER_COLUMNS = {"three_star_catalysts": "3 Star Catalyst", "four_star_catalysts": "4 Star Catalyst", "redundant_taps": None}
+LUCK_THRESHOLDS = {
+    "RNGesus": 0.95,
+    "Very Lucky": 0.85,
+    "Lucky": 0.65,
+    "Neutral": 0.35,
+    "Unlucky": 0.15,
+    "Very Unlucky": 0.05,
+}
+LUCK_FLOOR = "Victim of Glen"
+
+def luck_actions(amps: int) -> np.ndarray:
+    """
+    The (failsafe, amp, pity) action table of conservative catalyst usage with the given number of amps.
+    """
+    return distribution.fixed_actions([AMP_CATALYST] * amps, FINAL_CATALYST)
+
+@lru_cache(maxsize=None)
+def level_taps(enhancement_level: int, hidden_r: bool = True) -> np.ndarray:
+    """
+    The exact PMF of the taps to go from enhancement_level to the next level with conservative catalyst usage.
+    The array is shared between callers, so it is read-only.
+    """
+    pmf = distribution.tap_distribution(enhancement_level, luck_actions(CONST.AMP_THRESHOLDS[enhancement_level]), hidden_r, tail_mass=TAIL_MASS).pmf
+    pmf.flags.writeable = False
+    return pmf
+
+@lru_cache(maxsize=None)
+def factor_moments(hidden_r: bool = True) -> np.ndarray:
+    """
+    The (factor, [mean, variance]) that every transition from LUCK_START, then every guaranteed catalyst in
+    GUARANTEED_AMPS, adds to the total taps. A guaranteed catalyst takes away a pass of its amp but one tap.
+    """
+    moments = []
+    pmfs = [level_taps(level, hidden_r) for level in range(LUCK_START, LUCK_END)]
+    for catalyst in GUARANTEED_AMPS:
+        actions = luck_actions(GUARANTEED_AMPS[catalyst] + 1)
+        probs = success_probs(LUCK_START, actions, hidden_r)
+        pmfs.append(distribution._invert(lambda z: distribution.amp_transform(probs, {AMP_CATALYST: z, FINAL_CATALYST: z}, actions, GUARANTEED_AMPS[catalyst]), TAIL_MASS))
+    for i, pmf in enumerate(pmfs):
+        taps = np.arange(len(pmf))
+        mean, var = pmf @ taps, pmf @ taps ** 2 - (pmf @ taps) ** 2
+        moments.append((mean, var) if i < LUCK_END - LUCK_START else (1 - mean, -var))
+    moments = np.array(moments)
+    moments.flags.writeable = False
+    return moments
+
+def guaranteed_transform(z: np.ndarray, catalyst: str, hidden_r: bool = True) -> np.ndarray:
+    """
+    The factor a guaranteed catalyst multiplies into the generating function of the total taps, z / G(z), where
+    G is the generating function of passing its amp, climbs back included. A round that used the catalyst on that
+    amp took a single tap instead of a pass of G, so dividing it out is exact whatever level the round was at.
+    """
+    amp = GUARANTEED_AMPS[catalyst]
+    # Amps below the enhancement tap do not depend on the level, so any level with enough amps gives G.
+    actions = luck_actions(amp + 1)
+    probs = success_probs(LUCK_START, actions, hidden_r)
+    return z / distribution.amp_transform(probs, {AMP_CATALYST: z, FINAL_CATALYST: z}, actions, amp)
+
+def _log(transform: np.ndarray) -> np.ndarray:
+    # exp(k * log(x)) is x ** k for any whole k on any branch. Zeros get a finite log so that k = 0 still gives 1.
+    return np.log(np.fmax(np.abs(transform), 1e-300)) + 1j * np.angle(transform)
+
+@lru_cache(maxsize=None)
+def log_spectra(size: int, hidden_r: bool = True) -> np.ndarray:
+    """
+    The (factor, frequency) logs of the size-point transforms of every transition from LUCK_START, followed by
+    those of the guaranteed catalysts in GUARANTEED_AMPS. PMFs longer than the grid are wrapped around it, which
+    is exact for the DFT.
+    """
+    z = np.exp(-2j * np.pi * np.arange(size // 2 + 1) / size)
+    spectra = [
+        _log(np.fft.rfft(np.bincount(np.arange(len(pmf)) % size, weights=pmf, minlength=size)))
+        for pmf in (level_taps(level, hidden_r) for level in range(LUCK_START, LUCK_END))
+    ] + [_log(guaranteed_transform(z, catalyst, hidden_r)) for catalyst in GUARANTEED_AMPS]
+    spectra = np.array(spectra)
+    spectra.flags.writeable = False
+    return spectra
+
+@lru_cache(maxsize=None)
+def log_envelopes(size: int, hidden_r: bool = True) -> np.ndarray:
+    """
+    The running maxima of the real parts of log_spectra from the highest frequency down, so that a sum of them
+    with whole powers bounds the log magnitude of the transform at every frequency from there on.
+    """
+    envelopes = np.maximum.accumulate(log_spectra(size, hidden_r).real[:, ::-1], axis=1)[:, ::-1]
+    envelopes.flags.writeable = False
+    return envelopes
+
+def frequency_cutoff(factors: np.ndarray, size: int, hidden_r: bool = True) -> np.ndarray:
+    """
+    The number of leading frequencies of the size-point transforms of the (profile, factor) totals that a CDF
+    needs to be within TAIL_MASS.
+
+    Frequency k adds at most |P_k| / k to the CDF, see mid_cdf, so the frequencies from K on add less than
+    B_K * (ln(size) + 1), where B_K bounds |P_k| for k >= K from log_envelopes. B_K only falls with K, so K is
+    found by bisection. Sums of many transitions are smooth and K stays in the tens to hundreds.
+    """
+    envelopes = log_envelopes(size, hidden_r)
+    bound = np.log(TAIL_MASS / (np.log(size) + 1))
+    lo, hi = np.ones(len(factors), dtype=np.int64), np.full(len(factors), envelopes.shape[1], dtype=np.int64)
+    while (lo < hi).any():
+        mid = (lo + hi) // 2
+        fits = np.einsum("pf,fp->p", factors, envelopes[:, mid]) < bound
+        hi, lo = np.where(fits, mid, hi), np.where(fits, lo, mid + 1)
+    return lo
+
+def mid_cdf(factors: np.ndarray, size: int, taps: np.ndarray, frequencies: int, hidden_r: bool = True) -> np.ndarray:
+    """
+    P(T < x) + P(T = x) / 2 for each (profile, factor) total T at its taps x, from the leading frequencies of
+    its size-point transform alone.
+
+    With P_k the transform and w = exp(2j * pi * k / size), p_n is the sum of P_k * w ** n / size, so summing
+    the geometric series gives P(T < x) as the sum of P_k * (1 - w ** x) / (1 - w) / size, with x in place of
+    the fraction for k = 0, and P(T = x) as the sum of P_k * w ** x / size. The upper half of the frequencies are
+    the conjugates of the lower half, so they are counted by doubling. Writing P_k = exp(a + ib) and
+    1 / (1 - w) = (1 + i * cot(pi * k / size)) / 2, the real part of each term is
+    exp(a) * (cos(b) - c * sin(b) + c * sin(b + 2 * pi * k * x / size)) / 2 with c the cotangent, which only
+    needs real functions. taps must be within the grid.
+    """
+    spectra = log_spectra(size, hidden_r)[:, :frequencies]
+    factors = np.asarray(factors, dtype=np.float64)
+    magnitude, phase = np.exp(factors @ spectra.real), factors @ spectra.imag
+    # The k = 0 term is the total mass P_0 times x + 1/2.
+    mass, magnitude, phase = magnitude[:, 0], magnitude[:, 1:], phase[:, 1:]
+    k = np.arange(1, frequencies)
+    weight = np.where(2 * k == size, 1.0, 2.0) / size
+    cotangent = 1 / np.tan(np.pi * k / size)
+    x = np.asarray(taps, dtype=np.float64)
+    terms = magnitude * (np.cos(phase) - cotangent * np.sin(phase) + cotangent * np.sin(phase + (2 * np.pi / size) * k * x[:, None])) / 2
+    return np.clip(mass * (x + 0.5) / size + terms @ weight, 0, None)
+
+def transition_counts(levels: np.ndarray) -> np.ndarray:
+    """
+    The (..., transition) number of slots that went through each transition from LUCK_START, given the
+    (..., slot) levels.
+    """
+    return (np.asarray(levels)[..., None] > np.arange(LUCK_START, LUCK_END)).sum(axis=-2)
+
+def usable_guaranteed(levels: np.ndarray, guaranteed: np.ndarray) -> np.ndarray:
+    """
+    Whether each (..., catalyst) count of guaranteed catalysts could have been used with the (..., slot) levels,
+    i.e. it is 0 or some slot went through a level with more amps than the star the catalyst passes.
+    """
+    first = np.array([min(l for l, amps in CONST.AMP_THRESHOLDS.items() if amps > amp) for amp in GUARANTEED_AMPS.values()])
+    return (np.asarray(guaranteed) == 0) | (np.max(levels, axis=-1, initial=0)[..., None] > first)
+
+def split_guaranteed(levels: np.ndarray, guaranteed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Splits the (..., catalyst) counts of guaranteed catalysts used with the (..., slot) levels into those that
+    are divided out of the transform exactly and the excess.
+
+    Every transition through a level with more amps than the star a catalyst passes has at least one pass of that
+    star, so up to that many can be divided out. Any more were used in extra rounds after a failed enhancement
+    tap, whose number is random, so the excess only takes off its mean saving from the total.
+    """
+    eligible = np.array([[CONST.AMP_THRESHOLDS[level] > amp for amp in GUARANTEED_AMPS.values()] for level in range(LUCK_START, LUCK_END)])
+    exact = np.minimum(guaranteed, transition_counts(levels) @ eligible)
+    return exact, np.asarray(guaranteed) - exact
+
+def grid_size(factors: np.ndarray, hidden_r: bool = True) -> np.ndarray:
+    """
+    A power of two grid that covers twice the mean plus ten standard deviations of the totals with (..., factor)
+    powers of the transforms in log_spectra. Guaranteed catalysts only shorten the total, so they are left out.
+    """
+    mean, var = np.moveaxis(factors[..., :LUCK_END - LUCK_START] @ factor_moments(hidden_r)[:LUCK_END - LUCK_START], -1, 0)
+    return 1 << np.ceil(np.log2(2 * (mean + 10 * var ** 0.5) + 2)).astype(np.int64)
+
+def _distributions(factors: np.ndarray, size: int, hidden_r: bool) -> np.ndarray:
+    """
+    The (profile, taps) PMFs of the totals with (profile, factor) powers of the transforms in log_spectra, from
+    one matrix product and one batched FFT. The grid doubles from size, as in distribution._invert, until its
+    upper half holds less than TAIL_MASS.
+    """
+    while True:
+        pmf = np.clip(np.fft.irfft(np.exp(factors @ log_spectra(size, hidden_r)), n=size, axis=-1), 0, None)
+        if (pmf[:, size // 2:].sum(axis=1) < TAIL_MASS).all():
+            return pmf
+        size *= 2
+
+def total_taps(levels: Sequence[int], hidden_r: bool = True, three_star_catalysts: int = 0, four_star_catalysts: int = 0, redundant_taps: int = 0) -> distribution.DiscreteDistribution:
+    """
+    Exact distribution of the total taps to enhance every slot from 0 to its level.
+
+    Each slot is the sum of independent level transitions, so the generating function of the total is the
+    product of the transforms of every transition PMF, one power per distinct level, inverted with a single FFT.
+
+    Args:
+        levels (Sequence[int]): The enhancement level of each slot.
+        hidden_r (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+        three_star_catalysts (int): The number of 3 Star catalysts used, each passing a 3rd star in one tap,
+            see split_guaranteed.
+        four_star_catalysts (int): The number of 4 Star catalysts used, each passing a 4th star in one tap.
+        redundant_taps (int): Taps spent on gear that does not count towards the levels, e.g. white gear.
+
+    Returns:
+        The distribution of the taps counted in game, with the fixed taps below +15 and the redundant taps added.
+    """
+    guaranteed = np.array([three_star_catalysts, four_star_catalysts])
+    for (catalyst, amp), usable in zip(GUARANTEED_AMPS.items(), usable_guaranteed(np.asarray(levels), guaranteed)):
+        if not usable:
+            raise ValueError(f"A {catalyst} needs a level with more than {amp} amps")
+
+    exact, excess = split_guaranteed(np.asarray(levels), guaranteed)
+    factors = np.concatenate([transition_counts(levels), exact])[None]
+    pmf = _distributions(factors, int(grid_size(factors, hidden_r)[0]), hidden_r)[0]
+    offset = sum(SUB15_TAPS[min(l, LUCK_START)] for l in levels) + redundant_taps + round(excess @ factor_moments(hidden_r)[LUCK_END - LUCK_START:, 0])
+
+    # Each transition already had its tail cut, so cut relative to the mass that is left.
+    cdf = np.cumsum(pmf)
+    pmf = pmf[:np.searchsorted(cdf, cdf[-1] - TAIL_MASS, side="left") + 1]
+    return distribution.DiscreteDistribution(np.arange(offset, offset + len(pmf), dtype=np.float64), pmf)
+
+def percentile(taps: distribution.DiscreteDistribution, observed: float) -> float:
+    """
+    The share of players expected to need fewer taps than observed, counting half of those who need exactly as
+    many, so a fixed total scores 0.5.
+    """
+    below = taps.pmf[taps.values < observed].sum()
+    return float(below + taps.pmf[taps.values == observed].sum() / 2)
+
+def luck_status(score: np.ndarray) -> np.ndarray:
+    """
+    The LUCK_THRESHOLDS label of each luck score.
+    """
+    score = np.asarray(score)
+    return np.select([score >= threshold for threshold in LUCK_THRESHOLDS.values()], list(LUCK_THRESHOLDS), LUCK_FLOOR)
+
+def read_members(file, name: str | None = None) -> pd.DataFrame:
+    """
+    Reads a member table from a CSV or Parquet file, picked by the extension of name or else of the file.
+    """
+    name = name or getattr(file, "name", str(file))
+    if name.lower().endswith((".parquet", ".pq")):
+        return pd.read_parquet(file)
+    return pd.read_csv(file)
+
+def score_members(members: pd.DataFrame, hidden_r: bool = True) -> pd.DataFrame:
+    """
+    Scores every member of a table at once and ranks them from the luckiest down.
+
+    Each member only needs the CDF of their total at their taps, so rather than inverting every distribution,
+    mid_cdf sums the few leading frequencies of its transform that frequency_cutoff finds, in batches of
+    BATCH_CELLS from the cached log_spectra. The scores are those of total_taps and percentile to within
+    TAIL_MASS, and the expected taps come from the cached factor_moments.
+
+    Args:
+        members (pd.DataFrame): total_taps and the level of each of the SLOTS, with any of the MODIFIER_COLUMNS,
+            which default to 0. Column names are matched ignoring case, spaces and underscores.
+        hidden_r (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+
+    Returns:
+        The table with expected_taps (with the modifiers), luck_score and luck added, ranked by luck_score.
+        Members whose guaranteed catalysts could not have been used with their levels are left unscored at the end.
+    """
+    columns = {str(c).replace(" ", "").replace("_", "").lower(): c for c in members.columns}
+
+    def column(name: str, default: int | None = None) -> np.ndarray:
+        key = name.replace("_", "")
+        if key not in columns:
+            if default is None:
+                raise ValueError(f"Member table is missing the {name} column")
+            return np.full(len(members), default, dtype=np.int64)
+        values = pd.to_numeric(members[columns[key]], errors="coerce")
+        if values.isna().any() or (values < 0).any() or (values % 1 != 0).any():
+            raise ValueError(f"Column {columns[key]} must hold whole numbers of 0 or more")
+        return values.to_numpy(dtype=np.int64)
+
+    taps = column("total_taps")
+    levels = np.stack([column(slot) for slot in SLOTS], axis=-1).reshape(len(members), len(SLOTS))
+    if (levels > LUCK_END).any():
+        raise ValueError(f"Enhancement levels must be within 0 to {LUCK_END}")
+    guaranteed = np.stack([column(name, 0) for name, catalyst in MODIFIER_COLUMNS.items() if catalyst], axis=-1).reshape(len(members), len(GUARANTEED_AMPS))
+    exact, excess = split_guaranteed(levels, guaranteed)
+    offset = np.vectorize(SUB15_TAPS.get, otypes=[np.int64])(np.minimum(levels, LUCK_START)).sum(axis=1) + column("redundant_taps", 0)
+    offset += np.round(excess @ factor_moments(hidden_r)[LUCK_END - LUCK_START:, 0]).astype(np.int64)
+    rows = np.flatnonzero(usable_guaranteed(levels, guaranteed).all(axis=1))
+
+    factors = np.concatenate([transition_counts(levels), exact], axis=1)[rows]
+    sizes = grid_size(factors, hidden_r)
+    at = taps[rows] - offset[rows]
+
+    # Members are costed in batches of one grid size and a similar number of frequencies, which bounds memory.
+    # Totals of a few transitions are rough and need most of a small grid, so their distinct profiles are
+    # inverted whole instead.
+    score = np.full(len(members), np.nan)
+    cutoffs = np.zeros(len(rows), dtype=np.int64)
+    for size in np.unique(sizes):
+        group = sizes == size
+        cutoffs[group] = frequency_cutoff(factors[group], int(size), hidden_r)
+    buckets = sizes * (1 << 32) + (1 << np.ceil(np.log2(cutoffs)).astype(np.int64))
+    for bucket in np.unique(buckets):
+        group = np.flatnonzero(buckets == bucket)
+        size, frequencies = int(sizes[group[0]]), int(cutoffs[group].max())
+        x = np.clip(at[group], -1, size - 1)
+        if 8 * frequencies > size:
+            profiles, inverse = np.unique(factors[group], axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            mid = np.zeros(len(group))
+            for batch in np.array_split(np.arange(len(profiles)), -(-len(profiles) * size // BATCH_CELLS)):
+                cdf = np.cumsum(_distributions(profiles[batch], size, hidden_r), axis=1)
+                chosen = (inverse >= batch[0]) & (inverse <= batch[-1]) & (x >= 0)
+                index, points = inverse[chosen] - batch[0], x[chosen]
+                mid[chosen] = (np.where(points >= 1, cdf[index, points - 1], 0.0) + cdf[index, points]) / 2
+        else:
+            mid = np.concatenate([
+                mid_cdf(factors[group[batch]], size, x[batch], frequencies, hidden_r)
+                for batch in np.array_split(np.arange(len(group)), -(-len(group) * frequencies // BATCH_CELLS))
+            ])
+        score[rows[group]] = np.where(x >= 0, 1 - np.clip(mid, 0, 1), 1.0)
+
+    expected = np.full(len(members), np.nan)
+    expected[rows] = factors @ factor_moments(hidden_r)[:, 0] + offset[rows]
+
+    ranked = members.assign(expected_taps=expected, luck_score=score, luck=np.where(np.isnan(score), None, luck_status(score)))
+    ranked = ranked.sort_values("luck_score", ascending=False, kind="stable", na_position="last").reset_index(drop=True)
+    ranked.insert(0, "rank", ranked["luck_score"].rank(ascending=False, method="min").astype("Int64"))
+    return ranked
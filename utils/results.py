@@ -0,0 +1,116 @@
+import numpy as np
+from functools import cached_property
+from typing import Dict, Sequence
+
+class SimulationResult:
+    """
+    Columnar per-trial simulation results: costs, failsafes reached, taps and a catalyst usage matrix
+    with one column per catalyst in self.catalysts. Summaries are computed on first use.
+    """
+    def __init__(self, costs: np.ndarray, failsafes: np.ndarray, steps: np.ndarray, counts: np.ndarray, catalysts: Sequence[str]):
+        self.costs = np.asarray(costs, dtype=np.float64)
+        self.failsafes = np.asarray(failsafes, dtype=np.uint8)
+        self.steps = np.asarray(steps, dtype=np.uint32)
+        self.counts = np.asarray(counts, dtype=np.uint32).reshape(len(self.costs), len(catalysts))
+        self.catalysts = list(catalysts)
+
+    def __len__(self) -> int:
+        return len(self.costs)
+
+    def __getitem__(self, index) -> "SimulationResult":
+        """
+        Selects trials by slice, index array or mask. Slices share memory with this result.
+        """
+        if isinstance(index, (int, np.integer)):
+            index = slice(index, index + 1 or None)
+        return SimulationResult(self.costs[index], self.failsafes[index], self.steps[index], self.counts[index], self.catalysts)
+
+    @cached_property
+    def sorted_costs(self) -> np.ndarray:
+        return np.sort(self.costs)
+
+    @cached_property
+    def mean(self) -> float:
+        return float(self.costs.mean())
+
+    @cached_property
+    def std(self) -> float:
+        return float(self.costs.std())
+
+    @property
+    def min(self) -> float:
+        return float(self.sorted_costs[0])
+
+    @property
+    def max(self) -> float:
+        return float(self.sorted_costs[-1])
+
+    @cached_property
+    def mean_steps(self) -> float:
+        return float(self.steps.mean())
+
+    def quantile(self, q: float | np.ndarray) -> float | np.ndarray:
+        """
+        Cost at the q-th percentile, taken as the sorted cost at index int(q * (n - 1)).
+        """
+        index = (np.asarray(q) * (len(self) - 1)).astype(int)
+        return self.sorted_costs[index]
+
+    def average_catalysts(self) -> Dict[str, float]:
+        return dict(zip(self.catalysts, self.counts.mean(axis=0, dtype=np.float64).tolist()))
+
+    def save(self, path: str):
+        np.savez_compressed(path, costs=self.costs, failsafes=self.failsafes, steps=self.steps, counts=self.counts, catalysts=np.array(self.catalysts))
+
+    @classmethod
+    def load(cls, path: str) -> "SimulationResult":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["costs"], data["failsafes"], data["steps"], data["counts"], data["catalysts"].tolist())
+
+class CampaignResult:
+    """
+    Per-trial results of a multi-piece campaign, broken down by gear slot: opal value and gold of shape
+    (n, slots) and catalyst usage of shape (n, slots, catalysts). Totals sum over the slots.
+    """
+    def __init__(self, costs: np.ndarray, gold: np.ndarray, counts: np.ndarray, slots: Sequence[str], catalysts: Sequence[str]):
+        self.costs = np.asarray(costs, dtype=np.float64)
+        self.gold = np.asarray(gold, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.uint32)
+        self.slots = list(slots)
+        self.catalysts = list(catalysts)
+
+    def __len__(self) -> int:
+        return len(self.costs)
+
+    @property
+    def taps(self) -> np.ndarray:
+        return self.counts.sum(axis=2, dtype=np.int64)
+
+    @property
+    def total_costs(self) -> np.ndarray:
+        return self.costs.sum(axis=1)
+
+    @property
+    def total_gold(self) -> np.ndarray:
+        return self.gold.sum(axis=1)
+
+    @property
+    def total_taps(self) -> np.ndarray:
+        return self.taps.sum(axis=1)
+
+    @property
+    def total_counts(self) -> np.ndarray:
+        return self.counts.sum(axis=1, dtype=np.int64)
+
+    def slot(self, slot: str) -> SimulationResult:
+        """
+        The trials of a single slot as a SimulationResult. Failsafes are not tracked across a campaign and read 0.
+        """
+        i = self.slots.index(slot)
+        return SimulationResult(self.costs[:, i], np.zeros(len(self), dtype=np.uint8), self.taps[:, i], self.counts[:, i], self.catalysts)
+
+    def total(self) -> SimulationResult:
+        """
+        The campaign totals as a SimulationResult. Failsafes are not tracked across a campaign and read 0.
+        """
+        return SimulationResult(self.total_costs, np.zeros(len(self), dtype=np.uint8), self.total_taps, self.total_counts, self.catalysts)
@@ -0,0 +1,549 @@
+import numpy as np
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+from statistics import NormalDist
+import pandas as pd
+import constants as CONST
+from utils.streaming import SimulationSummary
+from utils.results import CampaignResult, SimulationResult
+
+PITY_CAP = 6
+FAILSAFE_CAP = 6
+SHARD_SIZE = 4096
+MIN_TAIL_TRIALS = 100 # Trials beyond the target percentile that simulate_adaptive needs before testing convergence
+BOOT_BLOCK = 1 << 22 # Resampled costs that the bootstrap of compare_selections holds at once
+
+def boost(p: float | np.ndarray, catalyst: str) -> float | np.ndarray:
+    """
+    Applies a catalyst to a success probability using the CONST.CATALYST_BOOSTS table.
+    """
+    multiplier, bonus = CONST.CATALYST_BOOSTS[catalyst]
+    # fmin skips the NaN of 0 * inf, so guaranteed catalysts always give 1.
+    with np.errstate(invalid="ignore"):
+        return np.fmin(np.fmin(np.multiply(p, multiplier), np.add(p, bonus)), 1.0)
+
+def pity_ladder(catalyst: str, hidden_r: bool = True) -> np.ndarray:
+    """
+    Success probability of an amp tap for each pity counter (0/6 to 6/6).
+
+    Args:
+        catalyst (str): The catalyst used on the tap.
+        hidden_r (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+    """
+    raw_prob = CONST.CATALYST_PROB_MAP[catalyst]
+    ladder = np.full(PITY_CAP + 1, raw_prob, dtype=np.float64)
+    if hidden_r:
+        ladder[CONST.HIDDEN_PITY:PITY_CAP] = max(raw_prob, boost(CONST.HIDDEN_PROB, catalyst))
+    ladder[PITY_CAP] = 1.0
+    return ladder
+
+def success_probs(enhancement_level: int, actions: np.ndarray, hidden_r: bool = True) -> np.ndarray:
+    """
+    Success probability of each cell of a (failsafe, amp, pity) action table.
+    """
+    amax = actions.shape[1] - 1
+    probs = np.zeros(actions.shape)
+    for f in range(FAILSAFE_CAP + 1):
+        for a in range(amax):
+            for p in range(PITY_CAP + 1):
+                probs[f, a, p] = pity_ladder(actions[f, a, p], hidden_r)[p]
+        probs[f, amax, 0] = boost(CONST.FAILSAFES[enhancement_level][f], actions[f, amax, 0])
+    return probs
+
+def failure_pmf(ladder: Sequence[float], start: int = 0) -> np.ndarray:
+    """
+    Distribution of the number of failures before the first success of a ladder of success probabilities.
+
+    The last rung of the ladder must be a guaranteed success.
+    """
+    reach = 1.0
+    pmf = []
+    for q in ladder[start:]:
+        pmf.append(reach * q)
+        reach *= 1 - q
+    return np.array(pmf)
+
+def _to_cdf(pmf: np.ndarray) -> np.ndarray:
+    cdf = np.cumsum(pmf, axis=-1)
+    cdf[..., -1] = 1.0
+    return cdf
+
+def _sample(cdf: np.ndarray, u: np.ndarray) -> np.ndarray:
+    return np.searchsorted(cdf, u, side="right")
+
+def _copies_cdf(pmf: np.ndarray, max_copies: int) -> np.ndarray:
+    """
+    Row m holds the CDF of the sum of m independent draws of (failures + 1).
+    """
+    step = np.concatenate([[0.0], pmf])
+    table = np.zeros((max_copies + 1, max_copies * len(pmf) + 1))
+    dist = np.array([1.0])
+    for m in range(max_copies + 1):
+        table[m, :len(dist)] = dist
+        dist = np.convolve(dist, step)
+    return _to_cdf(table)
+
+def _sample_copies(copies_cdf: np.ndarray, m: np.ndarray, u: np.ndarray) -> np.ndarray:
+    # Offsetting row m by m keeps the flattened table sorted so a single searchsorted handles every row.
+    rows, width = copies_cdf.shape
+    flat = (copies_cdf + np.arange(rows)[:, None]).ravel()
+    return np.searchsorted(flat, u + m, side="right") - m * width
+
+def _simulate_chunk(amp_cdfs: List[np.ndarray], bottom_cdf: np.ndarray, rounds: np.ndarray, draw: Callable[[int, np.ndarray], np.ndarray]) -> np.ndarray:
+    """
+    Samples the taps spent on each amp level for a chunk of trials.
+
+    Climbing from 0 to amp a+1 is a run of climbs to amp a, one per tap at amp a, so the chain is
+    sampled level by level: every climb to a+1 draws its number of failures at amp a and spawns that
+    many (plus one) climbs to a. The bottom level is drawn directly as a sum of copies.
+
+    draw(level, owner) returns one uniform per climb, where owner holds the trial of each climb in sorted order.
+    """
+    n = len(rounds)
+    amp_taps = np.zeros((n, len(amp_cdfs)), dtype=np.int64)
+    owner = np.arange(n)
+    copies = rounds
+
+    for a in reversed(range(1, len(amp_cdfs))):
+        owner = np.repeat(owner, copies)
+        copies = _sample(amp_cdfs[a], draw(a, owner)) + 1
+        amp_taps[:, a] = np.bincount(owner, weights=copies, minlength=n)
+
+    bottom_taps = _sample_copies(bottom_cdf, copies, draw(0, owner))
+    amp_taps[:, 0] = np.bincount(owner, weights=bottom_taps, minlength=n)
+    return amp_taps
+
+def _simulate_selections(tables: List[tuple], selections: Sequence[Sequence[str]], tap_costs: np.ndarray, rounds: np.ndarray, draw: Callable[[int, np.ndarray], np.ndarray]) -> np.ndarray:
+    """
+    Samples the taps of _simulate_chunk for every selection on the same trials, given the _tables of each,
+    and prices them with the (selection, amp) tap_costs.
+
+    Selections that agree from amp a up have the same climbs down to amp a, so each group of them is sampled
+    once, and the uniforms of amp a are drawn once for all the selections that branch there.
+
+    Returns:
+        The (selection, trial) cost of the amp taps.
+    """
+    n = len(rounds)
+    costs = np.zeros((len(selections), n))
+
+    def descend(members: List[int], a: int, owner: np.ndarray, copies: np.ndarray):
+        if a > 0:
+            owner = np.repeat(owner, copies)
+        u = draw(a, owner)
+        groups: Dict[str, List[int]] = {}
+        for s in members:
+            groups.setdefault(selections[s][a], []).append(s)
+        for group in groups.values():
+            amp_cdfs, bottom_cdf, _ = tables[group[0]]
+            if a == 0:
+                costs[group] += np.bincount(owner, weights=_sample_copies(bottom_cdf, copies, u), minlength=n) * tap_costs[group, :1]
+            else:
+                sampled = _sample(amp_cdfs[a], u) + 1
+                costs[group] += np.bincount(owner, weights=sampled, minlength=n) * tap_costs[group, a:a + 1]
+                descend(group, a - 1, owner, sampled)
+
+    descend(list(range(len(selections))), len(selections[0]) - 1, np.arange(n), rounds)
+    return costs
+
+def _tables(enhancement_level: int, catalysts: Sequence[str], final_catalyst: str, hidden_r: bool) -> Tuple[List[np.ndarray], np.ndarray, np.ndarray]:
+    amp_cdfs = [_to_cdf(failure_pmf(pity_ladder(c, hidden_r))) for c in catalysts]
+    bottom_cdf = _copies_cdf(failure_pmf(pity_ladder(catalysts[0], hidden_r)), PITY_CAP + 1)
+    failsafe_cdf = _to_cdf(failure_pmf(boost(np.array(CONST.FAILSAFES[enhancement_level]), final_catalyst)))
+    return amp_cdfs, bottom_cdf, failsafe_cdf
+
+def _simulate_shard(enhancement_level: int, catalysts: Tuple[str, ...], final_catalyst: str, hidden_r: bool, n: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """
+    Samples the taps of one shard of trials from its own generator.
+    """
+    rng = np.random.default_rng(seed)
+    amp_cdfs, bottom_cdf, failsafe_cdf = _tables(enhancement_level, catalysts, final_catalyst, hidden_r)
+
+    taps = np.empty((n, len(catalysts) + 1), dtype=np.int64)
+    rounds = _sample(failsafe_cdf, rng.random(n)) + 1
+    taps[:, :-1] = _simulate_chunk(amp_cdfs, bottom_cdf, rounds, lambda level, owner: rng.random(len(owner)))
+    taps[:, -1] = rounds
+    return taps
+
+@lru_cache(maxsize=None)
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # Spawned workers only import this module, so they never touch streamlit or the global np.random state.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def _shard_args(enhancement_level: int, catalysts: Sequence[str], final_catalyst: str, hidden_r: bool, n: int, seed: int | np.random.SeedSequence | None) -> List[tuple]:
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    sizes = [min(SHARD_SIZE, n - start) for start in range(0, n, SHARD_SIZE)]
+    return [(enhancement_level, tuple(catalysts), final_catalyst, hidden_r, size, child) for size, child in zip(sizes, seed.spawn(len(sizes)))]
+
+def _run_shards(shard_args: List[tuple], workers: int, shard_fn: Callable = _simulate_shard) -> Iterator:
+    """
+    Yields the result of shard_fn on each shard in order, keeping at most a few shards per worker in flight.
+    """
+    if workers > 1 and len(shard_args) > 1:
+        window = workers * 4
+        for start in range(0, len(shard_args), window):
+            yield from _get_pool(workers).map(shard_fn, *zip(*shard_args[start:start + window]))
+    else:
+        for args in shard_args:
+            yield shard_fn(*args)
+
+def simulate(enhancement_level: int, base_cost: float, catalysts: Sequence[str], final_catalyst: str, catalyst_cost_map: Dict[str, float], n: int = 10000, hidden_r: bool = True, seed: int | np.random.SeedSequence | None = None, workers: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Run n enhancement trials at once for a fixed catalyst per amp level.
+
+    Trials are split into shards of SHARD_SIZE, each drawing from a generator spawned from the seed,
+    so a given seed gives the same result whatever the number of workers.
+
+    Args:
+        enhancement_level (int): The current enhancement level.
+        base_cost (float): The opal cost of a tap without catalyst.
+        catalysts (Sequence[str]): The catalyst used at each amp level.
+        final_catalyst (str): The catalyst used on the enhancement tap once every amp is filled.
+        catalyst_cost_map (dict): The opal cost of each catalyst.
+        n (int): The number of trials.
+        hidden_r (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+        seed (int | np.random.SeedSequence): The root seed. Fresh entropy is used if None.
+        workers (int): The number of worker processes to spread the shards over.
+
+    Returns:
+        costs (n,), failsafes (n,), steps (n,) and taps (n, amps + 1) where the last column counts enhancement taps.
+    """
+    shard_args = _shard_args(enhancement_level, catalysts, final_catalyst, hidden_r, n, seed)
+    shards = list(_run_shards(shard_args, workers))
+    taps = np.concatenate(shards) if shards else np.empty((0, len(catalysts) + 1), dtype=np.int64)
+
+    tap_costs = np.array([catalyst_cost_map[c] + base_cost for c in [*catalysts, final_catalyst]])
+    costs = taps @ tap_costs
+    failsafes = taps[:, -1] - 1
+    steps = taps.sum(axis=1)
+    return costs, failsafes, steps, taps
+
+def _summarise(summary: SimulationSummary | None, shards: Iterator[np.ndarray], tap_costs: np.ndarray, catalysts: Sequence[str], final_catalyst: str, bins: int) -> SimulationSummary | None:
+    """
+    Folds shards of taps into a summary, creating it from the first shard if needed.
+    """
+    for taps in shards:
+        costs = taps @ tap_costs
+        names, counts = catalyst_counts(taps, catalysts, final_catalyst)
+        if summary is None:
+            lower, upper = costs.min(), np.quantile(costs, 0.999)
+            summary = SimulationSummary(np.linspace(lower, max(upper, lower + 1), bins + 1), names)
+        summary.update(costs, taps[:, -1] - 1, taps.sum(axis=1), counts)
+    return summary
+
+def simulate_summary(enhancement_level: int, base_cost: float, catalysts: Sequence[str], final_catalyst: str, catalyst_cost_map: Dict[str, float], n: int = 10000, hidden_r: bool = True, seed: int | np.random.SeedSequence | None = None, workers: int = 1, bins: int = 20) -> SimulationSummary:
+    """
+    Run n enhancement trials and fold each shard into a SimulationSummary, so memory does not grow with n.
+
+    Takes the same arguments as simulate(). The histogram spans the first shard's cost range up to its
+    99.9th percentile; costs beyond it are tallied as overflow.
+    """
+    tap_costs = np.array([catalyst_cost_map[c] + base_cost for c in [*catalysts, final_catalyst]])
+    shards = _run_shards(_shard_args(enhancement_level, catalysts, final_catalyst, hidden_r, n, seed), workers)
+    return _summarise(None, shards, tap_costs, catalysts, final_catalyst, bins)
+
+def simulate_adaptive(enhancement_level: int, base_cost: float, catalysts: Sequence[str], final_catalyst: str, catalyst_cost_map: Dict[str, float], rel_tol: float = 0.01, percentile: float = 0.9, confidence: float = 0.95, max_trials: int = 10_000_000, max_seconds: float = 30.0, hidden_r: bool = True, seed: int | np.random.SeedSequence | None = None, workers: int = 1, bins: int = 20) -> Tuple[SimulationSummary, bool]:
+    """
+    Run batches of trials until the confidence intervals of the mean cost and of a cost percentile are
+    both within rel_tol of their estimates, or the trial or time budget runs out.
+
+    Batches start at one shard and double each round. Shard seeds are spawned in order from
+    the root seed, so a seeded run that stops on precision is reproducible. Convergence is only tested once
+    there is at least one full shard and MIN_TAIL_TRIALS trials beyond the percentile, since a handful of
+    trials can have a degenerate spread.
+
+    Returns:
+        The summary, whose n is the number of trials used, and whether the tolerance was reached.
+    """
+    if max_trials < 1:
+        raise ValueError("max_trials must be at least 1")
+    min_trials = max(SHARD_SIZE, int(np.ceil(MIN_TAIL_TRIALS / (1 - percentile))))
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    tap_costs = np.array([catalyst_cost_map[c] + base_cost for c in [*catalysts, final_catalyst]])
+    deadline = time.monotonic() + max_seconds
+    summary = None
+    batch = SHARD_SIZE
+
+    while True:
+        n = min(batch, max_trials - (summary.n if summary else 0))
+        shards = _run_shards(_shard_args(enhancement_level, catalysts, final_catalyst, hidden_r, n, seed), workers)
+        summary = _summarise(summary, shards, tap_costs, catalysts, final_catalyst, bins)
+
+        lower, upper = summary.quantile_interval(percentile, confidence)
+        converged = summary.n >= min_trials\
+            and summary.mean_halfwidth(confidence) <= rel_tol * summary.cost.mean\
+            and (upper - lower) / 2 <= rel_tol * summary.quantile(percentile)
+        if converged or summary.n >= max_trials or time.monotonic() >= deadline:
+            return summary, converged
+        batch *= 2
+
+def action_names(actions: np.ndarray) -> List[str]:
+    """
+    The catalysts used by an action table, in CONST.CATALYST_PROB_MAP order.
+    """
+    used = set(actions[actions != None].tolist())
+    return [c for c in CONST.CATALYST_PROB_MAP if c in used]
+
+def _bottom_tables(usage: np.ndarray, pmf: np.ndarray, max_copies: int = PITY_CAP + 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The copies table of the catalysts used by a number of climbs through amp 0, so they can be drawn at once.
+
+    usage (failures, catalyst) holds what a run that fails k times uses and pmf the odds of k. Each catalyst's
+    count is a digit of a mixed-radix code, with a radix above the most that max_copies runs can use, so adding
+    codes never carries and row m of the table is the CDF of the code summed over m runs.
+
+    Returns:
+        The (max_copies + 1, codes) CDF table, and the place value and radix of each catalyst's digit, with a
+        place value of 0 for those never used.
+    """
+    radix = usage[-1] * max_copies + 1
+    place = np.where(usage[-1] > 0, np.cumprod(np.concatenate([[1], radix[:-1]])), 0)
+    step = np.bincount(usage @ place, weights=pmf, minlength=int(np.prod(radix)))
+    table = np.zeros((max_copies + 1, len(step)))
+    dist = np.array([1.0])
+    for m in range(max_copies + 1):
+        table[m, :len(dist)] = dist
+        dist = np.convolve(dist, step)[:len(step)]
+    return _to_cdf(table), place, radix
+
+def _simulate_policy_shard(enhancement_level: int, actions: np.ndarray, hidden_r: bool, start_state: Tuple[int, int, int], n: int, seed: np.random.SeedSequence) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Samples the catalyst usage and number of enhancement rounds of one shard of trials following an action table.
+
+    Each amp level of a round is a set of runs that finish the level, each drawing its failures from the
+    policy's ladder. A run that is part of a climb spawns one climb per tap at the level below; the run that
+    finishes the start amp (and the fresh runs above it) only spawn one per failure. Climbs are held as their
+    parents and how many each spawns, and the climbs through amp 0, the most numerous, are drawn at once per
+    parent from _bottom_tables as in _simulate_chunk.
+    """
+    rng = np.random.default_rng(seed)
+    f0, a0, p0 = start_state
+    amax = actions.shape[1] - 1
+    probs = success_probs(enhancement_level, actions, hidden_r)
+    names = action_names(actions)
+
+    # usage[f][a][s][k] counts the catalysts of a run at (f, a) from pity s that fails k times.
+    onehot = np.zeros(actions.shape + (len(names),), dtype=np.int64)
+    for index, action in np.ndenumerate(actions):
+        if action:
+            onehot[index + (names.index(action),)] = 1
+    usage = [[[np.cumsum(onehot[f, a, s:], axis=0) for s in range(PITY_CAP + 1)] for a in range(amax)] for f in range(FAILSAFE_CAP + 1)]
+    cdfs = [[[_to_cdf(failure_pmf(probs[f, a], s)) for s in range(PITY_CAP + 1)] for a in range(amax)] for f in range(FAILSAFE_CAP + 1)]
+    bottom = [_bottom_tables(usage[f][0][0], failure_pmf(probs[f, 0])) for f in range(FAILSAFE_CAP + 1)] if amax else []
+
+    counts = np.zeros((n, len(names)), dtype=np.int64)
+    rounds = _sample(_to_cdf(failure_pmf(probs[:, amax, 0], f0)), rng.random(n)) + 1
+    trials = np.arange(n)
+    empty = trials[:0]
+
+    for f in range(f0, FAILSAFE_CAP + 1):
+        active = trials[rounds > f - f0]
+        parents, copies = (empty, empty) if f == f0 else (active, np.ones_like(active))
+        fresh = active if f == f0 else empty
+        for a in reversed(range(amax)):
+            runs = [(fresh if a >= a0 else empty, p0 if a == a0 else 0, 0)]
+            if a > 0:
+                runs.insert(0, (np.repeat(parents, copies), 0, 1))
+            else:
+                table, place, radix = bottom[f]
+                code = _sample_copies(table, copies, rng.random(len(parents)))
+                for t in np.flatnonzero(place):
+                    counts[:, t] += np.bincount(parents, weights=code // place[t] % radix[t], minlength=n).astype(np.int64)
+            owners, spawned = [], []
+            for owner, start, reuse in runs:
+                failures = _sample(cdfs[f][a][start], rng.random(len(owner)))
+                used = usage[f][a][start][failures]
+                for t in np.flatnonzero(used.any(axis=0)):
+                    counts[:, t] += np.bincount(owner, weights=used[:, t], minlength=n).astype(np.int64)
+                owners.append(owner)
+                spawned.append(failures + reuse)
+            parents, copies = np.concatenate(owners), np.concatenate(spawned)
+        counts[active, names.index(actions[f, amax, 0])] += 1
+    return counts, rounds
+
+def simulate_policy(enhancement_level: int, actions: np.ndarray, base_cost: float, catalyst_cost_map: Dict[str, float], n: int = 10000, hidden_r: bool = True, start_state: Tuple[int, int, int] = (0, 0, 0), seed: int | np.random.SeedSequence | None = None, workers: int = 1) -> SimulationResult:
+    """
+    Run n enhancement trials following a (failsafe, amp, pity) action table, such as the policy from get_min_cost.
+
+    Args:
+        enhancement_level (int): The current enhancement level.
+        actions (np.ndarray): The action table.
+        base_cost (float): The opal cost of a tap without catalyst.
+        catalyst_cost_map (dict): The opal cost of each catalyst.
+        n (int): The number of trials.
+        hidden_r (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+        start_state (Tuple[int, int, int]): The current (failsafe, amp, pity).
+        seed (int | np.random.SeedSequence): The root seed. Fresh entropy is used if None.
+        workers (int): The number of worker processes to spread the shards over.
+    """
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    sizes = [min(SHARD_SIZE, n - start) for start in range(0, n, SHARD_SIZE)]
+    shard_args = [(enhancement_level, actions, hidden_r, tuple(start_state), size, child) for size, child in zip(sizes, seed.spawn(len(sizes)))]
+
+    shards = list(_run_shards(shard_args, workers, _simulate_policy_shard))
+
+    names = action_names(actions)
+    counts = np.concatenate([c for c, _ in shards]) if shards else np.empty((0, len(names)), dtype=np.int64)
+    rounds = np.concatenate([r for _, r in shards]) if shards else np.empty(0, dtype=np.int64)
+    tap_costs = np.array([catalyst_cost_map[c] + base_cost for c in names])
+    return SimulationResult(counts @ tap_costs, start_state[0] + rounds - 1, counts.sum(axis=1), counts, names)
+
+def simulate_campaign(legs: Sequence[Tuple[str, int, float, np.ndarray]], gold_price: float, catalyst_cost_map: Dict[str, float], n: int = 10000, hidden_r: bool = True, seed: int | np.random.SeedSequence | None = None, workers: int = 1) -> CampaignResult:
+    """
+    Run n trials of a multi-piece upgrade campaign, where every leg is one enhancement level on one gear slot.
+
+    Legs sharing a level and action table are sampled together, so e.g. ten armour pieces going 15 → 16 cost
+    a single batch of 10n trials.
+
+    Args:
+        legs (Sequence): (slot, enhancement level, gold per tap, action table) for each level step to take.
+        gold_price (float): The opal price of 1M gold.
+        catalyst_cost_map (dict): The opal cost of each catalyst.
+        n (int): The number of trials.
+        hidden_r (bool): Whether to account for hidden rates at 4/6 and 5/6 amplification.
+        seed (int | np.random.SeedSequence): The root seed. Fresh entropy is used if None.
+        workers (int): The number of worker processes to spread the shards over.
+    """
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    slots = list(dict.fromkeys(slot for slot, *_ in legs))
+    names = [c for c in CONST.CATALYST_PROB_MAP if any(c in action_names(actions) for *_, actions in legs)]
+
+    groups: Dict[tuple, List[int]] = {}
+    for i, (_, level, _, actions) in enumerate(legs):
+        groups.setdefault((level, tuple(actions.ravel().tolist())), []).append(i)
+
+    shard_args, owners = [], []
+    for (level, _), members, child in zip(groups, groups.values(), seed.spawn(len(groups))):
+        actions = legs[members[0]][3]
+        total = n * len(members)
+        sizes = [min(SHARD_SIZE, total - start) for start in range(0, total, SHARD_SIZE)]
+        shard_args += [(level, actions, hidden_r, (0, 0, 0), size, grandchild) for size, grandchild in zip(sizes, child.spawn(len(sizes)))]
+        owners += [members] * len(sizes)
+
+    # Per group, the shards concatenate to len(members) blocks of n trials, one block per leg.
+    counts = np.zeros((n, len(slots), len(names)), dtype=np.int64)
+    gold = np.zeros((n, len(slots)))
+    tap_costs = np.array([catalyst_cost_map[c] for c in names])
+    blocks: Dict[int, List[np.ndarray]] = {}
+    for members, (shard_counts, _), args in zip(owners, _run_shards(shard_args, workers, _simulate_policy_shard), shard_args):
+        local = action_names(args[1])
+        expanded = np.zeros((len(shard_counts), len(names)), dtype=np.int64)
+        expanded[:, [names.index(c) for c in local]] = shard_counts
+        blocks.setdefault(id(members), []).append(expanded)
+        if sum(len(b) for b in blocks[id(members)]) == n * len(members):
+            for i, leg_counts in zip(members, np.concatenate(blocks.pop(id(members))).reshape(len(members), n, len(names))):
+                slot, _, gold_per_tap, _ = legs[i]
+                counts[:, slots.index(slot)] += leg_counts
+                gold[:, slots.index(slot)] += leg_counts.sum(axis=1) * gold_per_tap
+
+    costs = gold / 1000000 * gold_price + counts @ tap_costs
+    return CampaignResult(costs, gold, counts, slots, names)
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    # splitmix64 finaliser; uint64 arithmetic wraps around.
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _keyed_uniforms(key: np.uint64, trials: np.ndarray, level: int, occurrence: np.ndarray) -> np.ndarray:
+    """
+    Counter-based uniforms: the same (trial, level, occurrence) always maps to the same number. The three are packed
+    into one 64-bit counter, with the trial in the top 24 bits, the level in the next 8 and the occurrence in the
+    low 32, and hashed once. The hash is a bijection, so distinct counters never share a number.
+    """
+    counter = (trials.astype(np.uint64) << np.uint64(40)) | (np.uint64(level) << np.uint64(32)) | occurrence.astype(np.uint64)
+    return (_mix(key ^ counter) >> np.uint64(11)) * 2.0 ** -53
+
+def _common_draw(key: np.uint64, trials: np.ndarray) -> Callable[[int, np.ndarray], np.ndarray]:
+    """
+    Draws uniforms keyed by trial, amp level and the climb's occurrence within its trial, so every
+    selection sees the same number at the same point of the same trial.
+    """
+    def draw(level: int, owner: np.ndarray) -> np.ndarray:
+        counts = np.bincount(owner, minlength=len(trials))
+        starts = np.cumsum(counts) - counts
+        return _keyed_uniforms(key, trials[owner], level, np.arange(len(owner)) - starts[owner])
+    return draw
+
+def compare_selections(enhancement_level: int, base_cost: float, selections: Sequence[Sequence[str]], final_catalyst: str, catalyst_cost_map: Dict[str, float], n: int = 2000, hidden_r: bool = True, seed: int | None = None, percentile: float = 0.9, confidence: float = 0.95, metric: str = "mean", n_boot: int = 200) -> pd.DataFrame:
+    """
+    Simulate many catalyst selections on common random numbers and rank them with paired differences.
+
+    Every selection replays the same trials: the failsafe rounds and each climb's uniform are shared, so
+    differences between selections are measured on the same luck rather than on independent noise. The
+    selections of a shard are sampled together by _simulate_selections, and the bootstrap resamples every
+    selection's costs together in blocks of up to BOOT_BLOCK.
+
+    Args:
+        selections (Sequence[Sequence[str]]): The per-amp catalyst selections to compare.
+        n (int): The number of common trials.
+        percentile (float): The cost percentile reported as the tail metric.
+        confidence (float): The confidence level of the intervals.
+        metric (str): "mean" or "percentile", the metric to rank by.
+        n_boot (int): The number of paired bootstrap resamples for the percentile intervals.
+        The other arguments are as in simulate().
+
+    Returns:
+        One row per selection, sorted by rank, with its mean and percentile cost and their paired
+        differences (with confidence intervals) against the best selection.
+    """
+    if n > 1 << 24:
+        raise ValueError("compare_selections keys its draws by trial and supports at most 2**24 trials")
+    key = np.random.SeedSequence(seed).generate_state(1, dtype=np.uint64)[0]
+    tables = [_tables(enhancement_level, catalysts, final_catalyst, hidden_r) for catalysts in selections]
+    failsafe_cdf = tables[0][2]
+    tap_costs = np.array([[catalyst_cost_map[c] + base_cost for c in catalysts] for catalysts in selections])
+    costs = np.empty((len(selections), n))
+
+    for start in range(0, n, SHARD_SIZE):
+        trials = np.arange(start, min(start + SHARD_SIZE, n))
+        rounds = _sample(failsafe_cdf, _keyed_uniforms(key, trials, tap_costs.shape[1], np.zeros_like(trials))) + 1
+        amp_costs = _simulate_selections(tables, selections, tap_costs, rounds, _common_draw(key, trials))
+        costs[:, start:start + len(trials)] = amp_costs + rounds * (catalyst_cost_map[final_catalyst] + base_cost)
+
+    means = costs.mean(axis=1)
+    quantiles = np.quantile(costs, percentile, axis=1)
+    best = int(np.argmin(means if metric == "mean" else quantiles))
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+
+    diffs = costs - costs[best]
+    mean_diff = diffs.mean(axis=1)
+    mean_err = z * diffs.std(axis=1, ddof=1) / n ** 0.5 if n > 1 else np.full(len(selections), np.nan)
+
+    # Paired bootstrap: every selection is resampled on the same trials.
+    rng = np.random.default_rng(key)
+    boot = np.empty((len(selections), n_boot))
+    block = max(1, BOOT_BLOCK // (len(selections) * n))
+    for first in range(0, n_boot, block):
+        resamples = rng.integers(0, n, size=(min(block, n_boot - first), n))
+        boot[:, first:first + len(resamples)] = np.quantile(costs[:, resamples], percentile, axis=2)
+    boot_diff = boot - boot[best]
+    alpha = (1 - confidence) / 2
+
+    result = pd.DataFrame({
+        "selection": [tuple(s) for s in selections],
+        "mean": means,
+        "percentile": quantiles,
+        "mean_diff": mean_diff,
+        "mean_diff_low": mean_diff - mean_err,
+        "mean_diff_high": mean_diff + mean_err,
+        "percentile_diff": quantiles - quantiles[best],
+        "percentile_diff_low": np.quantile(boot_diff, alpha, axis=1),
+        "percentile_diff_high": np.quantile(boot_diff, 1 - alpha, axis=1),
+    })
+    result["rank"] = result["mean" if metric == "mean" else "percentile"].rank(method="min").astype(int)
+    return result.sort_values("rank").reset_index(drop=True)
+
+def catalyst_counts(taps: np.ndarray, catalysts: Sequence[str], final_catalyst: str) -> Tuple[List[str], np.ndarray]:
+    """
+    Aggregates per-level tap counts into per-catalyst usage, in order of first use.
+    """
+    names = list(dict.fromkeys([*catalysts, final_catalyst]))
+    onehot = np.zeros((len(catalysts) + 1, len(names)), dtype=np.int64)
+    for i, c in enumerate([*catalysts, final_catalyst]):
+        onehot[i, names.index(c)] = 1
+    return names, taps @ onehot
@@ -1,8 +1,18 @@
 import streamlit as st
 import numpy as np
+import pandas as pd
 from typing import List, Callable, Tuple
 import constants as CONST
 import itertools
+import utils.simulation as simulation
+import utils.distribution as distribution
+import utils.absolute_policy as absolute_policy
+import utils.ladder as ladder
+import utils.inventory as inventory
+import utils.chain as chain
+import utils.luck as luck
+from utils.results import CampaignResult, SimulationResult
+from utils.disk_cache import disk_cache, unseeded
 
 CATALYST_COST_MAP = {
     "No Catalyst": 0,
@@ -13,183 +23,255 @@ CATALYST_COST_MAP = {
     "4 Star Catalyst": st.session_state.get('potent_catalyst_price', 800) * 40
 }
 
-def expected_frac(p=0.20):
-    """
-    Calculates effective expectation frac after accounting for pity.
+MIN_STOCK = 16 # Smallest catalyst stock an inventory plan is solved for
+
+def modified_prob(probs: np.ndarray | List[float], modifier: str | List[str] | Callable = "No Catalyst") -> np.ndarray:
     """
-    remaining = 1.0
-    expected_value = 0.0
+    Applies a catalyst to every probability in probs.
 
-    for i in range(1, 7):
-        pi = p * remaining
-        expected_value += pi * i
-        remaining -= pi
+    A catalyst name, or an array of names, is looked up in CONST.CATALYST_BOOSTS and applied as
+    min(p * multiplier, p + bonus, 1), with the catalysts as leading axes: modified_prob(table, names) has shape
+    names.shape + table.shape. A callable is applied to each probability in turn.
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    if callable(modifier):
+        return np.array([modifier(p) for p in probs.ravel()], dtype=np.float64).reshape(probs.shape)
+    names = np.asarray(modifier)
+    boosts = np.array([CONST.CATALYST_BOOSTS[c] for c in names.ravel()], dtype=np.float64)
+    multiplier, bonus = boosts.T.reshape((2,) + names.shape + (1,) * probs.ndim)
+    # fmin skips the NaN of 0 * inf, so guaranteed catalysts always give 1.
+    with np.errstate(invalid="ignore"):
+        return np.fmin(np.fmin(probs * multiplier, probs + bonus), 1.0)
 
-    expected_value += remaining * 7
+def expected_frac(p: np.ndarray | float = 0.20, modifier: str | List[str] | Callable = "No Catalyst", hidden_r: bool = False) -> np.ndarray:
+    """
+    Calculates effective expectation frac after accounting for pity, i.e. the success rate with the same expected
+    taps, for every raw probability in p and catalyst in modifier (see modified_prob).
 
-    return 1 / expected_value
+    Taps succeed at p until the guaranteed 7th, so the expected taps are (1 - (1 - p) ** 7) / p. With hidden_r the
+    5th and 6th taps succeed at h, the catalysed CONST.HIDDEN_PROB if it is higher than p, which gives
+    (1 - (1 - p) ** 4) / p + (1 - p) ** 4 * (1 + (1 - h) + (1 - h) ** 2), see chain.hidden_pity_prob.
+    """
+    probs = modified_prob(p, modifier)
+    if not hidden_r:
+        return chain.pity_prob(probs)
+    return chain.hidden_pity_prob(probs, modified_prob(np.full(np.shape(p), CONST.HIDDEN_PROB), modifier))
 
-def modified_prob(probs: List[float], modifier: Callable = lambda x: x) -> List[float]:
+def cumulative_prob(probs: np.ndarray | List[float]) -> np.ndarray:
     """
-    Applies a modifier to the expected fraction of each probability in the list.
+    Calculates the cumulative expected steps over a pity ladder along the last axis of probs, e.g. the failsafe
+    probabilities of a level, returned as the equivalent success rate. Tap k is reached with probability
+    prod(1 - probs[:k]) and the last tap always ends the ladder.
     """
-    return [modifier(p) for p in probs]
+    probs = np.asarray(probs, dtype=np.float64)
+    reached = np.cumprod(1 - probs[..., :-1], axis=-1)
+    return 1 / (1 + reached.sum(axis=-1))
 
-def cumulative_prob(probs: list) -> float:
+def calc_cost(catalyst_selected: List[str], base_cost: int, CATALYST_COST_MAP: dict, hidden_r: bool = False):
     """
-    Calculates the cumulative expected steps
+    Calculates cost given a set of raw probabilities and costs.
     """
-    remaining = 1.0
-    expected_value = 0.0
+    _, total_cost, taps, catalyst_usage = chain.rank_selections([[catalyst] for catalyst in catalyst_selected], base_cost, CATALYST_COST_MAP, hidden_r=hidden_r)[0]
+    return total_cost, taps, catalyst_usage
 
-    for i, p in enumerate(probs[:-1]):
-        pi = p * remaining
-        expected_value += pi * (i+1)
-        remaining -= pi
-    expected_value += remaining * len(probs)
-    return 1 / expected_value
+def candidate_options(chain_length: int) -> List[List[str]]:
+    """
+    Lists the catalysts considered at each amp for a given chain length.
+    """
+    sim_params = [["No Catalyst", "Catalyst", "Potent Catalyst"] for _ in range(chain_length)]
+    if chain_length == 3:
+        sim_params[-1].append("3 Star Catalyst")
+    elif chain_length == 4:
+        sim_params[-1].append("4 Star Catalyst")
+    return sim_params
 
-def gen_matrix(probs: list[float], apply_expected_frac: bool = True):
+def candidate_selections(chain_length: int) -> List[Tuple[str, ...]]:
     """
-    Generates probability matrix given a list of raw probabilities
+    Lists every per-amp catalyst selection considered for a given chain length.
     """
-    if apply_expected_frac:
-        probs = [expected_frac(p) for p in probs]
-    chain_length = len(probs)
+    return list(itertools.product(*candidate_options(chain_length)))
 
-    P = np.zeros((chain_length+1, chain_length+1))
-    for i in range(chain_length):
-        P[i][0] = 1 - probs[i]
-        P[i][i+1] = probs[i]
+@st.cache_data(show_spinner=False)
+@disk_cache
+def optimise(base_cost: float, chain_length: int, CATALYST_COST_MAP: dict, hidden_r: bool = False):
+    """
+    Optimise the catalyst usage for a given chain length and base cost.
+    """
 
-    P[chain_length][chain_length] = 1 # absorbing state
-    return P
+    min_key, min_cost, min_taps, min_catalyst_usage = rank_selections(chain_length, base_cost, CATALYST_COST_MAP, hidden_r=hidden_r)[0]
+    return min_key, min_cost, min_taps, min_catalyst_usage
 
-def calc_cost(catalyst_selected: List[str], base_cost: int, CATALYST_COST_MAP: dict):
+def rank_selections(chain_length: int, base_cost: float, CATALYST_COST_MAP: dict, top_k: int | None = 1, hidden_r: bool = False):
     """
-    Calculates cost given a set of raw probabilities and costs.
+    The top_k selections of candidate_selections by expected cost, as (selection, cost, taps, catalyst usage).
     """
-    raw_probs = [CONST.CATALYST_PROB_MAP[catalyst] for catalyst in catalyst_selected]
-    P = gen_matrix(raw_probs)
+    return chain.rank_selections(candidate_options(chain_length), base_cost, CATALYST_COST_MAP, top_k=top_k, hidden_r=hidden_r)
 
-    absorbing = [i for i in range(len(P)) if P[i][i] == 1 and all(P[i][j] == 0 for j in range(len(P)) if j != i)]
-    transient = [i for i in range(len(P)) if i not in absorbing]
+def get_sim_results(enhancement_level: int, base_cost: int,  catalyst_selected: List[str], n: int = 10000, hidden_r: bool=True, CATALYST_COST_MAP: dict = CATALYST_COST_MAP, seed: int | None = None, workers: int = 1) -> SimulationResult:
+    """
+    Run the simulation for a given base cost and catalyst selection.
+    """
+    catalyst_selected = dict(catalyst_selected)
+    final_catalyst = catalyst_selected.pop("final", "Potent Catalyst")
+    catalysts = list(catalyst_selected.values())
 
-    # Compute M = (I - Q)^-1
-    Q = P[:len(transient), :len(transient)]
-    I = np.eye(Q.shape[0])
-    M = np.linalg.inv(I - Q)
+    costs, failsafes, steps, taps = simulation.simulate(enhancement_level, base_cost, catalysts, final_catalyst, CATALYST_COST_MAP, n=n, hidden_r=hidden_r, seed=seed, workers=workers)
+    names, counts = simulation.catalyst_counts(taps, catalysts, final_catalyst)
 
-    total_cost = sum([M[0][i] * (CATALYST_COST_MAP[catalyst] + base_cost) for i, catalyst in enumerate(catalyst_selected)])
-    taps = sum(M[0]) 
-    catalyst_usage = {}
-    for i, catalyst in enumerate(catalyst_selected):
-        catalyst_usage[catalyst] = catalyst_usage.get(catalyst, 0) + M[0][i] 
-    
+    return SimulationResult(costs, failsafes, steps, counts, names)
 
-    return total_cost, taps, catalyst_usage
 
 @st.cache_data(show_spinner=False)
-def optimise(base_cost: float, chain_length: int, CATALYST_COST_MAP: dict):
+@disk_cache(ignore=("workers",), skip_if=unseeded)
+def get_cached_sim_results(enhancement_level: int, base_cost: float, catalyst_selected: List[str], CATALYST_COST_MAP: dict, n: int = 1000, hidden_r: bool = True, seed: int | None = None, workers: int = 1) -> SimulationResult:
     """
-    Optimise the catalyst usage for a given chain length and base cost.
+    Get cached simulation results for a given base cost and catalyst selection.
     """
 
-    sim_params = [["No Catalyst", "Catalyst", "Potent Catalyst"]] * chain_length
-    if chain_length == 3:
-        sim_params[-1].append("3 Star Catalyst")
-    elif chain_length == 4:
-        sim_params[-1].append("4 Star Catalyst")
+    return get_sim_results(enhancement_level=enhancement_level, base_cost=base_cost, hidden_r=hidden_r, catalyst_selected=catalyst_selected, n=n, CATALYST_COST_MAP=CATALYST_COST_MAP, seed=seed, workers=workers)
+
+
+@st.cache_data(show_spinner=False)
+@disk_cache(ignore=("workers",), skip_if=unseeded)
+def get_cached_sim_summary(enhancement_level: int, base_cost: float, catalyst_selected: List[str], CATALYST_COST_MAP: dict, n: int = 1000, hidden_r: bool = True, seed: int | None = None, workers: int = 1) -> simulation.SimulationSummary:
+    """
+    Get a cached constant-memory summary of the simulation for a given base cost and catalyst selection.
+    """
+    catalyst_selected = dict(catalyst_selected)
+    final_catalyst = catalyst_selected.pop("final", "Potent Catalyst")
 
-    permutations = list(itertools.product(*sim_params))
+    return simulation.simulate_summary(enhancement_level, base_cost, list(catalyst_selected.values()), final_catalyst, CATALYST_COST_MAP, n=n, hidden_r=hidden_r, seed=seed, workers=workers)
 
-    min_cost = float('inf')
-    min_key = None
-    min_taps = None
-    min_catalyst_usage = None
 
-    for i in permutations:
-        key = tuple(i)
-        total_cost, taps, catalyst_usage = calc_cost(i, base_cost, CATALYST_COST_MAP)
 
-        if total_cost < min_cost:
-            min_cost = total_cost
-            min_key = key
-            min_taps = taps
-            min_catalyst_usage = catalyst_usage
-    return min_key, min_cost, min_taps, min_catalyst_usage
+@st.cache_data(show_spinner=False)
+def get_cached_adaptive_summary(enhancement_level: int, base_cost: float, catalyst_selected: List[str], CATALYST_COST_MAP: dict, rel_tol: float = 0.01, percentile: float = 0.9, max_trials: int = 10_000_000, max_seconds: float = 30.0, hidden_r: bool = True, seed: int | None = None, workers: int = 1) -> Tuple[simulation.SimulationSummary, bool]:
+    """
+    Get a cached simulation summary that ran until the mean and the given percentile reached the relative tolerance.
+    Not cached on disk, since how far it gets within max_seconds depends on the machine and its load.
+    """
+    catalyst_selected = dict(catalyst_selected)
+    final_catalyst = catalyst_selected.pop("final", "Potent Catalyst")
 
+    return simulation.simulate_adaptive(enhancement_level, base_cost, list(catalyst_selected.values()), final_catalyst, CATALYST_COST_MAP, rel_tol=rel_tol, percentile=percentile, max_trials=max_trials, max_seconds=max_seconds, hidden_r=hidden_r, seed=seed, workers=workers)
 
-def get_sim_results(enhancement_level: int, base_cost: int,  catalyst_selected: List[str], n: int = 10000, hidden_r: bool=True) -> Tuple[List[float], List[int]]:
+@st.cache_data(show_spinner=False)
+@disk_cache
+def get_cached_exact_distribution(enhancement_level: int, base_cost: float, catalyst_selected: List[str], CATALYST_COST_MAP: dict, hidden_r: bool = True) -> Tuple[distribution.DiscreteDistribution, distribution.DiscreteDistribution]:
     """
-    Run the simulation for a given base cost and catalyst selection.
+    Get the cached exact tap and cost distributions for a given base cost and catalyst selection.
     """
-    
-    results = []
-    failsafes = []
-    steps_history = []
+    catalyst_selected = dict(catalyst_selected)
     final_catalyst = catalyst_selected.pop("final", "Potent Catalyst")
-    failsafe_probs = modified_prob(CONST.FAILSAFES[enhancement_level], CONST.CATALYST_MODIFIERS.get(final_catalyst, lambda x: x))
-    catalysts_results = []
-
-    raw_probs = [CONST.CATALYST_PROB_MAP[c] for c in catalyst_selected.values()]
-    costs = [CATALYST_COST_MAP[c] + base_cost for c in catalyst_selected.values()]
-    
-    for _ in range(n):
-        total_cost = 0
-        failsafe = 0
-        steps = 0
-        catalysts_used = {}
-
-        if len(raw_probs) != len(costs):
-            raise ValueError("raw_probs and cost must have the same length")
-        while failsafe < 7:
-            steps += 1
-            max_state = len(raw_probs)
-            state = 0
-            fails = [0] * max_state
-            
-            while state != max_state:
-                probs = raw_probs[state]
-                total_cost += costs[state]
-                catalysts_used[catalyst_selected[state]] = catalysts_used.get(catalyst_selected[state], 0) + 1
-                rng = np.random.random()
-                
-                if fails[state] == 6:
-                    next_state = state + 1
-                    fails[state] = 0
-                elif fails[state] in (4, 5) and hidden_r and rng <= CONST.CATALYST_MODIFIERS[catalyst_selected[state]](0.5):
-                    next_state = state + 1
-                    fails[state] = 0
-                elif rng <= probs:
-                    next_state = state + 1
-                    fails[state] = 0
-                else:
-                    next_state = 0
-                    fails[state] += 1
-                
-                state = next_state
-                steps += 1
-            
-            rng2 = np.random.random()
-            total_cost += CATALYST_COST_MAP[final_catalyst] + base_cost # Failsafe tap
-            catalysts_used[final_catalyst] = catalysts_used.get(final_catalyst, 0) + 1
-
-            if rng2 <= failsafe_probs[failsafe]:
-                results.append(total_cost)
-                failsafes.append(failsafe)
-                catalysts_results.append(catalysts_used)
-                break
-            else:
-                failsafe += 1
-        steps_history.append(steps)
-    return results, failsafes, steps_history, catalysts_results
+    actions = distribution.fixed_actions(list(catalyst_selected.values()), final_catalyst)
 
+    return distribution.enhancement_distribution(enhancement_level, actions, base_cost, CATALYST_COST_MAP, hidden_r=hidden_r)
 
 @st.cache_data(show_spinner=False)
-def get_cached_sim_results(enhancement_level: int, base_cost: float, catalyst_selected: List[str], CATALYST_COST_MAP: dict, n: int = 1000, hidden_r: bool = True) -> Tuple[List[float], List[int]]:
+def get_cached_policy_tables(enhancement_level: int, attempt_cost: float, gold_price: float, CATALYST_COST_MAP: dict, hidden_r: bool = True) -> absolute_policy.PolicyTables:
     """
-    Get cached simulation results for a given base cost and catalyst selection.
+    Get the cached values and optimal policy of every (failsafe, amp, pity) state, which do not depend on the start state.
+    """
+    return absolute_policy.solve_tables(enhancement_level, attempt_cost, gold_price, CATALYST_COST_MAP, hidden_rates=hidden_r)
+
+def get_cached_min_cost(enhancement_level: int, attempt_cost: float, gold_price: float, CATALYST_COST_MAP: dict, hidden_r: bool = True, start_state: Tuple[int, int, int] = (0, 0, 0)):
+    """
+    Get the optimal policy from start_state from the cached tables, so changing the start state never solves again.
+    """
+    return get_cached_policy_tables(enhancement_level, attempt_cost, gold_price, CATALYST_COST_MAP, hidden_r).query(start_state)
+
+@st.cache_data(show_spinner=False)
+@disk_cache(ignore=("workers",), skip_if=unseeded)
+def get_cached_policy_sim_results(enhancement_level: int, attempt_cost: float, gold_price: float, CATALYST_COST_MAP: dict, start_state: Tuple[int, int, int] = (0, 0, 0), n: int = 10000, hidden_r: bool = True, seed: int | None = None, workers: int = 1) -> SimulationResult:
+    """
+    Get cached simulation results of following the optimal policy from get_cached_min_cost, starting at start_state.
+    """
+    policy = absolute_policy.ACTION_NAMES[get_cached_min_cost(enhancement_level, attempt_cost, gold_price, CATALYST_COST_MAP, hidden_r, start_state)[1]]
+    base_cost = attempt_cost / 1000000 * gold_price
+
+    return simulation.simulate_policy(enhancement_level, policy, base_cost, CATALYST_COST_MAP, n=n, hidden_r=hidden_r, start_state=start_state, seed=seed, workers=workers)
+
+def get_cached_price_curve(enhancement_level: int, attempt_cost: float, gold_price: float, CATALYST_COST_MAP: dict, axis: str = "gold", hidden_r: bool = True, start_state: Tuple[int, int, int] = (0, 0, 0)):
+    """
+    Get the cached optimal cost curve along one price. The varied price is ignored, so changing it reuses the curve.
+    The start state stays in the key, since the curve is the lower envelope of the expected costs from it and only
+    bends where its own optimal policy changes.
+    """
+    gold_price, CATALYST_COST_MAP = absolute_policy.set_price(axis, 0.0, gold_price, CATALYST_COST_MAP)
+    return _get_cached_price_curve(enhancement_level, attempt_cost, gold_price, CATALYST_COST_MAP, axis, hidden_r, start_state)
+
+@st.cache_data(show_spinner=False)
+@disk_cache
+def _get_cached_price_curve(enhancement_level: int, attempt_cost: float, gold_price: float, CATALYST_COST_MAP: dict, axis: str, hidden_r: bool, start_state: Tuple[int, int, int]):
+    return absolute_policy.get_price_curve(enhancement_level, attempt_cost, gold_price, CATALYST_COST_MAP, axis=axis, hidden_rates=hidden_r, start_state=start_state)
+
+@st.cache_data(show_spinner=False)
+@disk_cache
+def get_cached_risk_policy(enhancement_level: int, attempt_cost: float, gold_price: float, CATALYST_COST_MAP: dict, objective: str = "variance", risk: float = 1.0, alpha: float = 0.9, hidden_r: bool = True, start_state: Tuple[int, int, int] = (0, 0, 0)):
+    """
+    Get the cached risk-sensitive policy and the mean-variance efficient frontier it was picked from. The start state
+    stays in the key, since the risk weights are relative to its expected cost and the tails come from its distribution.
+    """
+    return absolute_policy.get_risk_policy(enhancement_level, attempt_cost, gold_price, CATALYST_COST_MAP, objective=objective, risk=risk, alpha=alpha, hidden_rates=hidden_r, start_state=start_state)
+
+def get_cached_inventory_plan(enhancement_level: int, attempt_cost: float, gold_price: float, CATALYST_COST_MAP: dict, max_catalysts: int, max_potents: int, hidden_r: bool = True, start_state: Tuple[int, int, int] = (0, 0, 0)) -> inventory.InventoryPlan:
+    """
+    Get the cached best policy for every held stock of catalysts and potent catalysts up to at least the maxima.
+    The maxima are rounded up to a power of two, so changing the stock reuses the plan. The start state stays in the
+    key, since the overflow beyond a stock depends on the distribution from it.
+    """
+    max_catalysts, max_potents = (1 << max(int(m), MIN_STOCK - 1).bit_length() for m in (max_catalysts, max_potents))
+    return _get_cached_inventory_plan(enhancement_level, attempt_cost, gold_price, CATALYST_COST_MAP, max_catalysts, max_potents, hidden_r, start_state)
+
+@st.cache_data(show_spinner=False)
+@disk_cache
+def _get_cached_inventory_plan(enhancement_level: int, attempt_cost: float, gold_price: float, CATALYST_COST_MAP: dict, max_catalysts: int, max_potents: int, hidden_r: bool, start_state: Tuple[int, int, int]) -> inventory.InventoryPlan:
+    return inventory.solve_inventory(enhancement_level, attempt_cost, gold_price, CATALYST_COST_MAP, max_catalysts, max_potents, hidden_rates=hidden_r, start_state=start_state)
+
+@st.cache_data(show_spinner=False)
+def get_cached_ladder(gold_price: float, CATALYST_COST_MAP: dict, tap_cost_multiplier: float = 1.0, hidden_r: bool = True) -> ladder.Ladder:
+    """
+    Get the cached expected cost of every level transition from +10 to +25 with its prefix sums.
+    """
+    return ladder.solve_ladder(gold_price, CATALYST_COST_MAP, tap_cost_multiplier, hidden_r)
+
+@st.cache_data(show_spinner=False)
+def get_cached_luck_distribution(levels: Tuple[int, ...], hidden_r: bool = True, three_star_catalysts: int = 0, four_star_catalysts: int = 0, redundant_taps: int = 0) -> distribution.DiscreteDistribution:
+    """
+    Get the cached exact distribution of the total taps to reach the enhancement level of every slot.
+    """
+    return luck.total_taps(levels, hidden_r, three_star_catalysts, four_star_catalysts, redundant_taps)
+
+@st.cache_data(show_spinner=False)
+def get_cached_member_scores(members: pd.DataFrame, hidden_r: bool = True) -> pd.DataFrame:
+    """
+    Get the cached luck scores of a table of members, ranked from the luckiest down.
+    """
+    return luck.score_members(members, hidden_r)
+
+@st.cache_data(show_spinner=False)
+@disk_cache(ignore=("workers",), skip_if=unseeded)
+def get_cached_campaign_results(campaign: Tuple[Tuple[str, int, int, float], ...], gold_price: float, CATALYST_COST_MAP: dict, n: int = 10000, hidden_r: bool = True, seed: int | None = None, workers: int = 1) -> CampaignResult:
+    """
+    Get cached results of a multi-piece campaign given as (slot, current level, target level, tap cost multiplier) rows.
+    Each level step follows the optimal policy for its tap cost, which scales the default gold and spare parts cost per tap.
+    """
+    legs = []
+    for slot, current_level, target_level, multiplier in campaign:
+        for level in range(current_level, target_level):
+            attempt_cost = ladder.default_tap_cost(level) * multiplier
+            policy = absolute_policy.ACTION_NAMES[get_cached_policy_tables(level, attempt_cost, gold_price, CATALYST_COST_MAP, hidden_r).policy]
+            legs.append((slot, level, attempt_cost, policy))
+
+    return simulation.simulate_campaign(legs, gold_price, CATALYST_COST_MAP, n=n, hidden_r=hidden_r, seed=seed, workers=workers)
+
+@st.cache_data(show_spinner=False)
+@disk_cache(skip_if=unseeded)
+def get_cached_selection_comparison(enhancement_level: int, base_cost: float, final_catalyst: str, CATALYST_COST_MAP: dict, n: int = 1000, hidden_r: bool = True, seed: int | None = None, percentile: float = 0.9, metric: str = "mean", top_k: int = 20):
+    """
+    Compare the top_k selections by expected cost on common random numbers.
     """
+    chain_length = CONST.AMP_THRESHOLDS[enhancement_level]
+    selections = [selection for selection, *_ in rank_selections(chain_length, base_cost, CATALYST_COST_MAP, top_k=top_k, hidden_r=hidden_r)]
 
-    return get_sim_results(enhancement_level=enhancement_level, base_cost=base_cost, hidden_r=hidden_r, catalyst_selected=catalyst_selected, n=n)
\ No newline at end of file
+    return simulation.compare_selections(enhancement_level, base_cost, selections, final_catalyst, CATALYST_COST_MAP, n=n, hidden_r=hidden_r, seed=seed, percentile=percentile, metric=metric)